@@ -0,0 +1,278 @@
+"""
+Analysis of Evscaperoom logs
+
+This reads room logs and summarizes how players fare:
+
+- The drop-off funnel: how many rooms reached each state.
+- Hint usage per state and hint level.
+- The median time spent in each state.
+- The distribution of answers to the questions at the end of the game.
+
+It reads the JSONL event stream (`evscaperoom_events.jsonl`, see
+roomlog.py) and also the human-readable room logs
+(`evscaperoom_<roomname>.log`), so older logs can be analysed too (though
+logs from before state changes were logged only give hints and answers).
+Don't give it both kinds of log for the same rooms, or they'll be counted
+twice. Files ending in `.gz` are decompressed on the fly and rotated files
+(`<name>.1`, `<name>.2` ...) are read oldest first.
+
+The logs are streamed through once, line by line, and only the rooms
+currently in progress are kept in memory. Times spent in states are
+counted in logarithmic buckets about 1% wide, so the medians are
+approximate (to within about 1%) but memory use does not grow with the
+amount of logs.
+
+This does not need Evennia, just run it from the game dir:
+
+    python -m evscaperoom.analytics server/logs/evscaperoom_events.jsonl*
+
+Use `--json` to get the results as JSON instead of as tables.
+
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+# the events we care about, for skipping other lines without parsing them
+_RE_JSON_EVENT = re.compile(r'"event": "(create|state|hint|question|end|reap)"')
+
+# the human-readable logs
+_RE_LOG_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) \[-\] (.*)$")
+_RE_LOG_FILENAME = re.compile(r"^evscaperoom_(.+?)\.log(?:\.\d+)?(?:\.gz)?$")
+_RE_LOG_CREATE = re.compile(r"^Room created and log started")
+_RE_LOG_STATE = re.compile(r"^STATE: (\S+) -> (\S+)")
+_RE_LOG_HINT = re.compile(r"^HINT: (\w+), level (\d+)")
+_RE_LOG_QUESTION = re.compile(r"^Question (\d+): .* answered '(.*)' \((\w+)\)$")
+_RE_LOG_END = re.compile(r"^END: ")
+
+_RE_ROTATED = re.compile(r"^(.*?)(?:\.(\d+))?(\.gz)?$")
+
+# width of the duration buckets (each is ~1% wider than the previous)
+_BUCKET_BASE = 1.01
+
+
+class DurationHistogram(object):
+    """
+    Counts durations in logarithmic buckets, for finding approximate
+    medians in fixed memory.
+
+    """
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+
+    def add(self, seconds):
+        bucket = -1 if seconds < 1 else int(math.log(seconds, _BUCKET_BASE))
+        self.buckets[bucket] += 1
+        self.count += 1
+
+    def median(self):
+        """
+        Returns:
+            median (float or None): The approximate median in seconds, or
+                `None` if nothing was counted.
+
+        """
+        if not self.count:
+            return None
+        half = self.count / 2
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= half:
+                return 0.0 if bucket < 0 else _BUCKET_BASE ** (bucket + 0.5)
+
+
+class LogAnalyzer(object):
+    """
+    Collects statistics from a stream of room events.
+
+    """
+    def __init__(self):
+        # room: (state, time entered). Only rooms in progress.
+        self.rooms = {}
+        # state: number of rooms reaching it
+        self.funnel = Counter()
+        # (state, level): number of hints used
+        self.hints = Counter()
+        # state: DurationHistogram
+        self.durations = defaultdict(DurationHistogram)
+        # question: {answer: count}
+        self.answers = defaultdict(Counter)
+        self.nevents = 0
+
+    def add_event(self, timestamp, room, event, **data):
+        """
+        Count one event.
+
+        Args:
+            timestamp (float): When the event happened.
+            room (str): The room it happened in.
+            event (str): The type of event.
+            **data: Data about the event, like "state" or "level".
+
+        """
+        self.nevents += 1
+        if event == "create":
+            # room names can be reused after a room is deleted
+            self.rooms.pop(room, None)
+        elif event == "state":
+            state = data.get("state")
+            prev = self.rooms.get(room)
+            if prev:
+                self.durations[prev[0]].add(timestamp - prev[1])
+            self.funnel[state] += 1
+            self.rooms[room] = (state, timestamp)
+        elif event == "hint":
+            self.hints[(data.get("state"), int(data.get("level", 0)))] += 1
+        elif event == "question":
+            self.answers[int(data.get("question", 0))][data.get("answer")] += 1
+        elif event in ("end", "reap"):
+            prev = self.rooms.pop(room, None)
+            if prev:
+                # the time spent in the last state before the room closed
+                self.durations[prev[0]].add(timestamp - prev[1])
+
+    def read_jsonl(self, lines):
+        "Read events from the JSONL event stream"
+        for line in lines:
+            if not _RE_JSON_EVENT.search(line):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.add_event(record["timestamp"], record["room"], record["event"],
+                           **record.get("payload", {}))
+
+    def read_log(self, lines, room):
+        "Read events from the human-readable log of one room"
+        for line in lines:
+            match = _RE_LOG_LINE.match(line.rstrip("\n"))
+            if not match:
+                continue
+            timestamp = time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+            message = match.group(2)
+            if _RE_LOG_CREATE.match(message):
+                self.add_event(timestamp, room, "create")
+            elif _RE_LOG_STATE.match(message):
+                state = _RE_LOG_STATE.match(message).group(2).split(".")[-1]
+                self.add_event(timestamp, room, "state", state=state)
+            elif _RE_LOG_HINT.match(message):
+                state, level = _RE_LOG_HINT.match(message).groups()
+                self.add_event(timestamp, room, "hint", state=state, level=level)
+            elif _RE_LOG_QUESTION.match(message):
+                question, _, answer = _RE_LOG_QUESTION.match(message).groups()
+                self.add_event(timestamp, room, "question", question=question, answer=answer)
+            elif _RE_LOG_END.match(message):
+                self.add_event(timestamp, room, "end")
+
+    def read_file(self, filename):
+        """
+        Read a log file of either kind (based on its name).
+
+        """
+        opener = gzip.open if filename.endswith(".gz") else open
+        with opener(filename, "rt", encoding="utf-8", errors="replace") as fil:
+            match = _RE_LOG_FILENAME.match(os.path.basename(filename))
+            if match:
+                self.read_log(fil, match.group(1))
+            else:
+                self.read_jsonl(fil)
+
+    def results(self):
+        """
+        Returns:
+            results (dict): The statistics, with the keys "funnel",
+                "hints", "median_seconds" and "answers".
+
+        """
+        states = sorted(set(self.funnel) | set(self.durations) |
+                        set(state for state, _ in self.hints))
+        started = self.funnel[states[0]] if states else 0
+        funnel = []
+        prev = None
+        for state in states:
+            reached = self.funnel[state]
+            funnel.append({
+                "state": state, "rooms": reached,
+                "percent": round(100 * reached / started, 1) if started else 0.0,
+                "dropoff": (prev - reached) if prev is not None else 0})
+            prev = reached
+        return {
+            "events": self.nevents,
+            "funnel": funnel,
+            "hints": [{"state": state, "level": level, "count": count}
+                      for (state, level), count in sorted(self.hints.items())],
+            "median_seconds": {state: self.durations[state].median()
+                               for state in states if state in self.durations},
+            "answers": {question: dict(answers.most_common())
+                        for question, answers in sorted(self.answers.items())}}
+
+
+def _file_order(filename):
+    """
+    Sort rotated files oldest first: name.2, name.1, name.
+
+    """
+    base, num, _ = _RE_ROTATED.match(filename).groups()
+    return (base, -int(num or 0))
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02}m{seconds:02}s" if hours else f"{minutes}m{seconds:02}s"
+
+
+def format_results(results):
+    """
+    Format the results as text tables.
+
+    """
+    lines = [f"Events analysed: {results['events']}", "",
+             "Funnel (rooms reaching each state):"]
+    for row in results["funnel"]:
+        median = _format_duration(results["median_seconds"].get(row["state"]))
+        lines.append(f"  {row['state']:<35} {row['rooms']:>7} {row['percent']:>6.1f}%"
+                     f"  -{row['dropoff']:<6} median time: {median}")
+    lines.extend(["", "Hints used (state, level):"])
+    for row in results["hints"]:
+        lines.append(f"  {row['state']:<35} {row['level']:>3} {row['count']:>7}")
+    lines.extend(["", "Answers to the questions:"])
+    for question, answers in results["answers"].items():
+        total = sum(answers.values())
+        lines.append(f"  Question {question}:")
+        for answer, count in answers.items():
+            lines.append(f"    {answer:<20} {count:>7} {100 * count / total:>6.1f}%")
+    return "\n".join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Summarize Evscaperoom logs (event streams or room logs).")
+    parser.add_argument("files", nargs="+", help="Log files to read.")
+    parser.add_argument("--json", action="store_true", help="Output results as JSON.")
+    args = parser.parse_args(args)
+
+    analyzer = LogAnalyzer()
+    for filename in sorted(args.files, key=_file_order):
+        analyzer.read_file(filename)
+    results = analyzer.results()
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
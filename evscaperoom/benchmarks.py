@@ -0,0 +1,462 @@
+"""
+Performance benchmarks for the Evscaperoom.
+
+These are not part of the normal unit tests (they are slow and mostly only
+report timings). Run them explicitly with
+
+    evennia test evscaperoom.benchmarks
+
+Most benchmarks compare the current implementation with a copy of the
+implementation it replaced and print the timings to stdout. The replay and
+playthrough benchmarks instead play whole games (see replay.py and
+playthrough.py).
+
+"""
+import json
+import os
+import pickle
+import pkgutil
+import timeit
+import tracemalloc
+from os import path
+from unittest import TestCase
+from unittest.mock import patch
+from evennia.utils import create
+from evennia.utils.utils import all_from_module
+from evennia.utils.test_resources import EvenniaTest
+from evennia.typeclasses.attributes import Attribute
+from evennia.locks.lockhandler import check_lockstring
+from . import commands
+from . import objects
+from . import utils
+from . import playthrough
+from . import loadgen
+from .catalog import CATALOG
+from .roomlog import ROOMLOG
+from .replay import load_sessions, SessionReplayer, format_report
+from .utils import parse_for_perspectives, parse_for_things, compile_template
+
+_REPEAT = 5
+
+
+def _best_of(func, number):
+    """
+    Time `func`, returning the best time per call (in microseconds).
+
+    """
+    best = min(timeit.repeat(func, number=number, repeat=_REPEAT))
+    return best / number * 1e6
+
+
+def _report(name, legacy, current):
+    """
+    Print a legacy-vs-current comparison line.
+
+    """
+    speedup = legacy / current if current else float("inf")
+    print(f"\n{name}: legacy {legacy:.1f}us, current {current:.1f}us "
+          f"(x{speedup:.2f})")
+
+
+class _BenchmarkRoom(EvenniaTest):
+    """
+    Sets up an EvscapeRoom populated with a crowd of player characters
+    whose msg method is silenced (we only want to time our own code).
+
+    """
+    ncharacters = 20
+
+    def setUp(self):
+        super().setUp()
+        self.room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key='Benchroom',
+            home=self.room1)
+        self.chars = []
+        for ichar in range(self.ncharacters):
+            char = create.create_object(
+                self.character_typeclass, key=f"Bencher{ichar}",
+                location=self.room, home=self.room1)
+            # mix the things_style options between the players
+            char.attributes.add("options", {"things_style": ichar % 3},
+                                category=self.room.tagcategory)
+            char.msg = lambda *args, **kwargs: None
+            self.chars.append(char)
+
+    def tearDown(self):
+        for char in self.chars:
+            char.delete()
+        self.room.delete()
+        super().tearDown()
+
+
+# ------------------------------------------------------------
+# msg_room fan-out
+# ------------------------------------------------------------
+
+def _legacy_msg_room(room, caller, string, skip_caller=False):
+    "The per-recipient msg_room rendering, as it was before render-once"
+    you = caller.key if caller else "they"
+    first_person, third_person = parse_for_perspectives(string, you=you)
+    for char in room.get_all_characters():
+        options = char.attributes.get(
+            "options", category=room.tagcategory, default={})
+        style = options.get("things_style", 2)
+        if char == caller:
+            if not skip_caller:
+                txt = parse_for_things(first_person, things_style=style)
+                char.msg((txt, {'type': 'your_action'}))
+        else:
+            txt = parse_for_things(third_person, things_style=style)
+            char.msg((txt, {'type': 'others_action'}))
+
+
+class BenchMsgRoom(_BenchmarkRoom):
+
+    message = ("~You ~mix the *ashes with the *fertilizer and ~push the *pot "
+               "under the *window, where *Vale ~are pointing at the *rafters.")
+
+    def test_msg_room(self):
+        caller = self.chars[0]
+        legacy = _best_of(
+            lambda: _legacy_msg_room(self.room, caller, self.message), 200)
+        current = _best_of(
+            lambda: self.room.msg_room(caller, self.message), 200)
+        _report(f"msg_room ({self.ncharacters} players)", legacy, current)
+
+
+# ------------------------------------------------------------
+# emote reference resolution
+# ------------------------------------------------------------
+
+def _legacy_emote(caller, emote):
+    "The emote as it was before parsing once, searching for each reference per target"
+    speech_clr = "|c"
+    obj_clr = "|y"
+    self_clr = "|g"
+    player_clr = "|b"
+    add_period = not commands._RE_EMOTE_PROPER_END.search(emote)
+
+    emote = commands._RE_EMOTE_SPEECH.sub(speech_clr + r"\1\2|n", emote)
+    characters = caller.location.get_all_characters()
+    for target in characters:
+        txt = []
+        self_refer = False
+        for part in commands._RE_EMOTE_NAME.split(emote):
+            nameobj = None
+            if part.startswith("/"):
+                name = part[1:]
+                if name == "me":
+                    nameobj = caller
+                    self_refer = True
+                else:
+                    match = caller.search(name, quiet=True)
+                    if len(match) == 1:
+                        nameobj = match[0]
+            if nameobj:
+                if target == nameobj:
+                    part = f"{self_clr}{nameobj.get_display_name(target)}|n"
+                elif nameobj in characters:
+                    part = f"{player_clr}{nameobj.get_display_name(target)}|n"
+                else:
+                    part = f"{obj_clr}{nameobj.get_display_name(target)}|n"
+            txt.append(part)
+        if not self_refer:
+            if target == caller:
+                txt = [f"{self_clr}{caller.get_display_name(target)}|n "] + txt
+            else:
+                txt = [f"{player_clr}{caller.get_display_name(target)}|n "] + txt
+        txt = "".join(txt).strip() + ("." if add_period else "")
+        target.msg(txt)
+
+
+class BenchEmote(_BenchmarkRoom):
+
+    ncharacters = 10
+    emote = ("/me points from /box to /lever and then at /Bencher1, saying "
+             "\"/Bencher2, pull /lever while I hold the /box!\"")
+
+    def setUp(self):
+        super().setUp()
+        self.objs = [utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key=key, location=self.room) for key in ("box", "lever")]
+
+    def tearDown(self):
+        for obj in self.objs:
+            obj.delete()
+        super().tearDown()
+
+    def test_emote(self):
+        caller = self.chars[0]
+        cmd = commands.CmdEmote()
+        cmd.caller = caller
+        cmd.args = self.emote
+        with patch.object(ROOMLOG, "log", lambda *args, **kwargs: None):
+            legacy = _best_of(lambda: _legacy_emote(caller, self.emote), 20)
+            current = _best_of(cmd.func, 20)
+        _report(f"emote with 7 references ({self.ncharacters} players)", legacy, current)
+
+
+# ------------------------------------------------------------
+# cached appearances
+# ------------------------------------------------------------
+
+class BenchAppearance(_BenchmarkRoom):
+
+    ncharacters = 1
+
+    def test_return_appearance(self):
+        looker = self.chars[0]
+        obj = utils.create_evscaperoom_object(
+            objects.Positionable, key="chair", location=self.room)
+        obj.set_desc("A sturdy *chair, made of oak. It has a tall back and four legs.")
+
+        def _uncached():
+            obj.clear_appearance_cache()
+            obj.return_appearance(looker)
+
+        legacy = _best_of(_uncached, 500)
+        current = _best_of(lambda: obj.return_appearance(looker), 500)
+        _report("return_appearance (examine)", legacy, current)
+        obj.delete()
+
+
+# ------------------------------------------------------------
+# cached permission checks
+# ------------------------------------------------------------
+
+class BenchCheckPerm(_BenchmarkRoom):
+
+    ncharacters = 1
+
+    def test_check_perm(self):
+        looker = self.char1
+        legacy = _best_of(lambda: check_lockstring(looker, "dummy:perm(Admin)"), 1000)
+        current = _best_of(lambda: self.room.check_perm(looker, "Admin"), 1000)
+        _report("check_perm (Admin)", legacy, current)
+
+
+# ------------------------------------------------------------
+# precompiled message templates
+# ------------------------------------------------------------
+
+def _get_state_texts():
+    "All module-level strings with markup in the state modules"
+    dirname = path.join(path.dirname(__file__), "states")
+    texts = []
+    for _, modname, _ in pkgutil.iter_modules(path=[dirname], prefix="evscaperoom.states."):
+        texts.extend(val for val in all_from_module(modname).values()
+                     if isinstance(val, str) and ("~" in val or "*" in val))
+    return texts
+
+
+class BenchMessageTemplates(TestCase):
+
+    def test_render_state_texts(self):
+        texts = _get_state_texts()
+
+        def _legacy():
+            for text in texts:
+                first, third = parse_for_perspectives(text, you="Bencher")
+                parse_for_things(first, things_style=2)
+                parse_for_things(third, things_style=2)
+
+        def _current():
+            for text in texts:
+                template = compile_template(text)
+                template.render("first", things_style=2)
+                template.render("third", you="Bencher", things_style=2)
+
+        legacy = _best_of(_legacy, 20)
+        current = _best_of(_current, 20)
+        _report(f"render {len(texts)} state texts (first+third person)", legacy, current)
+
+
+# ------------------------------------------------------------
+# state method error-wrapping
+# ------------------------------------------------------------
+
+def _make_legacy_state_class(cls):
+    """
+    Rebuild a state class with its original, unwrapped methods and the
+    per-access error-wrapping __getattribute__ it used to have.
+
+    """
+    from functools import wraps
+    from evennia import logger
+
+    attrs = {}
+    for klass in reversed(cls.__mro__[:-1]):
+        for name, val in vars(klass).items():
+            if name in ("__dict__", "__weakref__", "__init_subclass__"):
+                continue
+            attrs[name] = getattr(val, "__wrapped__", val)
+
+    def _catch_errors(self, method):
+        @wraps(method)
+        def decorator(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                logger.log_trace("Error in State")
+                raise
+        return decorator
+
+    def __getattribute__(self, key):
+        val = object.__getattribute__(self, key)
+        if callable(val):
+            return object.__getattribute__(self, "_catch_errors")(val)
+        return val
+
+    attrs["_catch_errors"] = _catch_errors
+    attrs["__getattribute__"] = __getattribute__
+    return type(f"Legacy{cls.__name__}", (object,), attrs)
+
+
+class BenchStateMethodCalls(TestCase):
+
+    def test_state_method_overhead(self):
+        from .states.state_001_start import State
+
+        legacy_state = _make_legacy_state_class(State)(None, None)
+        state = State(None, None)
+
+        legacy = _best_of(lambda: legacy_state.next(), 100000)
+        current = _best_of(lambda: state.next(), 100000)
+        _report("state_001_start State.next() call", legacy, current)
+
+
+# ------------------------------------------------------------
+# per-room footprint with the shared definition catalog
+# ------------------------------------------------------------
+
+class BenchRoomFootprint(EvenniaTest):
+
+    def _measure_room(self):
+        """
+        Create a room in its first state and measure the Attributes of its
+        objects: rows and pickled size in the database, and the memory
+        needed to load them (and the descs) into the Attribute cache.
+
+        """
+        room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key="Benchroom", home=self.room1)
+        room.statehandler.init_state()
+        objs = [obj for obj in room.contents if obj.pk]
+
+        attrs = Attribute.objects.filter(objectdb__db_location=room)
+        nrows = attrs.count()
+        nbytes = sum(len(pickle.dumps(attr.db_value)) for attr in attrs)
+
+        for obj in objs:
+            obj.attributes.reset_cache()
+        tracemalloc.start()
+        for obj in objs:
+            obj.attributes.all()
+            obj.get_desc()
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        room.delete()
+        return nrows, nbytes, memory
+
+    def test_room_footprint(self):
+        # make sure the catalog itself is not counted
+        CATALOG.get_ref("")
+        with patch.object(CATALOG, "get_ref", return_value=None):
+            legacy = self._measure_room()
+        current = self._measure_room()
+        print(f"\nper-room footprint (first state): "
+              f"legacy {legacy[0]} Attribute rows, {legacy[1] / 1024:.1f}kB in db, "
+              f"{legacy[2] / 1024:.1f}kB loaded; "
+              f"current {current[0]} rows, {current[1] / 1024:.1f}kB in db, "
+              f"{current[2] / 1024:.1f}kB loaded")
+
+
+# ------------------------------------------------------------
+# replay of recorded sessions
+# ------------------------------------------------------------
+
+class BenchReplay(EvenniaTest):
+    """
+    Replays the sessions recorded in the event logs given (space-separated)
+    in the environment variable EVSCAPEROOM_REPLAY_LOGS.
+
+    """
+    def test_replay(self):
+        filenames = os.environ.get("EVSCAPEROOM_REPLAY_LOGS", "").split()
+        if not filenames:
+            self.skipTest("EVSCAPEROOM_REPLAY_LOGS not set")
+        for filename in filenames:
+            with open(filename, encoding="utf-8") as fil:
+                for session in load_sessions(fil):
+                    replayer = SessionReplayer(session, home=self.room1)
+                    try:
+                        print("\n" + format_report(replayer.run()))
+                    finally:
+                        replayer.cleanup()
+
+
+# ------------------------------------------------------------
+# scripted playthrough of the whole game
+# ------------------------------------------------------------
+
+class BenchPlaythrough(EvenniaTest):
+    """
+    Plays the game from start to end. The report is written as JSON to
+    EVSCAPEROOM_PLAYTHROUGH_REPORT (default playthrough_report.json) and,
+    if EVSCAPEROOM_PLAYTHROUGH_BASELINE is set to the report of an earlier
+    run, compared with that.
+
+    """
+    def test_playthrough(self):
+        filename = os.environ.get("EVSCAPEROOM_PLAYTHROUGH_REPORT", "playthrough_report.json")
+        report = playthrough.run_playthrough(home=self.room1, filename=filename)
+        print("\n" + playthrough.format_report(report))
+        baseline = os.environ.get("EVSCAPEROOM_PLAYTHROUGH_BASELINE")
+        if baseline:
+            with open(baseline, encoding="utf-8") as fil:
+                print(playthrough.compare_reports(json.load(fil), report))
+        # a benchmark of half the game is no use
+        self.assertTrue(report["completed"], f"Playthrough got stuck in {report['final_state']}")
+
+
+# ------------------------------------------------------------
+# many rooms at once
+# ------------------------------------------------------------
+
+class BenchLoad(EvenniaTest):
+    """
+    Runs the load generator for a growing number of rooms, configured with
+    the environment variables EVSCAPEROOM_LOAD_ROOMS (space-separated room
+    counts), EVSCAPEROOM_LOAD_PLAYERS, EVSCAPEROOM_LOAD_RATE (commands per
+    second per player) and EVSCAPEROOM_LOAD_SECONDS (per room count).
+
+    """
+    def test_load(self):
+        nrooms_list = [int(nrooms) for nrooms in
+                       os.environ.get("EVSCAPEROOM_LOAD_ROOMS", "1 5 10").split()]
+        nplayers = int(os.environ.get("EVSCAPEROOM_LOAD_PLAYERS", 4))
+        rate = float(os.environ.get("EVSCAPEROOM_LOAD_RATE", 0.2))
+        seconds = float(os.environ.get("EVSCAPEROOM_LOAD_SECONDS", 10))
+        print()
+        for nrooms in nrooms_list:
+            generator = loadgen.LoadGenerator(nrooms, nplayers=nplayers, rate=rate,
+                                              home=self.room1)
+            try:
+                generator.setup()
+                print(loadgen.format_report(generator.run(seconds)))
+            finally:
+                generator.cleanup()
+
+    def test_short_load(self):
+        generator = loadgen.LoadGenerator(2, nplayers=2, rate=20, home=self.room1)
+        try:
+            generator.setup()
+            report = generator.run(0.5)
+        finally:
+            generator.cleanup()
+        self.assertEqual(report["rooms"], 2)
+        self.assertGreater(report["commands"], 0)
+        self.assertGreater(report["outputs"], 0)
+        self.assertGreater(report["memory_per_room_kb"], 0)
+        self.assertFalse(any(room.pk for room in generator.rooms))
@@ -0,0 +1,133 @@
+"""
+Shared catalog of static object definitions
+
+Most of what makes up an Evscaperoom object is static: its (long)
+description is a text constant in a state module and is the same in every
+room. Storing a copy of it as an Attribute on every object in every room
+makes the database (and the Attribute cache) grow with rooms x objects for
+no gain.
+
+Instead, the catalog indexes all text constants of the state modules and
+objects store only a short reference to their description, like
+`"state_001_start.CABINDOOR_DESC:strip@3f2a9c01d4e7"`. The text is looked
+up here when needed and lives only once in memory. The part after the `@`
+is a hash of the text, so a reference still works if the constant is later
+renamed or moved (and the name finds the text if it was later edited). This is copy-on-write: a desc not
+found in the catalog (such as one built on the fly) is stored on the
+object as normal, and an object can always be given its own desc, which
+then takes precedence over the shared one.
+
+"""
+
+import hashlib
+import pkgutil
+from evennia.utils import logger
+from evennia.utils.utils import mod_import, all_from_module
+
+_STATES_PACKAGE = "evscaperoom.states"
+# don't bother referencing short texts, they are cheaper to store directly
+_MIN_LENGTH = 20
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class DefinitionCatalog(object):
+    """
+    Maps static texts to references and back.
+
+    """
+    def __init__(self, package=_STATES_PACKAGE):
+        self.package = package
+        # name: text
+        self.texts = None
+        # text hash: text
+        self.hashes = None
+        # text: ref
+        self.refs = None
+
+    def _register(self, name, text):
+        if len(text) >= _MIN_LENGTH:
+            digest = _hash(text)
+            self.texts[name] = text
+            self.hashes[digest] = text
+            # first one wins if the same text is defined in several places
+            self.refs.setdefault(text, f"{name}@{digest}")
+
+    def _load(self):
+        """
+        Index all upper-case text constants of the state modules. This is
+        done once, on first use.
+
+        """
+        self.texts, self.hashes, self.refs = {}, {}, {}
+        package = mod_import(self.package)
+        for _, modname, ispkg in pkgutil.iter_modules(package.__path__):
+            if ispkg:
+                continue
+            try:
+                mod = mod_import(f"{self.package}.{modname}")
+            except Exception:
+                logger.log_trace(f"Evscaperoom catalog: Could not index {modname}.")
+                continue
+            for name, value in all_from_module(mod).items():
+                if name.isupper() and isinstance(value, str):
+                    self._register(f"{modname}.{name}", value)
+                    self._register(f"{modname}.{name}:strip", value.strip())
+
+    def get_ref(self, text):
+        """
+        Get the reference to a shared text.
+
+        Args:
+            text (str): The text to look for.
+        Returns:
+            ref (str or None): The reference, or `None` if this text is not
+                in the catalog.
+
+        """
+        if self.refs is None:
+            self._load()
+        return self.refs.get(text)
+
+    def get(self, ref, default=None):
+        """
+        Get the text for a reference.
+
+        Args:
+            ref (str): The reference, as given by `get_ref`.
+            default (str, optional): Returned if the reference is unknown.
+        Returns:
+            text (str): The shared text.
+
+        """
+        if self.texts is None:
+            self._load()
+        # references from before we hashed the text have no @ part
+        name, _, digest = ref.partition("@")
+        text = self.texts.get(name)
+        if text is None:
+            # renamed or moved
+            text = self.hashes.get(digest)
+        if text is None:
+            logger.log_err(f"Evscaperoom catalog: Unknown reference '{ref}'.")
+            return default
+        return text
+
+    def desc_attribute(self, desc):
+        """
+        Get the Attribute to store for a desc, for use when creating objects.
+
+        Args:
+            desc (str): The description.
+        Returns:
+            attribute (tuple): Either `("desc_ref", ref)` if the desc is
+                in the catalog, otherwise `("desc", desc)`.
+
+        """
+        ref = self.get_ref(desc)
+        return ("desc_ref", ref) if ref else ("desc", desc)
+
+
+CATALOG = DefinitionCatalog()
@@ -69,6 +69,17 @@ leave, this room will go away and you |rwon't|n be able to come back to it!)
 """
 
 
+def _record_input(cmd):
+    """
+    Have the room record a command entered in it (for replaying the
+    session later). Called from the commands' at_pre_cmd.
+
+    """
+    room = cmd.caller.location
+    if hasattr(room, "record_input"):
+        room.record_input(cmd.caller, cmd.raw_string)
+
+
 class CmdEvscapeRoom(Command):
     """
     Base command parent for all Evscaperoom commands.
@@ -95,6 +106,9 @@ class CmdEvscapeRoom(Command):
     obj1_search = None
     obj2_search = None
 
+    def at_pre_cmd(self):
+        _record_input(self)
+
     def _search(self, query, required):
         """
         This implements the various search modes
@@ -119,7 +133,11 @@ class CmdEvscapeRoom(Command):
         if required is False:
             return None, query
 
-        matches = self.caller.search(query, quiet=True)
+        # the room can do the search in memory, in most cases
+        resolver = getattr(self.caller.location, "name_resolver", None)
+        matches = resolver.search(self.caller, query) if resolver else None
+        if matches is None:
+            matches = self.caller.search(query, quiet=True)
 
         if not matches or len(matches) > 1:
             if required:
@@ -161,15 +179,15 @@ class CmdEvscapeRoom(Command):
 
     @property
     def focus(self):
-        return self.caller.attributes.get("focus", category=self.room.db.tagcategory)
+        return self.room.playerstate.get(self.caller, "focus")
 
     @focus.setter
     def focus(self, obj):
-        self.caller.attributes.add("focus", obj, category=self.room.tagcategory)
+        self.room.playerstate.set(self.caller, "focus", obj)
 
     @focus.deleter
     def focus(self):
-        self.caller.attributes.remove("focus", category=self.room.tagcategory)
+        self.room.playerstate.remove(self.caller, "focus")
 
 
 class CmdGiveUp(CmdEvscapeRoom):
@@ -201,7 +219,8 @@ class CmdGiveUp(CmdEvscapeRoom):
             self.msg("|R ... Oh. Okay then. Off you go.|n\n")
             yield(1)
 
-            self.room.log(f"QUIT: {self.caller.key} used the quit command")
+            self.room.log(f"QUIT: {self.caller.key} used the quit command",
+                          caller=self.caller, event="quit")
 
             # manually call move hooks
             self.room.msg_room(self.caller, f"|r{self.caller.key} gave up and was whisked away!|n")
@@ -296,6 +315,9 @@ class CmdSpeak(Command):
     aliases = [";", "shout", "whisper"]
     arg_regex = r"\w|\s|$"
 
+    def at_pre_cmd(self):
+        _record_input(self)
+
     def func(self):
 
         args = self.args.strip()
@@ -318,7 +340,7 @@ class CmdSpeak(Command):
 
         if hasattr(room, "msg_room"):
             room.msg_room(caller, message)
-            room.log(f"{action} by {caller.key}: {args}")
+            room.log(f"{action} by {caller.key}: {args}", caller=caller, event=action)
 
 
 class CmdEmote(Command):
@@ -341,12 +363,82 @@ class CmdEmote(Command):
     aliases = [":", "pose"]
     arg_regex = r"\w|\s|$"
 
+    # colors of the speech and of the references
+    speech_clr = "|c"
+    obj_clr = "|y"
+    self_clr = "|g"
+    player_clr = "|b"
+
+    def at_pre_cmd(self):
+        _record_input(self)
+
     def you_replace(match):
         return match
 
     def room_replace(match):
         return match
 
+    def parse_emote(self, emote):
+        """
+        Split the emote into text and references, looking up each
+        referenced name only once.
+
+        Args:
+            emote (str): The emote, with speech already colored.
+        Returns:
+            parts (list): (text, obj) for each part of the emote, where
+                `obj` is the object referred to by a /name, or `None` for
+                plain text (and for names not found).
+            self_refer (bool): If the emote includes the caller with /me.
+
+        """
+        found = {}
+        parts = []
+        self_refer = False
+        for part in _RE_EMOTE_NAME.split(emote):
+            nameobj = None
+            if part.startswith("/"):
+                name = part[1:]
+                if name == "me":
+                    nameobj = self.caller
+                    self_refer = True
+                elif name in found:
+                    nameobj = found[name]
+                else:
+                    match = self.caller.search(name, quiet=True)
+                    nameobj = found[name] = match[0] if len(match) == 1 else None
+            parts.append((part, nameobj))
+        return parts, self_refer
+
+    def render_emote(self, parts, self_refer, target, characters):
+        """
+        Render a parsed emote as seen by one target.
+
+        Args:
+            parts (list): As returned by `parse_emote`.
+            self_refer (bool): If the caller is referred to with /me.
+            target (Object): The one to see the emote.
+            characters (set): All characters in the room.
+        Returns:
+            txt (str): The emote, with the references colored depending on
+                if they are the target, another character or an object.
+
+        """
+        txt = []
+        for part, nameobj in parts:
+            if nameobj:
+                if target == nameobj:
+                    part = f"{self.self_clr}{nameobj.get_display_name(target)}|n"
+                elif nameobj in characters:
+                    part = f"{self.player_clr}{nameobj.get_display_name(target)}|n"
+                else:
+                    part = f"{self.obj_clr}{nameobj.get_display_name(target)}|n"
+            txt.append(part)
+        if not self_refer:
+            clr = self.self_clr if target == self.caller else self.player_clr
+            txt = [f"{clr}{self.caller.get_display_name(target)}|n "] + txt
+        return "".join(txt).strip()
+
     def func(self):
         emote = self.args.strip()
 
@@ -354,47 +446,21 @@ class CmdEmote(Command):
             self.caller.msg("Usage: emote /me points to /door, saying \"look over there!\"")
             return
 
-        speech_clr = "|c"
-        obj_clr = "|y"
-        self_clr = "|g"
-        player_clr = "|b"
         add_period = not _RE_EMOTE_PROPER_END.search(emote)
 
-        emote = _RE_EMOTE_SPEECH.sub(speech_clr + r"\1\2|n", emote)
+        emote = _RE_EMOTE_SPEECH.sub(self.speech_clr + r"\1\2|n", emote)
         room = self.caller.location
 
+        # the references are looked up once, then rendered for each target
+        parts, self_refer = self.parse_emote(emote)
         characters = room.get_all_characters()
+        charset = set(characters)
         logged = False
         for target in characters:
-            txt = []
-            self_refer = False
-            for part in _RE_EMOTE_NAME.split(emote):
-                nameobj = None
-                if part.startswith("/"):
-                    name = part[1:]
-                    if name == "me":
-                        nameobj = self.caller
-                        self_refer = True
-                    else:
-                        match = self.caller.search(name, quiet=True)
-                        if len(match) == 1:
-                            nameobj = match[0]
-                if nameobj:
-                    if target == nameobj:
-                        part = f"{self_clr}{nameobj.get_display_name(target)}|n"
-                    elif nameobj in characters:
-                        part = f"{player_clr}{nameobj.get_display_name(target)}|n"
-                    else:
-                        part = f"{obj_clr}{nameobj.get_display_name(target)}|n"
-                txt.append(part)
-            if not self_refer:
-                if target == self.caller:
-                    txt = [f"{self_clr}{self.caller.get_display_name(target)}|n "] + txt
-                else:
-                    txt = [f"{player_clr}{self.caller.get_display_name(target)}|n "] + txt
-            txt = "".join(txt).strip() + ("." if add_period else "")
+            txt = self.render_emote(parts, self_refer, target, charset)
+            txt += "." if add_period else ""
             if not logged and hasattr(self.caller.location, "log"):
-                self.caller.location.log(f"emote: {txt}")
+                self.caller.location.log(f"emote: {txt}", caller=self.caller, event="emote")
                 logged = True
             target.msg(txt)
 
@@ -484,9 +550,15 @@ class CmdRerouter(default_cmds.MuxCommand):
     def func(self):
         # reroute to another command
         from evennia.commands import cmdhandler
-        cmdhandler.cmdhandler(self.session, self.raw_string,
-                              cmdobj=CmdFocusInteraction(),
-                              cmdobj_key=self.cmdname)
+        if self.session:
+            cmdhandler.cmdhandler(self.session, self.raw_string,
+                                  cmdobj=CmdFocusInteraction(),
+                                  cmdobj_key=self.cmdname)
+        else:
+            # a character without a session, like a bot
+            cmdhandler.cmdhandler(self.caller, self.raw_string, callertype="object",
+                                  cmdobj=CmdFocusInteraction(),
+                                  cmdobj_key=self.cmdname)
 
 
 class CmdFocusInteraction(CmdEvscapeRoom):
@@ -500,8 +572,9 @@ class CmdFocusInteraction(CmdEvscapeRoom):
     the current focus. It will look for a method
         `focused_object.at_focus_<action>(caller, **kwargs)` and call
     it. This allows objects to just add a new hook to make that
-    action apply to it. The obj1, prep, obj2, arg1, arg2 are passed
-    as keys into the method.
+    action apply to it (the hooks are looked up in the action table
+    of the object's class, see `EvscaperoomObject.get_focus_actions`).
+    The obj1, prep, obj2, arg1, arg2 are passed as keys into the method.
 
     """
     # all commands not matching something else goes here.
@@ -531,9 +604,11 @@ class CmdFocusInteraction(CmdEvscapeRoom):
         focused = self.focus
         action = self.action
 
-        if focused and hasattr(focused, f"at_focus_{action}"):
+        get_focus_actions = getattr(focused, "get_focus_actions", None)
+        handler = get_focus_actions().get(action) if get_focus_actions else None
+        if handler:
             # there is a suitable hook to call!
-            getattr(focused, f"at_focus_{action}")(self.caller, args=self.args)
+            handler(focused, self.caller, args=self.args)
         else:
             self.caller.msg("Hm?")
 
@@ -548,14 +623,12 @@ class CmdStand(CmdEvscapeRoom):
     def func(self):
 
         # Positionable objects will set this flag on you.
-        pos = self.caller.attributes.get(
-            "position", category=self.room.tagcategory)
+        pos = self.room.playerstate.get(self.caller, "position")
 
         if pos:
             # we have a position, clean up.
             obj, position = pos
-            self.caller.attributes.remove(
-                "position", category=self.room.tagcategory)
+            self.room.playerstate.remove(self.caller, "position")
             del obj.db.positions[self.caller]
             self.room.msg_room(self.caller, "~You ~are back standing on the floor again.")
         else:
@@ -0,0 +1,205 @@
+"""
+Compact, in-memory storage of object flags
+
+The puzzles check flags on objects all the time (a mixture checks every
+ingredient, for example). Storing them as a `flags` dict Attribute on each
+object means a pickled dict that is re-serialized and written in full on
+every change, and one more Attribute row per object.
+
+Instead, each room keeps a `FlagStore` (available as `room.flagstore`) for
+itself and all objects in it. Flag names are interned and given a bit
+position each, so an object's flags are just an integer bitmask. Checking a
+flag never touches the database. Changes are written back in the
+background, all objects in one Attribute on the room (write-behind, the
+same way as for the `PlayerSessionState`), and also on server
+reload/shutdown.
+
+"""
+
+import sys
+from weakref import WeakSet
+from evennia import logger
+from evennia.utils.utils import delay
+
+# seconds to wait after a change before writing it to the database
+_FLUSH_DELAY = 10
+# Attribute on the room holding the flags of the room and its contents
+_FLAGSTATE_ATTR = "flagstate"
+
+# all live flag stores, for flushing on reload/shutdown
+_ALL_FLAGSTORES = WeakSet()
+
+
+class FlagStore(object):
+    """
+    This sits on the room and stores the flags of the room itself and of
+    all objects in it.
+
+    """
+    def __init__(self, room):
+        self.room = room
+        # flag names, the index is the bit position
+        self.names = None
+        # flagname: bit position
+        self.bits = None
+        # {object id: bitmask}
+        self.masks = None
+        self.dirty = False
+        self.flush_pending = False
+        _ALL_FLAGSTORES.add(self)
+
+    def _intern(self, flagname):
+        """
+        Get the bit position of a flag name, assigning a new one if needed.
+
+        """
+        bit = self.bits.get(flagname)
+        if bit is None:
+            flagname = sys.intern(flagname)
+            bit = self.bits[flagname] = len(self.names)
+            self.names.append(flagname)
+        return bit
+
+    def _load(self):
+        """
+        Load the flags from the room, the first time they are needed.
+
+        """
+        self.names, self.bits, self.masks = [], {}, {}
+        flagstate = self.room.attributes.get(_FLAGSTATE_ATTR)
+        if flagstate is None:
+            self._migrate()
+            return
+        for flagname in flagstate["names"]:
+            self._intern(flagname)
+        self.masks = dict(flagstate["masks"])
+
+    def _migrate(self):
+        """
+        Convert the per-object `flags` Attributes of rooms created before
+        the flags were moved here.
+
+        """
+        for obj in [self.room] + list(self.room.contents):
+            flags = obj.attributes.get("flags")
+            if flags is None:
+                continue
+            mask = 0
+            for flagname, value in flags.items():
+                if value:
+                    mask |= 1 << self._intern(flagname)
+            if mask:
+                self.masks[obj.id] = mask
+            obj.attributes.remove("flags")
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        self.dirty = True
+        if not self.flush_pending:
+            self.flush_pending = True
+            delay(_FLUSH_DELAY, self.flush)
+
+    def _set_mask(self, obj, mask):
+        if mask != self.masks.get(obj.id, 0):
+            if mask:
+                self.masks[obj.id] = mask
+            else:
+                self.masks.pop(obj.id, None)
+            self._mark_dirty()
+
+    def check(self, obj, flagname):
+        """
+        Check if a flag is set on an object.
+
+        Args:
+            obj (Object): The object (or room) to check.
+            flagname (str): The flag to check.
+        Returns:
+            is_set (bool): If the flag is set.
+
+        """
+        if self.masks is None:
+            self._load()
+        bit = self.bits.get(flagname)
+        return bit is not None and bool(self.masks.get(obj.id, 0) >> bit & 1)
+
+    def set(self, obj, flagname):
+        """
+        Set a flag on an object.
+
+        Args:
+            obj (Object): The object (or room) to set the flag on.
+            flagname (str): The flag to set.
+
+        """
+        if self.masks is None:
+            self._load()
+        self._set_mask(obj, self.masks.get(obj.id, 0) | 1 << self._intern(flagname))
+
+    def unset(self, obj, flagname):
+        """
+        Unset a flag on an object.
+
+        Args:
+            obj (Object): The object (or room) to unset the flag on.
+            flagname (str): The flag to unset.
+
+        """
+        if self.masks is None:
+            self._load()
+        bit = self.bits.get(flagname)
+        if bit is not None:
+            self._set_mask(obj, self.masks.get(obj.id, 0) & ~(1 << bit))
+
+    def clear(self, obj):
+        """
+        Remove all flags from an object, such as when it is deleted.
+
+        Args:
+            obj (Object): The object (or room) to clear.
+
+        """
+        if self.masks is None:
+            self._load()
+        self._set_mask(obj, 0)
+
+    def get_flags(self, obj):
+        """
+        Get all flags set on an object.
+
+        Args:
+            obj (Object): The object (or room) to get flags for.
+        Returns:
+            flagnames (list): The names of all flags set on the object.
+
+        """
+        if self.masks is None:
+            self._load()
+        mask = self.masks.get(obj.id, 0)
+        return [flagname for bit, flagname in enumerate(self.names) if mask >> bit & 1]
+
+    def flush(self):
+        """
+        Write the flags of the room and its contents to the database.
+
+        """
+        self.flush_pending = False
+        if not (self.dirty and self.room.pk):
+            # nothing to do or room was deleted
+            return
+        self.dirty = False
+        self.room.attributes.add(_FLAGSTATE_ATTR, {
+            "names": list(self.names), "masks": dict(self.masks)})
+
+
+def flush_all():
+    """
+    Flush the flags of all rooms. This is called when the server reloads or
+    shuts down.
+
+    """
+    for flagstore in list(_ALL_FLAGSTORES):
+        try:
+            flagstore.flush()
+        except Exception:
+            logger.log_trace("Error flushing evscaperoom flags")
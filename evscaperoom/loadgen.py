@@ -0,0 +1,400 @@
+"""
+Load generator
+
+This finds out how many rooms one Evennia process can host at the same
+time. It creates N rooms with M simulated players each and has the players
+enter a random mix of commands at a given rate: chatting, emoting,
+examining things, harmless actions on what they examine and, for one
+player per room, the actual puzzle solution (from playthrough.py, stopping
+before leaving the room). The other players don't do puzzle actions, since
+those could undo the progress of the room.
+
+Each player is an account with an in-process session puppeting its
+character, like Evennia's own test sessions. Commands go in through the
+session and all output is prepared for sending as normal; only the hand-off
+to the portal (and the network) is left out, and is counted instead.
+
+Commands and the game's own timed events (`delay` in interactive code) are
+run by a small scheduler standing in for the reactor, in real time. When the
+process can't keep up, things start to run later than they were scheduled;
+that's the reactor lag. Reported for each N:
+
+- throughput: commands handled per second.
+- latency: p50/p99 of the time from when a command was due to when it had
+  been handled (including lag), and of the time handling the command alone.
+- reactor lag: p50/p99/max of how late the scheduled calls started.
+- outputs: messages sent to the players' sessions.
+- memory per room: what creating the room and its players allocated
+  (measured with tracemalloc, only during setup).
+
+Run it in the test harness (it needs the database), like
+
+    EVSCAPEROOM_LOAD_ROOMS="1 10 25 50" EVSCAPEROOM_LOAD_PLAYERS=4 \\
+    EVSCAPEROOM_LOAD_RATE=0.2 EVSCAPEROOM_LOAD_SECONDS=30 \\
+        evennia test evscaperoom.benchmarks.BenchLoad
+
+The room logs are not written during the run.
+
+"""
+
+import heapq
+import random
+import time
+import tracemalloc
+from itertools import count
+from unittest.mock import patch
+from django.conf import settings
+from twisted.internet.defer import succeed
+from evennia.server.serversession import ServerSession
+from evennia.server.sessionhandler import SESSIONS
+from evennia.utils import create
+from .playthrough import SOLUTION
+from .replay import join_room, patch_delay
+from .room import EvscapeRoom
+from .roomlog import ROOMLOG
+
+try:
+    import resource
+except ImportError:
+    # not on Windows
+    resource = None
+
+# (kind, weight) of the commands the players enter
+_COMMAND_MIX = (("say", 3), ("emote", 2), ("look", 1), ("examine", 4), ("action", 3),
+                ("puzzle", 3))
+# actions on the focused object that don't change the room
+_SAFE_ACTIONS = ("smell", "listen", "think")
+_WORDS = ("where", "is", "the", "key", "maybe", "look", "at", "this", "monkey",
+          "hmm", "I", "think", "we", "need", "to", "check", "under", "bed")
+
+
+def _solution_steps():
+    """
+    Split the solution into steps, each an examine followed by the actions
+    on what was examined. A step is entered all at once, so that other
+    commands of the same player don't change the focus in between.
+
+    Returns:
+        steps (list): (state, commands) for each step.
+
+    """
+    steps = []
+    for state, commands in SOLUTION[:-1]:
+        for command in commands:
+            if command == "leave":
+                # we want the room to stay
+                continue
+            if not steps or steps[-1][0] != state or command.startswith("examine"):
+                steps.append((state, []))
+            steps[-1][1].append(command)
+    return steps
+
+
+def _no_log(*args, **kwargs):
+    pass
+
+
+# session ids for the players, clear of those used by the test harness
+_SESSIDS = count(10000)
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class LoadScheduler(object):
+    """
+    Runs timed calls in order and in real time, standing in for the
+    reactor. Its `delay` replaces Evennia's during the run.
+
+    """
+    def __init__(self):
+        # (due, order, callback, args, kwargs)
+        self.queue = []
+        self.order = count()
+        # how late each call started, in seconds
+        self.lags = []
+
+    def call_at(self, due, callback, *args, **kwargs):
+        heapq.heappush(self.queue, (due, next(self.order), callback, args, kwargs))
+
+    def delay(self, timedelay, callback, *args, **kwargs):
+        kwargs.pop("persistent", None)
+        self.call_at(time.perf_counter() + timedelay, callback, *args, **kwargs)
+        return succeed(None)
+
+    def run_until(self, end):
+        """
+        Run all calls due before `end` (a `time.perf_counter` time), waiting
+        for them as needed.
+
+        """
+        while self.queue and self.queue[0][0] < end:
+            due, _, callback, args, kwargs = heapq.heappop(self.queue)
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            self.lags.append(time.perf_counter() - due)
+            callback(*args, **kwargs)
+
+    def finish(self, skip=()):
+        """
+        Run all remaining calls at once, so nothing (like a flush) is left
+        waiting for a scheduler that no longer runs.
+
+        Args:
+            skip (tuple, optional): Callbacks to drop instead of running.
+
+        """
+        while self.queue:
+            _, _, callback, args, kwargs = heapq.heappop(self.queue)
+            if callback not in skip:
+                callback(*args, **kwargs)
+
+
+class LoadGenerator(object):
+    """
+    Generates load on a number of rooms at once.
+
+    """
+    def __init__(self, nrooms, nplayers=4, rate=0.2, home=None, seed=1,
+                 character_typeclass=settings.BASE_CHARACTER_TYPECLASS):
+        """
+        Args:
+            nrooms (int): Number of rooms to create.
+            nplayers (int, optional): Number of players in each room.
+            rate (float, optional): Commands per second entered by each
+                player (on average, at random intervals).
+            home (Object, optional): Where players go when they leave.
+            seed (int, optional): Seed for the players' choices and the
+                rooms' random generators.
+            character_typeclass (str, optional): Typeclass of the players.
+
+        """
+        self.nrooms = nrooms
+        self.nplayers = nplayers
+        self.rate = rate
+        self.home = home
+        self.rng = random.Random(seed)
+        self.character_typeclass = character_typeclass
+        self.scheduler = LoadScheduler()
+        self.steps = _solution_steps()
+        self.rooms = []
+        # room: index of its next solution step
+        self.progress = {}
+        # (character, room, is_leader)
+        self.players = []
+        # character: its session
+        self.sessions = {}
+        self.accounts = []
+        # (service seconds, latency seconds) per command
+        self.timings = []
+        self.outputs = 0
+        self.memory = 0
+
+    def _data_out(self, session, **kwargs):
+        """
+        Stands in for `SESSIONS.data_out`: prepares the output for the
+        portal like the server does, but counts it instead of sending it.
+
+        """
+        SESSIONS.clean_senddata(session, kwargs)
+        self.outputs += 1
+
+    def _connect(self, char):
+        """
+        Give a character an account and an in-process session puppeting it,
+        the way Evennia's test sessions are set up.
+
+        """
+        account = create.create_account(char.key, email=None, password="loadtest")
+        self.accounts.append(account)
+        char.locks.add(f"puppet:id({char.id}) or pid({account.id})")
+        session = ServerSession()
+        session.init_session("telnet", ("localhost", "loadtest"), SESSIONS)
+        session.sessid = next(_SESSIDS)
+        SESSIONS.portal_connect(session.get_sync_data())
+        session = SESSIONS.session_from_sessid(session.sessid)
+        SESSIONS.login(session, account, testmode=True)
+        account.puppet_object(session, char)
+        self.sessions[char] = session
+
+    def setup(self):
+        """
+        Create the rooms and players, measuring the memory this takes.
+
+        """
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        with patch.object(ROOMLOG, "log", _no_log), \
+                patch.object(SESSIONS, "data_out", self._data_out):
+            self._create()
+        after, _ = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        self.memory = after - before
+
+    def _create(self):
+        for iroom in range(self.nrooms):
+            room = create.create_object(EvscapeRoom, key=f"Load-{self.nrooms}-{iroom}")
+            room.reseed(self.rng.getrandbits(32))
+            room.statehandler.init_state()
+            self.rooms.append(room)
+            self.progress[room] = 0
+            for iplayer in range(self.nplayers):
+                char = create.create_object(
+                    self.character_typeclass, key=f"Player-{self.nrooms}-{iroom}-{iplayer}",
+                    home=self.home, location=self.home)
+                self._connect(char)
+                join_room(char, room)
+                self.players.append((char, room, iplayer == 0))
+
+    def _choose_commands(self, char, room, leader):
+        """
+        Pick the next command(s) of a player.
+
+        """
+        kinds, weights = zip(*_COMMAND_MIX)
+        kind = self.rng.choices(kinds, weights)[0]
+        if kind == "puzzle":
+            if leader and self.progress[room] < len(self.steps):
+                state, commands = self.steps[self.progress[room]]
+                if state == room.statehandler.current_state_name:
+                    self.progress[room] += 1
+                    return commands
+                # still waiting for the room to move on to the next state
+                return ["look"]
+            kind = "examine"
+        if leader and kind in ("examine", "action"):
+            # the leader keeps its focus for the puzzle
+            kind = "say"
+        objs = [obj for obj in room.content_index.index.values() if obj.pk]
+        if kind == "say":
+            return ["say " + " ".join(self.rng.sample(_WORDS, 4))]
+        if kind == "emote":
+            target = self.rng.choice(objs).key if objs else "me"
+            return [f"emote /me points at /{target}, saying \"look!\""]
+        if kind == "examine" and objs:
+            return ["examine " + self.rng.choice(objs).key]
+        if kind == "action":
+            return [self.rng.choice(_SAFE_ACTIONS)]
+        return ["look"]
+
+    def _turn(self, due, char, room, leader):
+        """
+        A player enters their next command(s), then schedules the next turn.
+
+        """
+        if room.pk and char.location == room:
+            for command in self._choose_commands(char, room, leader):
+                start = time.perf_counter()
+                SESSIONS.data_in(self.sessions[char], text=[[command], {}])
+                end = time.perf_counter()
+                self.timings.append((end - start, end - due))
+        next_due = due + self.rng.expovariate(self.rate)
+        self.scheduler.call_at(next_due, self._turn, next_due, char, room, leader)
+
+    def run(self, seconds):
+        """
+        Run the load.
+
+        Args:
+            seconds (float): How long to run.
+        Returns:
+            report (dict): See `report`.
+
+        """
+        start = time.perf_counter()
+        for char, room, leader in self.players:
+            due = start + self.rng.expovariate(self.rate)
+            self.scheduler.call_at(due, self._turn, due, char, room, leader)
+        with patch_delay(self.scheduler.delay), patch.object(ROOMLOG, "log", _no_log), \
+                patch.object(SESSIONS, "data_out", self._data_out):
+            self.outputs = 0
+            self.scheduler.run_until(start + seconds)
+            elapsed = time.perf_counter() - start
+            self.scheduler.finish(skip=(self._turn,))
+        return self.report(elapsed)
+
+    def report(self, seconds):
+        """
+        Args:
+            seconds (float): The time the load ran.
+        Returns:
+            report (dict): With keys
+                rooms, players (int): Number of rooms and players in each.
+                rate (float): Commands per second per player.
+                seconds (float): The time the load ran.
+                commands (int): Number of commands handled.
+                throughput (float): Commands handled per second.
+                outputs (int): Messages sent to the players' sessions.
+                latency_p50_ms, latency_p99_ms (float): Time from a command
+                    being due until it was handled.
+                service_p50_ms, service_p99_ms (float): Time handling the
+                    command alone.
+                lag_p50_ms, lag_p99_ms, lag_max_ms (float): How late the
+                    scheduled calls started.
+                memory_per_room_kb (float): Memory allocated per room and
+                    its players, when set up.
+                max_rss_kb (int or None): Largest resident size of the
+                    process so far (where available).
+                solved_steps (float): Mean number of solution steps done
+                    per room.
+
+        """
+        service = [timing[0] for timing in self.timings]
+        latency = [timing[1] for timing in self.timings]
+        lags = self.scheduler.lags
+        return {
+            "rooms": self.nrooms,
+            "players": self.nplayers,
+            "rate": self.rate,
+            "seconds": seconds,
+            "commands": len(self.timings),
+            "throughput": len(self.timings) / seconds if seconds else 0.0,
+            "outputs": self.outputs,
+            "latency_p50_ms": _percentile(latency, 50) * 1000,
+            "latency_p99_ms": _percentile(latency, 99) * 1000,
+            "service_p50_ms": _percentile(service, 50) * 1000,
+            "service_p99_ms": _percentile(service, 99) * 1000,
+            "lag_p50_ms": _percentile(lags, 50) * 1000,
+            "lag_p99_ms": _percentile(lags, 99) * 1000,
+            "lag_max_ms": max(lags, default=0.0) * 1000,
+            "memory_per_room_kb": self.memory / 1024 / self.nrooms if self.nrooms else 0.0,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+            "solved_steps": (sum(self.progress.values()) / len(self.progress)
+                             if self.progress else 0.0)}
+
+    def cleanup(self):
+        "Remove the rooms and players"
+        with patch.object(ROOMLOG, "log", _no_log), \
+                patch.object(SESSIONS, "data_out", self._data_out):
+            for room in self.rooms:
+                if room.pk:
+                    room.delete()
+            for session in self.sessions.values():
+                SESSIONS.portal_disconnect(session)
+            for char, _, _ in self.players:
+                if char.pk:
+                    char.delete()
+            for account in self.accounts:
+                if account.pk:
+                    account.delete()
+
+
+def format_report(report):
+    """
+    Format a load report as one line of text.
+
+    """
+    return (f"{report['rooms']:>4} rooms x {report['players']} players: "
+            f"{report['throughput']:7.1f} cmd/s, "
+            f"{report['outputs']:7d} outputs, "
+            f"latency p50 {report['latency_p50_ms']:7.1f}ms p99 {report['latency_p99_ms']:8.1f}ms, "
+            f"lag p99 {report['lag_p99_ms']:8.1f}ms max {report['lag_max_ms']:8.1f}ms, "
+            f"{report['memory_per_room_kb']:7.0f}kB/room")
@@ -0,0 +1,132 @@
+"""
+Lobby room-listing cache
+
+The lobby menu lists all rooms players can join, with their progress and
+number of players. Rather than loading every room from the database each
+time someone opens the menu, we keep a summary of each room in memory. The
+summary is updated by the rooms themselves when their progress or
+occupancy changes, when they are handed out to players and when they are
+deleted.
+
+Players sitting in the lobby's start node are subscribed to changes and
+get their room list refreshed when it changes.
+
+"""
+
+from weakref import WeakSet
+from evennia.utils import logger
+from evennia.utils.utils import delay
+
+# seconds to wait before refreshing the lobby, to bunch changes together
+_REFRESH_DELAY = 2
+
+
+class LobbyCache(object):
+    """
+    In-memory summary of all joinable rooms.
+
+    """
+    def __init__(self):
+        # {room: {"name", "progress", "nplayers"}}. None until loaded.
+        self.rooms = None
+        self.subscribers = WeakSet()
+        self.refresh_pending = False
+
+    def _load(self):
+        """
+        Build the cache from the database. This is only done once.
+
+        """
+        from .room import EvscapeRoom
+        from .roompool import is_pooled
+        self.rooms = {}
+        for room in EvscapeRoom.objects.all():
+            # (a room can be left half-deleted by a crash)
+            if room.pk and not is_pooled(room) and not room.db.deleting:
+                self.rooms[room] = self._summarize(room)
+
+    def _summarize(self, room):
+        stats = room.db.stats or {"progress": 0}
+        return {"name": room.key,
+                "progress": int(stats['progress']),
+                "nplayers": len(room.occupants)}
+
+    def get_rooms(self):
+        """
+        Get the summaries of all joinable rooms.
+
+        Returns:
+            summaries (list): List of (room, summary) tuples.
+
+        """
+        if self.rooms is None:
+            self._load()
+        return list(self.rooms.items())
+
+    def add(self, room):
+        """
+        Add a new room to the listing (such as when it is created).
+
+        """
+        if self.rooms is not None:
+            self.rooms[room] = self._summarize(room)
+        self.refresh()
+
+    def update(self, room, **fields):
+        """
+        Update the summary of a room already in the listing. Rooms not
+        in the listing (like those in the room pool) are ignored.
+
+        Args:
+            room (EvscapeRoom): The room that changed.
+            **fields: The summary fields to update (progress, nplayers etc).
+
+        """
+        if self.rooms is None or room not in self.rooms:
+            return
+        summary = self.rooms[room]
+        fields = {key: val for key, val in fields.items() if summary.get(key) != val}
+        if fields:
+            summary.update(fields)
+            self.refresh()
+
+    def remove(self, room):
+        """
+        Remove a deleted room from the listing.
+
+        """
+        if self.rooms is not None and self.rooms.pop(room, None) is not None:
+            self.refresh()
+
+    def subscribe(self, caller):
+        "Have caller's lobby menu refresh when the listing changes"
+        self.subscribers.add(caller)
+
+    def unsubscribe(self, caller):
+        self.subscribers.discard(caller)
+
+    def refresh(self):
+        """
+        Schedule a refresh of the room listing for everyone in the lobby.
+
+        """
+        if self.subscribers and not self.refresh_pending:
+            self.refresh_pending = True
+            delay(_REFRESH_DELAY, self._refresh_subscribers)
+
+    def _refresh_subscribers(self):
+        self.refresh_pending = False
+        for caller in list(self.subscribers):
+            menu = caller.ndb._menutree
+            if not (menu and menu.nodename == "node_start"):
+                # no longer in the lobby listing
+                self.subscribers.discard(caller)
+                continue
+            try:
+                menu.goto("node_start", "")
+            except Exception:
+                logger.log_trace("Evscaperoom: Error refreshing lobby.")
+                self.subscribers.discard(caller)
+
+
+LOBBY = LobbyCache()
@@ -8,10 +8,10 @@ or join an existing room (with other players).
 """
 from evennia import EvMenu
 from evennia.utils.evmenu import list_node
-from evennia.utils import create, justify, list_to_string
+from evennia.utils import justify, list_to_string
 from evennia.utils import logger
-from .room import EvscapeRoom
-from .utils import create_fantasy_word
+from .lobby import LOBBY
+from . import roompool
 
 # ------------------------------------------------------------
 # Main menu
@@ -55,6 +55,7 @@ def _move_to_room(caller, raw_string, **kwargs):
 
     """
     room = kwargs['room']
+    LOBBY.unsubscribe(caller)
     room.msg_char(caller, f"Entering room |c'{room.name}'|n ...")
     room.msg_room(caller, f"~You |c~were just tricked in here too!|n")
     # we do a manual move since we don't want all hooks to fire.
@@ -66,20 +67,14 @@ def _move_to_room(caller, raw_string, **kwargs):
 
 def _create_new_room(caller, raw_string, **kwargs):
 
-    # create a random name, retrying until we find
-    # a unique one
-    key = create_fantasy_word(length=5, capitalize=True)
-    while EvscapeRoom.objects.filter(db_key=key):
-        key = create_fantasy_word(length=5, capitalize=True)
-    room = create.create_object(EvscapeRoom, key=key)
-    # we must do this once manually for the new room
-    room.statehandler.init_state()
+    # get a ready-made room from the pool (or make a new one)
+    room = roompool.checkout_room()
     _move_to_room(caller, "", room=room)
 
-    nrooms = EvscapeRoom.objects.all().count()
-    logger.log_info(f"Evscaperoom: {caller.key} created room '{key}' (#{room.id}). Now {nrooms} room(s) active.")
+    nrooms = len(LOBBY.get_rooms())
+    logger.log_info(f"Evscaperoom: {caller.key} created room '{room.key}' (#{room.id}). Now {nrooms} room(s) active.")
 
-    room.log(f"JOIN: {caller.key} created and joined room")
+    room.log(f"JOIN: {caller.key} created and joined room", caller=caller, event="create_join")
     return "node_quit", {"quiet": True}
 
 
@@ -91,14 +86,9 @@ def _get_all_rooms(caller):
     """
     room_option_descs = []
     room_map = {}
-    for room in EvscapeRoom.objects.all():
-        if not room.pk or room.db.deleting:
-            continue
-        stats = room.db.stats or {"progress": 0}
-        progress = int(stats['progress'])
-        nplayers = len(room.get_all_characters())
+    for room, summary in LOBBY.get_rooms():
         desc = (f"Join room |c'{room.get_display_name(caller)}'|n "
-                f"(complete: {progress}%, players: {nplayers})")
+                f"(complete: {summary['progress']}%, players: {summary['nplayers']})")
         room_map[desc] = room
         room_option_descs.append(desc)
     caller.ndb._menutree.room_map = room_map
@@ -115,6 +105,9 @@ def _select_room(caller, menuchoice, **kwargs):
 
 @list_node(_get_all_rooms, _select_room)
 def node_start(caller, raw_string, **kwargs):
+    # refresh this node when the room listing changes
+    LOBBY.subscribe(caller)
+
     text = _START_TEXT.strip()
     text = text.format(name=caller.key, desc=caller.db.desc)
 
@@ -200,6 +193,7 @@ def node_join_room(caller, raw_string, **kwargs):
 
 
 def node_quit(caller, raw_string, **kwargs):
+    LOBBY.unsubscribe(caller)
     quiet = kwargs.get("quiet")
     text = ""
     if not quiet:
@@ -263,9 +257,9 @@ def run_evscaperoom_menu(caller):
 
 def _set_thing_style(caller, raw_string, **kwargs):
     room = caller.location
-    options = caller.attributes.get("options", category=room.tagcategory, default={})
+    options = room.playerstate.get(caller, "options", default={})
     options["things_style"] = kwargs.get("value", 2)
-    caller.attributes.add("options", options, category=room.tagcategory)
+    room.playerstate.set(caller, "options", options)
     return None, kwargs  # rerun node
 
 
@@ -283,7 +277,7 @@ def node_options(caller, raw_string, **kwargs):
     text = "|cOption menu|n\n('|wq|nuit' to return)"
     room = caller.location
 
-    options = caller.attributes.get("options", category=room.tagcategory, default={})
+    options = room.playerstate.get(caller, "options", default={})
     things_style = options.get("things_style", 2)
 
     session = kwargs['session']  # we give this as startnode_input when starting menu
@@ -3,11 +3,15 @@ Base objects for the Evscaperoom contrib.
 
 """
 import re
-import inspect
 from evennia import DefaultObject
-from evennia.utils.utils import list_to_string, wrap
+from evennia.utils.utils import lazy_property, list_to_string, wrap
 from .utils import create_evscaperoom_object
-from .utils import parse_for_perspectives, parse_for_things
+from .utils import compile_template, parse_for_things
+from .catalog import CATALOG
+from .flags import FlagStore
+
+# most appearances to cache per object
+_MAX_APPEARANCES = 32
 
 
 class EvscaperoomObject(DefaultObject):
@@ -27,20 +31,19 @@ class EvscaperoomObject(DefaultObject):
                          "lie": "lying",
                          "climb": "standing"}
 
+    # used if no desc is set. This is not stored on the object.
+    default_desc = "Nothing of interest."
+
     def at_object_creation(self):
         """
         Called once when object is first created.
 
         """
-        # state flags (setup/reset for each state).
-        self.db.tagcategory = None
-        self.db.flags = {}
-
-        self.db.desc = "Nothing of interest."
-
         self.db.positions = {}
 
     _tagcategory = None
+    # {cachekey: text}, for the short desc and action help, see _get_cached
+    _appearance_cache = None
 
     @property
     def tagcategory(self):
@@ -69,35 +72,67 @@ class EvscaperoomObject(DefaultObject):
         """
         self.room.statehandler.next_state(next_state=statename)
 
+    def delete(self):
+        "Make sure to remove us from the room's indexes and flags"
+        if hasattr(self.location, "content_index"):
+            self.location.content_index.remove(self)
+            self.location.name_resolver.invalidate()
+        self._get_flagstore().clear(self)
+        return super().delete()
+
+    # state flags (setup/reset for each state). These are stored
+    # by the room, see flags.py
+
+    @lazy_property
+    def flagstore(self):
+        return FlagStore(self)
+
+    def _get_flagstore(self):
+        "Flags are stored by our room, or by ourselves if we are not in one"
+        return getattr(self.location, "flagstore", None) or self.flagstore
+
     def set_flag(self, flagname):
         "Set flag on object"
-        self.db.flags[flagname] = True
+        self._get_flagstore().set(self, flagname)
 
     def unset_flag(self, flagname):
         "Unset flag on object"
-        if flagname in self.db.flags:
-            del self.db.flags[flagname]
+        self._get_flagstore().unset(self, flagname)
 
     def check_flag(self, flagname):
         "Check if flag is set on this object"
-        return self.db.flags.get(flagname, False)
+        return self._get_flagstore().check(self, flagname)
+
+    def clear_flags(self):
+        "Unset all flags on this object"
+        self._get_flagstore().clear(self)
+
+    def get_flags(self):
+        """
+        Get all flags set on this object.
+
+        Returns:
+            flags (dict): {flagname: True} for each flag set.
+
+        """
+        return {flagname: True for flagname in self._get_flagstore().get_flags(self)}
 
     def set_character_flag(self, char, flagname, value=True):
         "Set flag on character"
-        flags = char.attributes.get(flagname, category=self.tagcategory, default={})
+        flags = self.room.playerstate.get(char, flagname, default={})
         flags[flagname] = value
-        char.attributes.add(flagname, flags, category=self.tagcategory)
+        self.room.playerstate.set(char, flagname, flags)
 
     def unset_character_flag(self, char, flagname):
         "Set flag on character"
-        flags = char.attributes.get(flagname, category=self.tagcategory, default={})
+        flags = self.room.playerstate.get(char, flagname, default={})
         if flagname in flags:
             flags.pop(flagname, None)
-            char.attributes.add(flagname, flags, category=self.tagcategory)
+            self.room.playerstate.set(char, flagname, flags)
 
     def check_character_flag(self, char, flagname):
         "Check if flag is set on character"
-        flags = char.attributes.get(flagname, category=self.tagcategory, default={})
+        flags = self.room.playerstate.get(char, flagname, default={})
         return flags.get(flagname, False)
 
     def msg_room(self, caller, string, skip_caller=False):
@@ -117,20 +152,29 @@ class EvscaperoomObject(DefaultObject):
             allowing users of e.g. the webclient to redirect messages to
             differnt windows.
 
+            Each (perspective, things_style) variant of the message is only
+            rendered once per call, then the same string is sent to everyone
+            sharing that combination.
+
         """
         you = caller.key if caller else "they"
-        first_person, third_person = parse_for_perspectives(string, you=you)
+        template = compile_template(string)
+        # (msgtype, things_style): rendered text
+        rendered = {}
         for char in self.room.get_all_characters():
-            options = char.attributes.get(
-                "options", category=self.room.tagcategory, default={})
-            style = options.get("things_style", 2)
             if char == caller:
-                if not skip_caller:
-                    txt = parse_for_things(first_person, things_style=style)
-                    char.msg((txt, {'type': 'your_action'}))
+                if skip_caller:
+                    continue
+                perspective, msgtype = "first", "your_action"
             else:
-                txt = parse_for_things(third_person, things_style=style)
-                char.msg((txt, {'type': 'others_action'}))
+                perspective, msgtype = "third", "others_action"
+            options = self.room.playerstate.get(char, "options", default={})
+            style = options.get("things_style", 2)
+            txt = rendered.get((msgtype, style))
+            if txt is None:
+                txt = rendered[(msgtype, style)] = template.render(
+                    perspective, you=you, things_style=style)
+            char.msg((txt, {'type': msgtype}))
 
     def msg_char(self, caller, string, client_type="your_action"):
         """
@@ -138,11 +182,9 @@ class EvscaperoomObject(DefaultObject):
 
         """
         # we must clean away markers
-        first_person, _ = parse_for_perspectives(string)
-        options = caller.attributes.get(
-            "options", category=self.room.tagcategory, default={})
+        options = self.room.playerstate.get(caller, "options", default={})
         style = options.get("things_style", 2)
-        txt = parse_for_things(first_person, things_style=style)
+        txt = compile_template(string).render("first", things_style=style)
         caller.msg((txt, {"type": client_type}))
 
     def msg_system(self, message, target=None, borders=True):
@@ -166,7 +208,7 @@ class EvscaperoomObject(DefaultObject):
                 floor.
 
         """
-        pos = caller.attributes.get("position", category=self.tagcategory)
+        pos = self.room.playerstate.get(caller, "position")
         if pos:
             obj, old_position = pos
             return obj, old_position
@@ -186,14 +228,13 @@ class EvscaperoomObject(DefaultObject):
         """
         if new_position is None:
             # reset position
-            caller.attributes.remove(
-                "position", category=self.tagcategory)
+            self.room.playerstate.remove(caller, "position")
             if caller in self.db.positions:
                 del self.db.positions[caller]
         else:
             # set a new position on this object
             position = (self, new_position)
-            caller.attributes.add("position", position, category=self.tagcategory)
+            self.room.playerstate.set(caller, "position", position)
             self.db.positions[caller] = new_position
 
     def at_focus(self, caller):
@@ -242,6 +283,31 @@ class EvscaperoomObject(DefaultObject):
                       "", args)
         return args
 
+    @classmethod
+    def get_focus_actions(cls):
+        """
+        Get the actions supported by this class of object, as found from the
+        `at_focus_<action>` methods on it and its parents. This is worked
+        out only once per class and then cached on it.
+
+        Returns:
+            actions (dict): {action: function}, sorted by action. The
+                function is unbound, so call it as `function(obj, caller,
+                **kwargs)`.
+
+        """
+        # look only in the class' own dict, a parent's table doesn't apply
+        actions = cls.__dict__.get("_focus_actions")
+        if actions is None:
+            actions = {}
+            for name in dir(cls):
+                if name.startswith("at_focus_"):
+                    func = getattr(cls, name)
+                    if callable(func):
+                        actions[name[9:]] = func
+            cls._focus_actions = actions
+        return actions
+
     def get_cmd_signatures(self):
         """
         This allows the object to return more detailed call signs
@@ -257,13 +323,8 @@ class EvscaperoomObject(DefaultObject):
                 inject the list of callsigns.
 
         """
-        command_signatures = []
         helpstr = ""
-        methods = inspect.getmembers(self, predicate=inspect.ismethod)
-        for name, method in methods:
-            if name.startswith("at_focus_"):
-                command_signatures.append(name[9:])
-        command_signatures = sorted(command_signatures)
+        command_signatures = list(self.get_focus_actions())
 
         if len(command_signatures) == 1:
             helpstr = (f"It looks like {self.key} may be "
@@ -273,6 +334,33 @@ class EvscaperoomObject(DefaultObject):
                        "suitable to {callsigns}.")
         return command_signatures, helpstr
 
+    def get_desc(self):
+        """
+        Get the description of this object. A desc set on the object itself
+        is used first, then the shared desc from the catalog.
+
+        """
+        desc = self.attributes.get("desc")
+        if desc is None:
+            ref = self.attributes.get("desc_ref")
+            if ref:
+                desc = CATALOG.get(ref)
+        return self.default_desc if desc is None else desc
+
+    def set_desc(self, desc):
+        """
+        Set the description of this object. If the desc is one of the
+        static texts in the catalog, only a reference to it is stored.
+
+        Args:
+            desc (str): The new description.
+
+        """
+        key, value = CATALOG.desc_attribute(desc)
+        self.attributes.add(key, value)
+        self.attributes.remove("desc_ref" if key == "desc" else "desc")
+        self.clear_appearance_cache()
+
     def get_short_desc(self, full_desc):
         """
         Extract the first sentence from the desc and use as the short desc.
@@ -292,16 +380,47 @@ class EvscaperoomObject(DefaultObject):
         # custom-created signatures. We don't sort these
         command_signatures, helpstr = self.get_cmd_signatures()
 
-        callsigns = list_to_string(["*" + sig for sig in command_signatures], endsep="or")
-
         # parse for *thing markers (use these as items)
-        options = caller.attributes.get(
-            "options", category=self.room.tagcategory, default={})
+        options = self.room.playerstate.get(caller, "options", default={})
         style = options.get("things_style", 2)
 
-        helpstr = helpstr.format(callsigns=callsigns)
-        helpstr = parse_for_things(helpstr, style, clr="|w")
-        return wrap(helpstr, width=80)
+        def _format():
+            callsigns = list_to_string(["*" + sig for sig in command_signatures], endsep="or")
+            return wrap(parse_for_things(helpstr.format(callsigns=callsigns), style, clr="|w"),
+                        width=80)
+
+        # the signatures can depend on the object's state (like where it
+        # stands), so we cache on them rather than on the object
+        return self._get_cached(("help", tuple(command_signatures), helpstr, style), _format)
+
+    def _get_cached(self, cachekey, create):
+        """
+        Get a cached part of the appearance, creating it if needed.
+
+        Args:
+            cachekey (tuple): All the inputs of the text.
+            create (callable): Called without arguments to make the text.
+        Returns:
+            text (str): The text.
+
+        """
+        if self._appearance_cache is None:
+            self._appearance_cache = {}
+        text = self._appearance_cache.get(cachekey)
+        if text is None:
+            if len(self._appearance_cache) >= _MAX_APPEARANCES:
+                self._appearance_cache.clear()
+            text = self._appearance_cache[cachekey] = create()
+        return text
+
+    def clear_appearance_cache(self):
+        """
+        Forget the cached appearances of this object. The cache keys hold
+        all inputs of the texts, so this is never needed for correctness;
+        `set_desc` calls it only to drop texts of the old desc at once.
+
+        """
+        self._appearance_cache = None
 
     # Evennia hooks
 
@@ -309,24 +428,33 @@ class EvscaperoomObject(DefaultObject):
         """ Could be modified per state. We generally don't worry about the
         contents of the object by default.
 
+        The short desc and the formatted action help are cached (see
+        `get_help`), since they are the same for everyone using the same
+        things_style.
+
         """
         # accept a custom desc
-        desc = kwargs.get("desc", self.db.desc)
+        desc = kwargs.get("desc")
+        if desc is None:
+            desc = self.get_desc()
+        unfocused = bool(kwargs.get('unfocused', False))
 
-        if kwargs.get('unfocused', False):
+        if unfocused:
             # use the shorter description
-            focused = ""
-            desc = self.get_short_desc(desc)
-            helptxt = ""
+            body = self._get_cached(("short", desc), lambda: self.get_short_desc(desc))
         else:
-            focused = " |g(examining |G- use '|gex|G' again to look away. See also '|ghelp|G')|n"
-            helptxt = kwargs.get("helptxt", f"\n\n({self.get_help(looker)})")
+            helptxt = kwargs.get("helptxt")
+            if helptxt is None:
+                helptxt = f"\n\n({self.get_help(looker)})"
+            body = desc + helptxt
 
+        focused = ("" if unfocused else
+                   " |g(examining |G- use '|gex|G' again to look away. See also '|ghelp|G')|n")
         obj, pos = self.get_position(looker)
         pos = (f" |w({self.position_prep_map[pos]} on "
                f"{obj.get_display_name(looker)})" if obj else "")
 
-        return f" ~~ |y{self.get_display_name(looker)}|n{focused}{pos}|n ~~\n\n{desc}{helptxt}"
+        return f" ~~ |y{self.get_display_name(looker)}|n{focused}{pos}|n ~~\n\n{body}"
 
 
 class Feelable(EvscaperoomObject):
@@ -803,7 +931,8 @@ class Mixable(EvscaperoomObject):
             if self.check_mixture():
                 self.at_mix_success(caller, ingredient, **kwargs)
             else:
-                self.room.log(f"{self.name} mix failure: Tried {' + '.join([ing.key for ing in self.db.ingredients if ing])}")
+                self.room.log(f"{self.name} mix failure: Tried {' + '.join([ing.key for ing in self.db.ingredients if ing])}",
+                              caller=caller, event="mix_failure")
                 self.db.ingredients = []
                 self.at_mix_failure(caller, ingredient, **kwargs)
 
@@ -0,0 +1,135 @@
+"""
+Coalescing of outgoing messages
+
+A single command often sends several messages to the same character (the
+state's message followed by a cinematic, the room message and the personal
+message when sitting down, one ending after the other ...). Each is sent to
+the client on its own, as its own websocket frame or telnet write.
+
+Instead, the messages to a character are collected here during the current
+reactor tick and sent together at the end of it. Messages following each
+other with the same metadata (like `{"type": "your_action"}`) are joined
+into one message, so the client still knows what kind of text each part is.
+
+Only plain text messages are collected. Anything else (prompts with
+options, messages to a specific session, messages with a `from_obj` etc)
+first sends what's been collected for the character and is then sent as
+usual, so the order of the messages is kept.
+
+The game's Character typeclass sends its messages through `OUTPUT`. Set
+`EVSCAPEROOM_COALESCE_OUTPUT = False` in settings to send every message
+at once instead.
+
+"""
+
+from django.conf import settings
+from evennia.utils import logger
+from evennia.utils.utils import delay
+
+_COALESCE = getattr(settings, "EVSCAPEROOM_COALESCE_OUTPUT", True)
+
+
+def _split_text(text):
+    """
+    Split the text given to `msg` into the string and its metadata.
+
+    Returns:
+        string, metadata (str, dict): Or `None, None` if this is not
+            a plain text message.
+
+    """
+    if isinstance(text, str):
+        return text, {}
+    if (isinstance(text, tuple) and len(text) == 2
+            and isinstance(text[0], str) and isinstance(text[1], dict)):
+        return text
+    return None, None
+
+
+class OutputBuffer(object):
+    """
+    Collects the messages to each character during a reactor tick.
+
+    """
+    def __init__(self):
+        # character: [(string, metadata), ...], in order
+        self.queues = {}
+        self.flush_pending = False
+
+    def add(self, char, text=None, **kwargs):
+        """
+        Collect a message to a character, if possible.
+
+        Args:
+            char (Object): The one to receive the message.
+            text (str or tuple): The message, as given to `msg`.
+            **kwargs: Any other keywords given to `msg`.
+        Returns:
+            collected (bool): If the message was collected. If not, the
+                caller should send it at once (anything already collected
+                for the character has been sent before returning).
+
+        """
+        string, metadata = _split_text(text)
+        if not _COALESCE or string is None or any(val is not None for val in kwargs.values()):
+            self.flush_char(char)
+            return False
+        self.queues.setdefault(char, []).append((string, metadata))
+        if not self.flush_pending:
+            self.flush_pending = True
+            # runs once the current reactor tick is done
+            delay(0, self._delayed_flush)
+        return True
+
+    def _delayed_flush(self):
+        self.flush_pending = False
+        self.flush()
+
+    def _send(self, char, messages):
+        """
+        Send collected messages, joining those following each other with
+        the same metadata.
+
+        """
+        if not char.pk:
+            # deleted since
+            return
+        runs = []
+        for string, metadata in messages:
+            if runs and runs[-1][1] == metadata:
+                runs[-1][0].append(string)
+            else:
+                runs.append(([string], metadata))
+        for strings, metadata in runs:
+            string = "\n".join(strings)
+            char.msg(text=(string, metadata) if metadata else string, buffered=False)
+
+    def flush_char(self, char):
+        "Send what's collected for one character"
+        messages = self.queues.pop(char, None)
+        if messages:
+            self._send(char, messages)
+
+    def flush(self):
+        "Send everything collected"
+        queues, self.queues = self.queues, {}
+        for char, messages in queues.items():
+            try:
+                self._send(char, messages)
+            except Exception:
+                logger.log_trace(f"Evscaperoom: Error sending output to {char}")
+
+
+OUTPUT = OutputBuffer()
+
+
+def flush_all():
+    """
+    Send all collected messages. This is called when the server reloads or
+    shuts down.
+
+    """
+    try:
+        OUTPUT.flush()
+    except Exception:
+        logger.log_trace("Error flushing evscaperoom output")
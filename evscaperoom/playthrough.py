@@ -0,0 +1,218 @@
+"""
+Scripted playthrough of the whole game
+
+A bot plays the room from `state_001_start` to the questions at the end of
+`state_012_questions_and_endings`, following the solution path below and
+entering every command through the normal command dispatch (look, examine,
+the focus actions and the answers to the ending questions). This is done
+with the replayer from replay.py, twice: once for the timings and queries
+and once (much slower) with memory tracing.
+
+The result is a report (a dict, also written as JSON) with the time, queries
+and memory used per state and per command, meant to be compared between
+commits to catch performance regressions before deploying. Run it with
+
+    evennia test evscaperoom.benchmarks.BenchPlaythrough
+
+If the solution path stops working (the bot doesn't reach the end of the
+game), the puzzles were changed and SOLUTION needs to be updated too.
+
+"""
+
+import json
+import platform
+import subprocess
+import time
+from .replay import RecordedSession, SessionReplayer
+
+# the name of the player doing the playthrough
+_PLAYER = "Bot"
+# the room is seeded to always give the same replies
+_SEED = 1
+
+# (state, commands) for each state, in order
+SOLUTION = [
+    ("state_001_start", [
+        "look",
+        "examine table", "climb",
+        "examine rafters", "examine coin", "turn",
+        "insert in statue"]),
+    ("state_002_automaton", [
+        "look",
+        "examine statue", "speak Vale"]),
+    ("state_003_locked_closet", [
+        "look",
+        "examine closet", "padlock", "code 4321"]),
+    ("state_004_childmaker_potion", [
+        "look",
+        "examine kitchen", "bottles",
+        "examine bottle3", "smell", "use with bowl",
+        "examine bottle1", "use with bowl",
+        "examine bottle5", "use with bowl",
+        "examine bottle2", "use with bowl",
+        "examine bottle3", "use with bowl",
+        "examine hair", "use with bowl"]),
+    ("state_005_wind_turns", [
+        "look",
+        "examine closet", "drawers",
+        "examine blanket", "use with windows",
+        "examine towel", "use with windows"]),
+    ("state_006_dark_room", [
+        "look",
+        "examine painting", "turn",
+        "examine damper", "open",
+        "examine chair", "move to fireplace", "climb",
+        "examine stone", "push"]),
+    ("state_007_chest_lever", [
+        "look",
+        "examine floor", "lie",
+        "examine bed", "under",
+        "stand",
+        "examine chest",
+        "examine socks", "use with lever",
+        "examine lever", "read", "insert in chest"]),
+    ("state_008_open_chest", [
+        "look",
+        "examine lever",
+        "move right", "move left", "move up", "move right", "move left",
+        "move down", "move down", "move right", "move up", "move left",
+        "rotate",
+        "examine chest", "open"]),
+    ("state_009_fertilizer", [
+        "look",
+        "examine letter", "read",
+        "examine childmaker", "use with plant",
+        "examine ashes", "use with plant", "use with plant", "use with plant",
+        "examine hintberry", "use with plant",
+        "examine plant", "feel"]),
+    ("state_010_burn_firewood", [
+        "look",
+        "examine rosebush", "move to fireplace",
+        "examine glass", "use on rosebush"]),
+    ("state_011_exit_room", [
+        "look",
+        "examine cauldron", "dig",
+        "examine key", "insert in door",
+        "examine door", "open", "leave"]),
+    ("state_012_questions_and_endings", [
+        # press return, then answer each question and confirm it
+        "",
+        "Warwick", "y",
+        "Agda", "y",
+        "Bullington", "y",
+        # the endings and the scoreboard, after which the bot leaves (the
+        # number of endings varies, extra input is not used)
+        "", "", "", "", "", "", "", "", "", ""]),
+]
+
+
+def playthrough_session():
+    """
+    Build the session for the replayer to play.
+
+    Returns:
+        session (RecordedSession): One player joining and entering all
+            the commands of `SOLUTION`.
+
+    """
+    session = RecordedSession("Playthrough", _SEED, time.time())
+    session.events.append((0, "join", _PLAYER, {}))
+    for _, commands in SOLUTION:
+        for command in commands:
+            session.events.append((0, "input", _PLAYER, {"message": command}))
+    return session
+
+
+def _get_commit():
+    "The current git commit, if we can find it"
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_playthrough(home=None, filename=None):
+    """
+    Play through the game, measuring time, queries and memory.
+
+    Args:
+        home (Object, optional): Where the bot goes when it leaves the room.
+        filename (str, optional): If given, write the report as JSON to
+            this file.
+    Returns:
+        report (dict): The results, like the report of the replayer, with
+            the memory measurements of the traced run merged in and with
+            the keys `commit`, `python` and `timestamp` added. It also has a
+            `completed` key, which is `False` if the bot got stuck before
+            finishing the last state and leaving the room.
+
+    """
+    results = []
+    for trace_memory in (False, True):
+        replayer = SessionReplayer(playthrough_session(), home=home,
+                                   trace_memory=trace_memory)
+        try:
+            results.append(replayer.run())
+        finally:
+            replayer.cleanup()
+    report, traced = results
+
+    for state, stats in report["per_state"].items():
+        traced_stats = traced["per_state"].get(state, {})
+        stats["allocated_kb"] = traced_stats.get("allocated_kb", 0.0)
+        stats["peak_kb"] = traced_stats.get("peak_kb", 0.0)
+    report["peak_kb"] = max((stats["peak_kb"] for stats in report["per_state"].values()),
+                            default=0.0)
+    report["completed"] = report["final_state"] == SOLUTION[-1][0] and report["closed"]
+    report["commit"] = _get_commit()
+    report["python"] = platform.python_version()
+    report["timestamp"] = time.time()
+
+    if filename:
+        with open(filename, "w", encoding="utf-8") as fil:
+            json.dump(report, fil, indent=2, sort_keys=True)
+    return report
+
+
+def compare_reports(old, new):
+    """
+    Compare two playthrough reports, such as from two commits.
+
+    Args:
+        old (dict): The earlier report (the baseline).
+        new (dict): The report to compare with it.
+    Returns:
+        text (str): Time and queries per state in both reports.
+
+    """
+    lines = [f"Playthrough {old.get('commit')} -> {new.get('commit')}:"]
+    for state, new_stats in new["per_state"].items():
+        old_stats = old["per_state"].get(state)
+        if not old_stats:
+            lines.append(f"  {state:<35} (new state)")
+            continue
+        ratio = new_stats["seconds"] / old_stats["seconds"] if old_stats["seconds"] else 0
+        lines.append(
+            f"  {state:<35} {old_stats['seconds'] * 1000:8.1f}ms -> "
+            f"{new_stats['seconds'] * 1000:8.1f}ms (x{ratio:.2f}), "
+            f"{old_stats['queries']} -> {new_stats['queries']} queries, "
+            f"peak {old_stats['peak_kb']:.0f}kB -> {new_stats['peak_kb']:.0f}kB")
+    return "\n".join(lines)
+
+
+def format_report(report):
+    """
+    Format a playthrough report as text.
+
+    """
+    lines = [f"Playthrough ({'completed' if report['completed'] else 'INCOMPLETE'}, "
+             f"final state {report['final_state']}): {report['commands']} commands in "
+             f"{report['seconds'] * 1000:.1f}ms, {report['queries']} queries, "
+             f"peak {report['peak_kb']:.0f}kB, score {report['score']}."]
+    for state, stats in report["per_state"].items():
+        lines.append(f"  {state:<35} {stats['commands']:>3} commands "
+                     f"{stats['seconds'] * 1000:8.1f}ms {stats['queries']:>5} queries "
+                     f"allocated {stats['allocated_kb']:8.1f}kB peak {stats['peak_kb']:8.1f}kB")
+    return "\n".join(lines)
@@ -0,0 +1,135 @@
+"""
+Empty-room reaper
+
+When the last player leaves a room without quitting (such as by closing
+their browser window), the room is left empty. Rather than scanning all
+rooms for this, the room tells the reaper when it becomes empty and the
+reaper deletes it once a grace period has passed without anyone coming
+back.
+
+Deadlines are kept in a timer wheel: a ring of slots, each holding the
+rooms due when the wheel's hand reaches it. Scheduling, cancelling and
+expiring a room are all O(1), no matter how many rooms are live.
+
+The grace period is set with `EVSCAPEROOM_EMPTY_ROOM_GRACE` (in seconds)
+in settings.
+
+"""
+
+from math import ceil
+from django.conf import settings
+from twisted.internet import task
+from evennia.utils import logger
+
+_GRACE = getattr(settings, "EVSCAPEROOM_EMPTY_ROOM_GRACE", 60)
+# seconds per wheel slot
+_TICK = 5
+
+
+class TimerWheel(object):
+    """
+    A simple timer wheel. Items are placed in the slot matching their
+    deadline and are returned by `advance` when the hand reaches that slot.
+    A deadline can be at most one full turn of the wheel away.
+
+    """
+    def __init__(self, nslots, tick):
+        """
+        Args:
+            nslots (int): Number of slots in the wheel.
+            tick (int or float): Seconds between each advance of the wheel.
+
+        """
+        self.tick = tick
+        self.slots = [set() for _ in range(nslots)]
+        self.hand = 0
+        # item: slot
+        self.deadlines = {}
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, item):
+        return item in self.deadlines
+
+    def schedule(self, item, timeout):
+        """
+        Schedule an item to expire after `timeout` seconds. If it was already
+        scheduled, its deadline is moved.
+
+        """
+        self.cancel(item)
+        nslots = len(self.slots)
+        steps = min(max(1, ceil(timeout / self.tick)), nslots - 1)
+        slot = (self.hand + steps) % nslots
+        self.slots[slot].add(item)
+        self.deadlines[item] = slot
+
+    def cancel(self, item):
+        "Remove an item from the wheel, if it's there"
+        slot = self.deadlines.pop(item, None)
+        if slot is not None:
+            self.slots[slot].discard(item)
+
+    def advance(self):
+        """
+        Move the hand one slot forward.
+
+        Returns:
+            expired (set): The items whose deadline was reached.
+
+        """
+        self.hand = (self.hand + 1) % len(self.slots)
+        expired, self.slots[self.hand] = self.slots[self.hand], set()
+        for item in expired:
+            del self.deadlines[item]
+        return expired
+
+
+class EmptyRoomReaper(object):
+    """
+    Deletes rooms that have stayed empty for the grace period.
+
+    """
+    def __init__(self, grace=_GRACE, tick=_TICK):
+        self.grace = grace
+        self.wheel = TimerWheel(int(ceil(grace / tick)) + 2, tick)
+        self.looper = None
+
+    def schedule(self, room):
+        """
+        Start the countdown for deleting an empty room.
+
+        """
+        self.wheel.schedule(room, self.grace)
+        if not (self.looper and self.looper.running):
+            self.looper = task.LoopingCall(self._tick)
+            self.looper.start(self.wheel.tick, now=False)
+
+    def cancel(self, room):
+        """
+        Someone entered the room (or it was deleted), stop the countdown.
+
+        """
+        self.wheel.cancel(room)
+
+    def is_scheduled(self, room):
+        return room in self.wheel
+
+    def _tick(self):
+        for room in self.wheel.advance():
+            try:
+                # a last check against the database, players could have
+                # reconnected back into the room
+                if room.pk and not room.db.deleting:
+                    room.reconcile_occupants()
+                if room.pk and not room.db.deleting and not room.get_all_characters():
+                    room.log("END: Room was empty and was cleaned by the reaper.", event="reap")
+                    room.delete()
+            except Exception:
+                logger.log_trace("Evscaperoom: Error reaping empty room.")
+        if not self.wheel and self.looper and self.looper.running:
+            self.looper.stop()
+
+
+REAPER = EmptyRoomReaper()
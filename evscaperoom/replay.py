@@ -0,0 +1,351 @@
+"""
+Replay of recorded room sessions
+
+Every command entered in a room is recorded in the event stream
+(`evscaperoom_events.jsonl`, see roomlog.py), together with who joined the
+room and when, and the seed of the room's random generators. This module
+reads back those recorded sessions and replays them against a fresh room,
+as fast as possible, measuring how long each command took and how many
+database queries it needed. Since the room is re-seeded with the recorded
+seed, the replayed room should end up in the same state with the same
+score as the recorded one.
+
+This needs the database, so it's run in the test harness. To replay all
+sessions in some event logs, run
+
+    EVSCAPEROOM_REPLAY_LOGS="server/logs/evscaperoom_events.jsonl" evennia test evscaperoom.benchmarks.BenchReplay
+
+Notes:
+    The answers to the questions at the end of the game are not given as
+    commands and are not replayed, neither are timed events (like the
+    statue's chatter). Delays in the states' interactive code and the
+    write-behind flushes are not waited for, but run in order right after
+    the command causing them (and are counted to it).
+
+"""
+
+import heapq
+import json
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from itertools import count
+from unittest.mock import patch
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from twisted.internet.defer import succeed
+from evennia.utils import create
+from . import flags, lobby, output, roompool, sessionstate
+from .room import EvscapeRoom
+from .roomlog import ROOMLOG
+
+# modules doing their own `from evennia.utils.utils import delay`
+_DELAY_MODULES = (flags, lobby, output, roompool, sessionstate)
+
+
+class RecordedSession(object):
+    """
+    The recorded events of one room, from its creation to its deletion.
+
+    """
+    def __init__(self, room, seed, created):
+        self.room = room
+        self.seed = seed
+        self.created = created
+        # (timestamp, event, caller, data) with event one of "join", "input"
+        # or "reseed"
+        self.events = []
+        # as recorded, for comparing with the replay
+        self.final_state = None
+        self.score = 0
+
+    @property
+    def players(self):
+        "The names of all players joining the room, in order of first joining"
+        players = []
+        for _, event, caller, _ in self.events:
+            if event == "join" and caller not in players:
+                players.append(caller)
+        return players
+
+
+def load_sessions(lines):
+    """
+    Read recorded sessions from an event stream.
+
+    Args:
+        lines (iterable): Lines of the JSONL event stream, like an open file.
+    Yields:
+        session (RecordedSession): Each room session, once it ends (or at the
+            end of the stream, if still in progress).
+
+    """
+    sessions = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        room, event, caller = record["room"], record["event"], record["caller"]
+        payload = record.get("payload", {})
+        if event == "create":
+            if payload.get("rng_seed") is not None:
+                sessions[room] = RecordedSession(room, payload["rng_seed"], record["timestamp"])
+            continue
+        session = sessions.get(room)
+        if not session:
+            # created before recording started
+            continue
+        if event == "reseed" and not session.events:
+            session.seed = payload.get("rng_seed")
+        elif event in ("join", "input", "reseed"):
+            session.events.append((record["timestamp"], event, caller, payload))
+        elif event == "state":
+            session.final_state = payload.get("state")
+        elif event == "score":
+            session.score += payload.get("score", 0)
+        elif event in ("end", "reap"):
+            del sessions[room]
+            if session.events:
+                yield session
+    for session in sessions.values():
+        if session.events:
+            yield session
+
+
+def join_room(char, room):
+    """
+    Move a character into a room the way the menu does it (without
+    a session or the menu itself).
+
+    """
+    old_location = char.location
+    char.location = room
+    room.at_object_receive(char, old_location)
+
+
+@contextmanager
+def patch_delay(delayfunc):
+    """
+    Replace Evennia's `delay` everywhere the game uses it, for running
+    timed code without the reactor.
+
+    Args:
+        delayfunc (callable): Called like `delay`.
+
+    """
+    with ExitStack() as stack:
+        stack.enter_context(patch("evennia.utils.utils.delay", delayfunc))
+        for module in _DELAY_MODULES:
+            stack.enter_context(patch.object(module, "delay", delayfunc))
+        yield
+
+
+class ReplayClock(object):
+    """
+    Stands in for the reactor during a replay. Timed calls are run in the
+    order they are due when `run` is called, without waiting for them.
+
+    """
+    def __init__(self):
+        self.now = 0
+        # (due, order, callback, args, kwargs)
+        self.queue = []
+        self.order = count()
+
+    def delay(self, timedelay, callback, *args, **kwargs):
+        kwargs.pop("persistent", None)
+        heapq.heappush(self.queue, (self.now + timedelay, next(self.order),
+                                    callback, args, kwargs))
+        return succeed(None)
+
+    def run(self):
+        "Run all timed calls, including those they schedule in turn"
+        while self.queue:
+            self.now, _, callback, args, kwargs = heapq.heappop(self.queue)
+            callback(*args, **kwargs)
+
+
+class SessionReplayer(object):
+    """
+    Replays a recorded session against a new room.
+
+    """
+    def __init__(self, session, home=None,
+                 character_typeclass=settings.BASE_CHARACTER_TYPECLASS,
+                 trace_memory=False):
+        """
+        Args:
+            session (RecordedSession): The session to replay.
+            home (Object, optional): Where the players go when they leave.
+            character_typeclass (str, optional): Typeclass of the players.
+            trace_memory (bool, optional): Also measure the memory allocated
+                by each command. This makes the commands a lot slower, so
+                don't trust the timings of such a replay.
+
+        """
+        self.session = session
+        self.home = home
+        self.character_typeclass = character_typeclass
+        self.trace_memory = trace_memory
+        self.room = None
+        self.characters = {}
+        self.clock = ReplayClock()
+        # (state, command, seconds, queries, allocated bytes, peak bytes)
+        self.timings = []
+        self.outputs = 0
+        # where the room got to (kept also after the room is deleted)
+        self.final_state = None
+        self.score = None
+
+    def _msg(self, *args, **kwargs):
+        self.outputs += 1
+
+    def _get_character(self, name):
+        char = self.characters.get(name)
+        if not char:
+            char = create.create_object(self.character_typeclass, key=name,
+                                        home=self.home, location=self.home)
+            char.msg = self._msg
+            self.characters[name] = char
+        return char
+
+    def _run_command(self, char, raw_string):
+        state = self.room.statehandler.current_state_name
+        with CaptureQueriesContext(connection) as queries:
+            if self.trace_memory:
+                # this also resets the peak
+                tracemalloc.clear_traces()
+            start = time.perf_counter()
+            char.execute_cmd(raw_string)
+            self.clock.run()
+            elapsed = time.perf_counter() - start
+            allocated, peak = tracemalloc.get_traced_memory() if self.trace_memory else (0, 0)
+        self.timings.append((state, raw_string.split(" ", 1)[0], elapsed, len(queries),
+                             allocated, peak))
+
+    def run(self):
+        """
+        Replay the session.
+
+        Returns:
+            report (dict): The results, see `report`.
+
+        """
+        session = self.session
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            # skip waiting in interactive code and don't log the replay itself
+            with patch_delay(self.clock.delay), \
+                    patch.object(ROOMLOG, "log", lambda *args, **kwargs: None):
+                self.room = create.create_object(EvscapeRoom, key=f"Replay-{session.room}")
+                self.room.reseed(session.seed)
+                self.room.statehandler.init_state()
+                self.clock.run()
+                for _, event, caller, data in session.events:
+                    if not self.room.pk:
+                        # everyone left
+                        break
+                    if event == "reseed":
+                        self.room.reseed(data.get("rng_seed"))
+                        continue
+                    char = self._get_character(caller)
+                    if event == "join":
+                        if char.location != self.room:
+                            join_room(char, self.room)
+                            self.clock.run()
+                    elif char.location == self.room:
+                        self._run_command(char, data.get("message", ""))
+                    if self.room.pk:
+                        self.final_state = self.room.statehandler.current_state_name
+                        self.score = sum(self.room.db.stats["score"].values())
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        return self.report()
+
+    def report(self):
+        """
+        Returns:
+            report (dict): With keys
+                room (str): Name of the recorded room.
+                commands (int): Number of commands replayed.
+                seconds (float): Time taken by all commands.
+                queries (int): Database queries by all commands.
+                outputs (int): Number of messages sent to the players.
+                per_command (dict): {command: {count, mean_ms, max_ms, queries}}.
+                per_state (dict): {state: {commands, seconds, queries,
+                    allocated_kb, peak_kb}}, where the state is the one the
+                    room was in when the command was given (so the command
+                    moving the room to the next state, and setting it up,
+                    counts to the previous state). The memory is the sum of
+                    what the commands allocated (and didn't free) and the
+                    largest peak of any command; this is 0 unless memory
+                    was traced.
+                final_state, score (str, int): Where the replayed room ended up.
+                closed (bool): If the room was deleted since everyone left.
+                recorded_state, recorded_score (str, int): Where the recorded
+                    room ended up.
+
+        """
+        per_command = {}
+        per_state = {}
+        for state, cmdname, elapsed, nqueries, allocated, peak in self.timings:
+            stats = per_command.setdefault(
+                cmdname, {"count": 0, "seconds": 0.0, "max_ms": 0.0, "queries": 0})
+            stats["count"] += 1
+            stats["seconds"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed * 1000)
+            stats["queries"] += nqueries
+            stats = per_state.setdefault(
+                state, {"commands": 0, "seconds": 0.0, "queries": 0,
+                        "allocated_kb": 0.0, "peak_kb": 0.0})
+            stats["commands"] += 1
+            stats["seconds"] += elapsed
+            stats["queries"] += nqueries
+            stats["allocated_kb"] += allocated / 1024
+            stats["peak_kb"] = max(stats["peak_kb"], peak / 1024)
+        for stats in per_command.values():
+            stats["mean_ms"] = stats.pop("seconds") / stats["count"] * 1000
+
+        return {
+            "room": self.session.room,
+            "commands": len(self.timings),
+            "seconds": sum(timing[2] for timing in self.timings),
+            "queries": sum(timing[3] for timing in self.timings),
+            "outputs": self.outputs,
+            "per_command": per_command,
+            "per_state": per_state,
+            "final_state": self.final_state,
+            "score": self.score,
+            "closed": bool(self.room) and not self.room.pk,
+            "recorded_state": self.session.final_state,
+            "recorded_score": self.session.score}
+
+    def cleanup(self):
+        "Remove the room and players created for the replay"
+        if self.room and self.room.pk:
+            self.room.delete()
+        for char in self.characters.values():
+            if char.pk:
+                char.delete()
+
+
+def format_report(report):
+    """
+    Format a replay report as text.
+
+    """
+    lines = [f"Replay of room '{report['room']}': {report['commands']} commands in "
+             f"{report['seconds'] * 1000:.1f}ms, {report['queries']} queries, "
+             f"{report['outputs']} messages.",
+             f"  final state: {report['final_state']} (recorded: {report['recorded_state']}), "
+             f"score: {report['score']} (recorded: {report['recorded_score']})"]
+    for cmdname, stats in sorted(report["per_command"].items(),
+                                 key=lambda item: -item[1]["count"]):
+        lines.append(f"  {cmdname:<15} x{stats['count']:<5} mean {stats['mean_ms']:.2f}ms "
+                     f"max {stats['max_ms']:.2f}ms, {stats['queries']} queries")
+    return "\n".join(lines)
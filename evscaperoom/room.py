@@ -3,16 +3,266 @@ Room class and mechanics for the Evscaperoom.
 
 """
 
+import random
+import re
+from weakref import WeakSet
+from django.conf import settings
+from django.utils import timezone
 from evennia import DefaultRoom, DefaultCharacter, DefaultObject
 from evennia import utils
 from evennia.utils.ansi import strip_ansi
 from evennia import logger
 from evennia.locks.lockhandler import check_lockstring
-from evennia.utils.utils import lazy_property, list_to_string
+from evennia.utils.utils import lazy_property, list_to_string, make_iter
 from .objects import EvscaperoomObject
 from .commands import CmdSetEvScapeRoom
 from .state import StateHandler
-from .utils import create_fantasy_word
+from .sessionstate import PlayerSessionState
+from .reaper import REAPER
+from .lobby import LOBBY
+from .roomlog import ROOMLOG
+
+# record all commands entered in rooms in the event stream
+_RECORD_INPUT = getattr(settings, "EVSCAPEROOM_RECORD_INPUT", True)
+
+# like `1-box`, to pick one of several matches
+_RE_MULTIMATCH = re.compile(settings.SEARCH_MULTIMATCH_REGEX, re.I + re.U)
+_RE_DBREF = re.compile(r"^#\d+$")
+
+# tag marking rooms waiting in the room pool, see roompool.py
+POOL_TAG = "pooled"
+POOL_TAG_CATEGORY = "evscaperoom_pool"
+
+# rooms whose random generators are in use, see flush_all
+_RNG_ROOMS = WeakSet()
+
+# {(permission, permission fingerprint): result} for check_perm
+_PERM_CACHE = {}
+_MAX_PERM_CACHE = 1000
+
+
+class ContentIndex(object):
+    """
+    Mapping of (lower-case) key and alias to each non-character object in a
+    room. This sits on the room and is kept up to date when objects are created,
+    deleted or moved, so finding a named object never needs a database
+    query. We only allow one object of each name per room (see
+    `create_evscaperoom_object`).
+
+    """
+    def __init__(self, room):
+        self.room = room
+        self.index = {}
+        # lower-case alias: object
+        self.aliases = {}
+        # object: its lower-case aliases
+        self.obj_aliases = {}
+        for obj in room.contents:
+            self.add(obj)
+        # objects added/removed since last reset, see StateHandler.end_transition
+        self.added = 0
+        self.removed = 0
+
+    def add(self, obj):
+        "Add an object to the index (or update it if its aliases changed)"
+        if not utils.inherits_from(obj, "evennia.objects.objects.DefaultCharacter"):
+            if obj not in self.obj_aliases:
+                self.added += 1
+            self._remove_aliases(obj)
+            self.index[obj.key.lower()] = obj
+            aliases = self.obj_aliases[obj] = [alias.lower() for alias in obj.aliases.all()]
+            for alias in aliases:
+                self.aliases[alias] = obj
+
+    def _remove_aliases(self, obj):
+        for alias in self.obj_aliases.pop(obj, ()):
+            if self.aliases.get(alias) is obj:
+                del self.aliases[alias]
+
+    def remove(self, obj):
+        "Remove an object from the index"
+        key = obj.key.lower()
+        if self.index.get(key) is obj:
+            del self.index[key]
+        if obj in self.obj_aliases:
+            self.removed += 1
+        self._remove_aliases(obj)
+
+    def find(self, name):
+        """
+        Find all objects with a given key or alias (case-insensitive), such
+        as all objects a new object of that name would duplicate.
+
+        Args:
+            name (str): The key or alias to look for.
+        Returns:
+            objs (list): The matches, if any.
+
+        """
+        name = name.lower()
+        matches = []
+        for obj in (self.index.get(name), self.aliases.get(name)):
+            if obj and obj not in matches:
+                if obj.pk:
+                    matches.append(obj)
+                else:
+                    # deleted without us being told
+                    self.remove(obj)
+        return matches
+
+    def get(self, key):
+        """
+        Get an object by key (case-insensitive).
+
+        Args:
+            key (str): The key of the object to get.
+        Returns:
+            obj (Object or None): The match, if any.
+
+        """
+        key = key.lower()
+        obj = self.index.get(key)
+        if obj and not obj.pk:
+            # deleted without us being told
+            del self.index[key]
+            return None
+        return obj
+
+
+def _perm_fingerprint(obj):
+    """
+    Everything a perm() lock check of `obj` depends on: its permissions and
+    those of its account, and if it's a (not quelling) superuser. A cached
+    check is only reused while these stay the same.
+
+    """
+    fingerprint = (obj.id, tuple(sorted(obj.permissions.all())),
+                   bool(getattr(obj, "is_superuser", False)))
+    account = getattr(obj, "account", None)
+    if account:
+        fingerprint += (account.id, tuple(sorted(account.permissions.all())),
+                        bool(account.is_superuser), bool(account.attributes.get("_quell")))
+    return fingerprint
+
+
+def _partial_match(words, query_words):
+    "If each query word starts a word of `words`, in order (like Evennia's partial matching)"
+    start = 0
+    for query_word in query_words:
+        for iword in range(start, len(words)):
+            if words[iword].startswith(query_word):
+                start = iword + 1
+                break
+        else:
+            return False
+    return True
+
+
+class NameResolver(object):
+    """
+    In-memory version of the local search a player in the room does with
+    `caller.search(query, quiet=True)`, giving the same matches in the same
+    order (so also the same multimatches), but without any database queries.
+
+    It covers the room and everything in it, characters included. The
+    index is built on the first search and then kept until `invalidate` is
+    called, which happens when objects are created, deleted or moved in or
+    out of the room and when the room changes state.
+
+    """
+    def __init__(self, room):
+        self.room = room
+        self.candidates = None
+        # lower-case key or alias: [objects]
+        self.exact = {}
+        # start of a word in a key: {objects}
+        self.prefixes = {}
+        # object: [lower-case aliases]
+        self.aliases = {}
+
+    def invalidate(self):
+        "Drop the index, it's rebuilt on the next search"
+        self.candidates = None
+
+    def _build(self):
+        room = self.room
+        # the database search returns these in order of creation
+        self.candidates = sorted([room] + room.contents, key=lambda obj: obj.id)
+        self.exact = {}
+        self.prefixes = {}
+        self.aliases = {}
+        for obj in self.candidates:
+            key = obj.key.lower()
+            aliases = self.aliases[obj] = [alias.lower() for alias in obj.aliases.all()]
+            for name in set([key] + aliases):
+                self.exact.setdefault(name, []).append(obj)
+            for word in key.split():
+                for iend in range(1, len(word) + 1):
+                    self.prefixes.setdefault(word[:iend], set()).add(obj)
+
+    def _fuzzy(self, query):
+        query_words = query.split()
+        if not query_words:
+            return []
+        # keys with words starting with each of the query words
+        found = set.intersection(*(self.prefixes.get(word, set()) for word in query_words))
+        matches = [obj for obj in self.candidates
+                   if obj in found and _partial_match(obj.key.lower().split(), query_words)]
+        if matches:
+            return matches
+        # no key matched, so try the aliases of anything with an alias
+        # containing the query (an object matching several times is
+        # returned several times)
+        matches = []
+        for obj in self.candidates:
+            aliases = self.aliases[obj]
+            if any(query in alias for alias in aliases):
+                matches.extend(obj for alias in aliases
+                               if _partial_match(alias.split(), query_words))
+        return matches
+
+    def search(self, caller, query):
+        """
+        Search for an object, like `caller.search(query, quiet=True)`.
+
+        Args:
+            caller (Object): The one searching, who must be in the room.
+            query (str): What to search for.
+        Returns:
+            matches (list or None): The matches (possibly none), or `None`
+                if this search can't be done here and `caller.search`
+                should be used instead (like for #dbrefs, which are
+                searched for globally).
+
+        """
+        if caller.location != self.room or caller.contents:
+            return None
+        lquery = query.lower()
+        if lquery == "here":
+            return [self.room]
+        if lquery in ("me", "self"):
+            return [caller]
+        query = caller.nicks.nickreplace(query, categories=("object", "account"),
+                                         include_account=True)
+        if _RE_DBREF.match(query):
+            return None
+        if self.candidates is None:
+            self._build()
+
+        # an exact key or alias first, then partial matches
+        query = query.lower()
+        number = None
+        matches = self.exact.get(query, [])
+        if not matches:
+            match = _RE_MULTIMATCH.match(query)
+            if match:
+                # a multimatch like `2-box`, search for just the name
+                number, query = int(match.group("number")) - 1, match.group("name")
+            matches = self._fuzzy(query)
+        if len(matches) > 1 and number is not None:
+            # like object_search, an index out of range matches nothing
+            matches = [matches[number]] if 0 <= number < len(matches) else []
+        return [obj for obj in matches if obj.pk]
 
 
 class EvscapeRoom(EvscaperoomObject, DefaultRoom):
@@ -37,6 +287,12 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
         # this is accessed through the .tagcategory getter.
         self.db.tagcategory = "evscaperoom_{}".format(self.key)
 
+        # flags of the room and its objects, see flags.py
+        self.db.flagstate = {"names": [], "masks": {}}
+
+        # seed for the room's random generators, see get_rng
+        self.db.rng_seed = random.getrandbits(32)
+
         # room progress statistics
         self.db.stats = {
             "progress": 0,  # in percent
@@ -49,38 +305,169 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
 
         self.cmdset.add(CmdSetEvScapeRoom, permanent=True)
 
-        self.log("Room created and log started.")
+        # set by start() when players first get the room
+        self.db.started = None
+        # log entries held back while the room waits in the room pool
+        self.db.held_log = None
+
+        # a room made for the room pool is started when it's checked out. The
+        # tags given to create_object are only added after this hook is called.
+        tags = getattr(self, "_createdict", {}).get("tags") or ()
+        if (POOL_TAG, POOL_TAG_CATEGORY) in [tuple(make_iter(tag)) for tag in tags]:
+            self.db.held_log = []
+        else:
+            self.start()
+
+    def start(self):
+        """
+        Start the room's clock and log, when the room is taken into use.
+        A room built ahead of time in the room pool is started only when it
+        is checked out, so its time in the pool is not counted as play time.
+        Log entries held while pooled are written now.
+
+        """
+        self.db.started = timezone.now()
+        held = self.db.held_log or []
+        self.db.held_log = None
+        self.log("Room created and log started.", event="create",
+                 rng_seed=self.db.rng_seed)
+        for text, event, caller, payload in held:
+            ROOMLOG.log(self.tagcategory + ".log", text, room=self.key, event=event,
+                        caller=caller, **dict(payload))
 
     @lazy_property
     def statehandler(self):
         return StateHandler(self)
 
+    @lazy_property
+    def content_index(self):
+        return ContentIndex(self)
+
+    @lazy_property
+    def name_resolver(self):
+        return NameResolver(self)
+
+    @lazy_property
+    def occupants(self):
+        """
+        In-memory set of the player characters in the room. It's read from
+        the database when the room is loaded and then kept up to date by
+        the move hooks, `character_exit` and `at_character_disconnect`.
+        """
+        return set(self._query_characters())
+
+    @lazy_property
+    def playerstate(self):
+        return PlayerSessionState(self)
+
     @property
     def state(self):
         return self.statehandler.current_state
 
-    def log(self, message, caller=None):
+    def get_rng(self, stream="default"):
+        """
+        Get a random generator for this room. All randomness in the room
+        should come from here, so that a recorded session can be replayed
+        exactly by re-using the room's seed (see replay.py).
+
+        Args:
+            stream (str, optional): Name of an independent sequence of
+                random numbers. Use a separate stream for randomness not
+                caused by the players' actions (like timers), so it doesn't
+                change the sequence the players see.
+        Returns:
+            rng (random.Random): The random generator.
+
+        """
+        rngs = self.ndb.rngs
+        if rngs is None:
+            rngs = self.ndb.rngs = {}
+        rng = rngs.get(stream)
+        if not rng:
+            if self.db.rng_seed is None:
+                # a room from before we had seeds
+                self.db.rng_seed = random.getrandbits(32)
+            rng = rngs[stream] = random.Random(f"{self.db.rng_seed}-{stream}")
+            state = (self.db.rng_states or {}).get(stream)
+            if state:
+                # continue where we were before the reload
+                version, internal, gauss = state
+                rng.setstate((version, tuple(internal), gauss))
+            _RNG_ROOMS.add(self)
+        return rng
+
+    def save_rngs(self):
+        """
+        Store how far the random generators have got, so their sequences
+        continue (rather than restart) after a server reload. Otherwise a
+        replay of a session spanning the reload would go differently.
+
+        """
+        rngs = self.ndb.rngs
+        if rngs:
+            states = dict(self.db.rng_states or {})
+            states.update((stream, rng.getstate()) for stream, rng in rngs.items())
+            self.db.rng_states = states
+
+    def reseed(self, seed):
+        """
+        Set a new seed for the room's random generators, restarting their
+        sequences. This is logged, so a replay can reseed at the same point.
+
         """
-        Log to a file specificially for this room.
+        self.db.rng_seed = seed
+        self.ndb.rngs = {}
+        self.attributes.remove("rng_states")
+        self.log("Random generators reseeded.", event="reseed", rng_seed=seed)
+
+    def record_input(self, caller, raw_string):
+        """
+        Record a command entered by a player in this room. This goes only
+        to the event stream (not to the room's log), for replaying the
+        session later.
+
         """
-        caller = f"[caller.key]: " if caller else ""
+        if _RECORD_INPUT:
+            ROOMLOG.log(None, raw_string.strip(), room=self.key, event="input",
+                        caller=caller.key)
+
+    def log(self, message, caller=None, event="log", **payload):
+        """
+        Log to a file specificially for this room. This also adds the event
+        to the structured event stream, see roomlog.py.
+
+        Args:
+            message (str): The message to log.
+            caller (Object, optional): Who caused the event (this is only
+                shown in the event stream).
+            event (str, optional): The type of event, like "join" or "hint".
+            **payload: Extra data about the event, for the event stream.
 
-        logger.log_file(
-            strip_ansi(f"{caller}{message.strip()}"),
-            filename=self.tagcategory + ".log")
+        """
+        text = strip_ansi(message.strip())
+        caller = caller.key if caller else None
+        held = self.db.held_log
+        if held is not None:
+            # (the Attribute saves itself when changed)
+            held.append((text, event, caller, payload))
+            return
+        ROOMLOG.log(self.tagcategory + ".log", text, room=self.key, event=event,
+                    caller=caller, **payload)
 
     def score(self, new_score, reason):
         """
         We don't score individually but for everyone in room together.
         You can only be scored for a given reason once."""
         if reason not in self.db.stats['score']:
-            self.log(f"score: {reason} ({new_score}pts)")
+            self.log(f"score: {reason} ({new_score}pts)", event="score",
+                     reason=reason, score=new_score)
             self.db.stats['score'][reason] = new_score
 
     def progress(self, new_progress):
         "Progress is what we set it to be (0-100%)"
-        self.log(f"progress: {new_progress}%")
+        self.log(f"progress: {new_progress}%", event="progress", progress=new_progress)
         self.db.stats['progress'] = new_progress
+        LOBBY.update(self, progress=int(new_progress))
 
     def achievement(self, caller, achievement, subtext=""):
         """
@@ -93,37 +480,72 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
             subtext (str, optional): Eventual subtext/explanation
                 of the achievement.
         """
-        achievements = caller.attributes.get(
-            "achievements", category=self.tagcategory)
+        achievements = self.playerstate.get(caller, "achievements")
         if not achievements:
             achievements = {}
         if achievement not in achievements:
-            self.log(f"achievement: {caller} earned '{achievement}' - {subtext}")
+            self.log(f"achievement: {caller} earned '{achievement}' - {subtext}",
+                     caller=caller, event="achievement", achievement=achievement)
             achievements[achievement] = subtext
-            caller.attributes.add("achievements", achievements, category=self.tagcategory)
+            self.playerstate.set(caller, "achievements", achievements)
+
+    def _query_characters(self):
+        return DefaultCharacter.objects.filter_family(db_location=self)
 
     def get_all_characters(self):
         """
-        Get the player characters in the room.
+        Get the player characters in the room. This is served from the
+        in-memory occupancy set, without querying the database.
 
         Returns:
-            chars (Queryset): The characters.
+            chars (list): The characters, in order of creation.
 
         """
-        return DefaultCharacter.objects.filter_family(db_location=self)
+        occupants = self.occupants
+        # drop anyone deleted or moved away without us being told
+        for char in [char for char in occupants if not char.pk or char.location != self]:
+            occupants.discard(char)
+        return sorted(occupants, key=lambda char: char.id)
 
-    def set_flag(self, flagname):
-        self.db.flags[flagname] = True
+    def reconcile_occupants(self):
+        """
+        Re-read the characters in the room from the database, correcting
+        the occupancy set if it has drifted.
 
-    def unset_flag(self, flagname):
-        if flagname in self.db.flags:
-            del self.db.flags[flagname]
+        Returns:
+            changed (bool): If the occupancy set had to be corrected.
 
-    def check_flag(self, flagname):
-        return self.db.flags.get(flagname, False)
+        """
+        chars = set(self._query_characters())
+        if chars == self.occupants:
+            return False
+        logger.log_warn(f"Evscaperoom: Occupants of {self.key} were out of sync, "
+                        "reloaded from database.")
+        self.occupants.clear()
+        self.occupants.update(chars)
+        LOBBY.update(self, nplayers=len(chars))
+        return True
 
     def check_perm(self, caller, permission):
-        return check_lockstring(caller, f"dummy:perm({permission})")
+        """
+        Check if caller has a permission (or a higher one). The results are
+        cached, so the lockstring is not parsed on every check, and are
+        redone if the permissions of the caller or its account change.
+
+        Args:
+            caller (Object or Account): The one to check.
+            permission (str): The permission, like "Admin".
+        Returns:
+            allowed (bool): If caller has the permission.
+
+        """
+        key = (permission, _perm_fingerprint(caller))
+        allowed = _PERM_CACHE.get(key)
+        if allowed is None:
+            if len(_PERM_CACHE) >= _MAX_PERM_CACHE:
+                _PERM_CACHE.clear()
+            allowed = _PERM_CACHE[key] = check_lockstring(caller, f"dummy:perm({permission})")
+        return allowed
 
     def tag_character(self, character, tag, category=None):
         """
@@ -160,6 +582,7 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
 
         """
         if self.tagcategory:
+            self.playerstate.clear(char)
             char.tags.remove(category=self.tagcategory)
             char.attributes.remove(category=self.tagcategory)
 
@@ -168,13 +591,15 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
         Have a character exit the room - return them to the room menu.
 
         """
-        self.log(f"EXIT: {char} left room")
+        self.log(f"EXIT: {char} left room", event="exit", caller=char)
         from .menu import run_evscaperoom_menu
         self.character_cleanup(char)
         char.location = char.home
+        self.occupants.discard(char)
+        LOBBY.update(self, nplayers=len(self.occupants))
 
         # check if room should be deleted
-        if len(self.get_all_characters()) < 1:
+        if not self.get_all_characters() and not self.db.deleting:
             self.delete()
 
         # we must run menu after deletion so we don't include this room!
@@ -188,8 +613,13 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
         sum up the situation, set tags etc.
 
         """
+        self.content_index.add(moved_obj)
+        self.name_resolver.invalidate()
         if utils.inherits_from(moved_obj, "evennia.objects.objects.DefaultCharacter"):
-            self.log(f"JOIN: {moved_obj} joined room")
+            self.occupants.add(moved_obj)
+            REAPER.cancel(self)
+            LOBBY.update(self, nplayers=len(self.occupants))
+            self.log(f"JOIN: {moved_obj} joined room", event="join", caller=moved_obj)
             self.state.character_enters(moved_obj)
 
     def at_object_leave(self, moved_obj, target_location, **kwargs):
@@ -198,24 +628,45 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
         to clean them up and move them to the menu state.
 
         """
+        self.content_index.remove(moved_obj)
+        self.name_resolver.invalidate()
         if utils.inherits_from(moved_obj, "evennia.objects.objects.DefaultCharacter"):
+            self.occupants.discard(moved_obj)
+            LOBBY.update(self, nplayers=len(self.occupants))
             self.character_cleanup(moved_obj)
-        if len(self.get_all_characters()) <= 1:
-            # after this move there'll be no more characters in the room - delete the room!
-            self.delete()
-            # logger.log_info("DEBUG: Don't delete room when last player leaving")
+            if not self.get_all_characters():
+                # after this move there'll be no more characters in the room - delete the room!
+                self.delete()
+                # logger.log_info("DEBUG: Don't delete room when last player leaving")
+
+    def at_character_disconnect(self, character):
+        """
+        Called (by the Character typeclass) when a character's last session
+        disconnects, which removes them from the room without calling the
+        move hooks. If no one is left, the room is deleted after a grace
+        period, unless someone comes back in time.
+
+        """
+        self.occupants.discard(character)
+        LOBBY.update(self, nplayers=len(self.occupants))
+        if not self.occupants:
+            self.log(f"EMPTY: {character} disconnected, room is now empty", event="empty", caller=character)
+            REAPER.schedule(self)
 
     def delete(self):
         """
         Delete this room and all items related to it. Only move the players.
 
         """
+        REAPER.cancel(self)
+        self.statehandler.end_transition()
+        LOBBY.remove(self)
         self.db.deleting = True
         for char in self.get_all_characters():
             self.character_exit(char)
         for obj in self.contents:
             obj.delete()
-        self.log("END: Room cleaned up and deleted")
+        self.log("END: Room cleaned up and deleted", event="end")
         return super().delete()
 
     def return_appearance(self, looker, **kwargs):
@@ -232,3 +683,17 @@ class EvscapeRoom(EvscaperoomObject, DefaultRoom):
                 list_to_string([obj.get_display_name(looker) for obj in objs])
 
         return f"{self.db.desc}{pos}{admin_only}"
+
+
+def flush_all():
+    """
+    Save the state of the random generators of all rooms. This is called
+    when the server reloads or shuts down.
+
+    """
+    for room in list(_RNG_ROOMS):
+        try:
+            if room.pk:
+                room.save_rngs()
+        except Exception:
+            logger.log_trace("Error saving evscaperoom random generators")
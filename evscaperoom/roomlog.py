@@ -0,0 +1,220 @@
+"""
+Batched, background writing of the room logs
+
+Everything of note happening in a room (players joining, hints, scores,
+emotes, failed puzzle attempts ...) is logged. Writing each line to file as
+it happens means a lot of small, synchronous file writes on the reactor
+thread. Instead, `EvscapeRoom.log` queues the events here and they are
+written in batches by a background writer thread a moment later (or at
+once if the queue grows large, and always on server reload/shutdown). The
+one writer thread takes the batches in order, so lines are never
+reordered.
+
+Each event is written in two ways:
+
+- As a line in the human-readable log of the room,
+  `<LOG_DIR>/evscaperoom_<roomkey>.log`.
+- As a JSON object on one line (JSONL) in the shared event stream
+  `<LOG_DIR>/evscaperoom_events.jsonl`, with the keys `timestamp`, `room`,
+  `event`, `caller` and `payload`. This is meant for analysis tools.
+
+Log files are rotated when they grow too large or too old, keeping a few
+old versions as `<filename>.1`, `<filename>.2` etc. When each file was
+started is kept in `<filename>.started`, for the age limit.
+
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from django.conf import settings
+from evennia.utils import logger
+from evennia.utils.utils import delay
+
+_LOG_DIR = settings.LOG_DIR
+_EVENTS_FILENAME = "evscaperoom_events.jsonl"
+
+# seconds to wait before writing queued events
+_FLUSH_DELAY = getattr(settings, "EVSCAPEROOM_LOG_FLUSH_DELAY", 2)
+# write at once when this many events are queued
+_MAX_QUEUE = 500
+# rotate a log file when it reaches this size (in bytes) ...
+_ROTATE_SIZE = getattr(settings, "EVSCAPEROOM_LOG_ROTATE_SIZE", 1024 * 1024)
+# ... or when it's been written to for this long (in seconds)
+_ROTATE_AGE = getattr(settings, "EVSCAPEROOM_LOG_ROTATE_AGE", 7 * 24 * 3600)
+# how many rotated versions to keep
+_ROTATE_KEEP = getattr(settings, "EVSCAPEROOM_LOG_ROTATE_KEEP", 5)
+
+
+def _timeformat(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+class RoomLogWriter(object):
+    """
+    Queues log events and writes them to file in batches.
+
+    """
+    def __init__(self, logdir=_LOG_DIR, events_filename=_EVENTS_FILENAME):
+        self.logdir = logdir
+        self.events_path = os.path.join(logdir, events_filename)
+        # (timestamp, filename, text, record)
+        self.queue = []
+        self.flush_pending = False
+        # batches handed to the writer thread, written in order
+        self.batches = queue.Queue()
+        self.writer = None
+        # path: when we started writing to it
+        self.started = {}
+
+    def log(self, filename, text, room=None, event="log", caller=None, **payload):
+        """
+        Queue an event for writing.
+
+        Args:
+            filename (str or None): Name of the human-readable log file (in
+                LOG_DIR). If `None`, the event only goes to the event stream.
+            text (str): The line to write to that file.
+            room (str, optional): Name of the room the event happened in.
+            event (str, optional): The type of event, like "join" or "hint".
+            caller (str, optional): Name of who caused the event.
+            **payload: Extra data about the event. This must be possible to
+                convert to JSON.
+
+        """
+        timestamp = time.time()
+        payload["message"] = text
+        record = {"timestamp": timestamp, "room": room, "event": event,
+                  "caller": caller, "payload": payload}
+        self.queue.append((timestamp, filename, text, record))
+        if len(self.queue) >= _MAX_QUEUE:
+            self.flush()
+        elif not self.flush_pending:
+            self.flush_pending = True
+            delay(_FLUSH_DELAY, self._delayed_flush)
+
+    def _delayed_flush(self):
+        self.flush_pending = False
+        self.flush()
+
+    def flush(self, blocking=False):
+        """
+        Write all queued events.
+
+        Args:
+            blocking (bool, optional): Wait until these and all earlier
+                events are written. This is used when the server is
+                shutting down.
+
+        """
+        batch, self.queue = self.queue, []
+        if batch:
+            if not (self.writer and self.writer.is_alive()):
+                self.writer = threading.Thread(
+                    target=self._run_writer, name="evscaperoom-roomlog", daemon=True)
+                self.writer.start()
+            self.batches.put(batch)
+        if blocking:
+            self.batches.join()
+
+    def _run_writer(self):
+        """
+        Write the queued batches one at a time, in order. This runs in the
+        writer thread.
+
+        """
+        while True:
+            batch = self.batches.get()
+            try:
+                self._write(batch)
+            except Exception as err:
+                logger.log_err(f"Evscaperoom: Error writing room logs: {err}")
+            finally:
+                self.batches.task_done()
+
+    def _get_started(self, path):
+        """
+        Get when we started writing to a log file. This is kept in a file
+        next to it, since the log file's own mtime changes on every write.
+
+        """
+        started = self.started.get(path)
+        if started is None:
+            try:
+                with open(f"{path}.started", encoding="utf-8") as fil:
+                    started = float(fil.read())
+            except (OSError, ValueError):
+                # from before we kept the start time
+                started = os.path.getmtime(path)
+            self.started[path] = started
+        return started
+
+    def _set_started(self, path, started):
+        self.started[path] = started
+        with open(f"{path}.started", "w", encoding="utf-8") as fil:
+            fil.write(str(started))
+
+    def _rotate(self, path, nbytes):
+        """
+        Rotate a log file if writing `nbytes` more would make it too large,
+        or if it's been written to for too long.
+
+        """
+        now = time.time()
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # no file yet
+            self._set_started(path, now)
+            return
+        started = self._get_started(path)
+        if size + nbytes <= _ROTATE_SIZE and now - started <= _ROTATE_AGE:
+            return
+        for num in range(_ROTATE_KEEP - 1, 0, -1):
+            if os.path.exists(f"{path}.{num}"):
+                os.replace(f"{path}.{num}", f"{path}.{num + 1}")
+        if _ROTATE_KEEP > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        self._set_started(path, now)
+
+    def _append(self, path, lines):
+        data = "".join(lines)
+        self._rotate(path, len(data))
+        with open(path, "a", encoding="utf-8") as fil:
+            fil.write(data)
+
+    def _write(self, batch):
+        """
+        Write a batch of events, opening each file only once. This is
+        called in the writer thread.
+
+        """
+        files = {}
+        events = []
+        for timestamp, filename, text, record in batch:
+            if filename:
+                files.setdefault(filename, []).append(
+                    f"{_timeformat(timestamp)} [-] {text}\n")
+            events.append(json.dumps(record, default=str) + "\n")
+        for filename, lines in files.items():
+            self._append(os.path.join(self.logdir, filename), lines)
+        self._append(self.events_path, events)
+
+
+ROOMLOG = RoomLogWriter()
+
+
+def flush_all():
+    """
+    Write all queued log events. This is called when the server reloads or
+    shuts down.
+
+    """
+    try:
+        ROOMLOG.flush(blocking=True)
+    except Exception:
+        logger.log_trace("Error flushing evscaperoom logs")
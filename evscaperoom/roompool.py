@@ -0,0 +1,135 @@
+"""
+Pool of pre-initialized rooms
+
+Creating a new room means creating the room itself and then building all
+the objects of the first state, which takes a noticeable time. To make
+"create a new room" instant for the player, we keep a few fully
+initialized, unoccupied rooms ready. When a player creates a room we just
+hand them one from the pool and top the pool up again in the background.
+
+Pooled rooms are marked with a tag and are not shown in the lobby or
+cleaned up as empty rooms until they are checked out.
+
+The pool size is set with `EVSCAPEROOM_ROOM_POOL_SIZE` in settings (0
+turns the pool off).
+
+"""
+
+import random
+from django.conf import settings
+from evennia.utils import create, logger
+from evennia.utils.utils import delay
+from .room import EvscapeRoom, POOL_TAG, POOL_TAG_CATEGORY
+from .lobby import LOBBY
+from .utils import create_fantasy_word
+
+_POOL_SIZE = getattr(settings, "EVSCAPEROOM_ROOM_POOL_SIZE", 2)
+
+# set while a refill is in progress
+_REFILLING = False
+
+
+def _get_unique_room_key(rng):
+    """
+    Create a random room name, retrying until we find a unique one
+
+    Args:
+        rng (random.Random): The random generator to use.
+
+    """
+    key = create_fantasy_word(length=5, capitalize=True, rng=rng)
+    while EvscapeRoom.objects.filter(db_key=key):
+        key = create_fantasy_word(length=5, capitalize=True, rng=rng)
+    return key
+
+
+def create_room(pooled=False):
+    """
+    Create and fully initialize a new room.
+
+    Args:
+        pooled (bool, optional): Mark the new room as being in the pool. A
+            pooled room is not started until it is checked out.
+    Returns:
+        room (EvscapeRoom): The new room.
+
+    """
+    tags = [(POOL_TAG, POOL_TAG_CATEGORY)] if pooled else None
+    # the name is drawn from the room's own seed, like all its randomness
+    seed = random.getrandbits(32)
+    key = _get_unique_room_key(random.Random(f"{seed}-name"))
+    room = create.create_object(EvscapeRoom, key=key, tags=tags)
+    room.reseed(seed)
+    # we must do this once manually for the new room
+    room.statehandler.init_state()
+    return room
+
+
+def is_pooled(room):
+    """
+    Check if a room is sitting in the pool (so is not yet in use).
+
+    """
+    return room.tags.get(POOL_TAG, category=POOL_TAG_CATEGORY) is not None
+
+
+def get_pooled_rooms():
+    """
+    Get all rooms currently in the pool, oldest first.
+
+    """
+    return EvscapeRoom.objects.filter(
+        db_tags__db_key=POOL_TAG,
+        db_tags__db_category=POOL_TAG_CATEGORY).order_by("id")
+
+
+def checkout_room():
+    """
+    Get a ready room for a player. This takes a room from the pool if there
+    is one, otherwise it creates a new room directly. The room is added to
+    the lobby listing.
+
+    Returns:
+        room (EvscapeRoom): A fully initialized room, not in the pool.
+
+    """
+    room = get_pooled_rooms().first()
+    if room:
+        room.tags.remove(POOL_TAG, category=POOL_TAG_CATEGORY)
+        room.start()
+    else:
+        room = create_room()
+    LOBBY.add(room)
+    refill()
+    return room
+
+
+def _refill_one():
+    """
+    Add one room to the pool, then re-schedule ourselves until the pool is
+    full. Creating one room per reactor tick means we never block the
+    server for long.
+
+    """
+    global _REFILLING
+    try:
+        if get_pooled_rooms().count() < _POOL_SIZE:
+            room = create_room(pooled=True)
+            logger.log_info(f"Evscaperoom: Added room '{room.key}' (#{room.id}) to room pool.")
+            delay(0, _refill_one)
+            return
+    except Exception:
+        logger.log_trace("Evscaperoom: Error refilling room pool.")
+    _REFILLING = False
+
+
+def refill():
+    """
+    Start topping up the room pool in the background, unless this is
+    already in progress.
+
+    """
+    global _REFILLING
+    if _POOL_SIZE > 0 and not _REFILLING:
+        _REFILLING = True
+        delay(0, _refill_one)
@@ -4,12 +4,19 @@ A simple cleanup script to wipe empty rooms
 (This can happen if users leave 'uncleanly', such as by closing their browser
 window)
 
+Empty rooms are normally handed to the reaper (see reaper.py) by the room
+itself as soon as they become empty. This script is a periodic
+reconciliation for any rooms the reaper doesn't know about (such as after
+a server reload), found with a single query.
+
 Just start this global script manually or at server creation.
 """
 
-from evennia import DefaultScript
+from evennia import DefaultScript, DefaultCharacter
 
 from evscaperoom.room import EvscapeRoom
+from evscaperoom.roompool import get_pooled_rooms
+from evscaperoom.reaper import REAPER
 
 
 class CleanupScript(DefaultScript):
@@ -25,8 +32,14 @@ class CleanupScript(DefaultScript):
 
     def at_repeat(self):
 
-        for room in EvscapeRoom.objects.all():
-            if not room.get_all_characters():
+        # all empty rooms (except those waiting in the room pool), in one query
+        occupied = DefaultCharacter.objects.filter_family(
+            db_location__isnull=False).values("db_location")
+        empty_rooms = EvscapeRoom.objects.all().exclude(
+            id__in=occupied).exclude(id__in=get_pooled_rooms().values("id"))
+
+        for room in empty_rooms:
+            if not REAPER.is_scheduled(room):
                 # this room is empty
-                room.log("END: Room cleaned by garbage collector.")
-                room.delete()
+                room.log("EMPTY: Room found empty by garbage collector.", event="empty")
+                REAPER.schedule(room)
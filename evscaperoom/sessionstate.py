@@ -0,0 +1,167 @@
+"""
+Per-room, in-memory storage of player session state.
+
+The focus, position, options, achievements and per-character flags of each
+player in a room are stored as Attributes on the character, using the room's
+tagcategory as category. Reading and writing those Attributes for every
+command is wasteful, so the `PlayerSessionState` (available as
+`room.playerstate`) keeps them in memory instead and writes changed values
+back to the database in batches (write-behind). A flush is scheduled a few
+seconds after the first change and is also forced on server reload/shutdown.
+
+Since the Attribute layout is unchanged, the in-memory state is rebuilt
+lazily from the Attributes the first time a character is accessed - so
+nothing is lost but the last few seconds of changes if the server crashes.
+
+"""
+
+from collections.abc import Mapping, MutableSequence
+from weakref import WeakSet
+from evennia import logger
+from evennia.utils.utils import delay
+
+# seconds to wait after a change before writing it to the database
+_FLUSH_DELAY = 10
+
+# all live session-states, for flushing on reload/shutdown
+_ALL_PLAYERSTATES = WeakSet()
+
+
+def _detach(value):
+    """
+    Make sure not to keep database-connected containers in memory (mutating
+    those would trigger a database save).
+
+    """
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, MutableSequence):
+        return list(value)
+    return value
+
+
+class PlayerSessionState(object):
+    """
+    This sits on the room and stores the session data of all characters
+    in it.
+
+    """
+    def __init__(self, room):
+        self.room = room
+        self.category = room.tagcategory
+        # {character: {key: value}}
+        self.data = {}
+        # (character, key) changed since last flush
+        self.dirty = set()
+        self.flush_pending = False
+        _ALL_PLAYERSTATES.add(self)
+
+    def _load(self, char):
+        """
+        Get the in-memory data for a character, rebuilding it from the
+        character's Attributes if this is the first access.
+
+        """
+        data = self.data.get(char)
+        if data is None:
+            data = self.data[char] = {
+                attr.key: _detach(attr.value) for attr in char.attributes.all()
+                if attr.category == self.category}
+        return data
+
+    def _mark_dirty(self, char, key):
+        self.dirty.add((char, key))
+        if not self.flush_pending:
+            self.flush_pending = True
+            delay(_FLUSH_DELAY, self.flush)
+
+    def get(self, char, key, default=None):
+        """
+        Get session data for a character.
+
+        Args:
+            char (Character): The character to get data for.
+            key (str): The data to get, like "focus" or "options".
+            default (any, optional): Returned if key is not set.
+        Returns:
+            value (any): The stored value or `default`.
+
+        """
+        return self._load(char).get(key, default)
+
+    def set(self, char, key, value):
+        """
+        Set session data for a character. It will be saved to the database
+        at the next flush.
+
+        Args:
+            char (Character): The character to set data on.
+            key (str): The name of the data to store.
+            value (any): The data to store (must be possible to store in an Attribute).
+
+        """
+        self._load(char)[key] = value
+        self._mark_dirty(char, key)
+
+    def remove(self, char, key):
+        """
+        Remove session data from a character.
+
+        Args:
+            char (Character): The character to remove data from.
+            key (str): The name of the data to remove.
+
+        """
+        data = self._load(char)
+        if key in data:
+            del data[key]
+            self._mark_dirty(char, key)
+
+    def clear(self, char):
+        """
+        Forget everything about a character, including any unflushed
+        changes. This does not touch the database; it's used when the
+        character's Attributes are wiped anyway.
+
+        Args:
+            char (Character): The character to forget.
+
+        """
+        self.data.pop(char, None)
+        self.dirty = set((dchar, key) for dchar, key in self.dirty if dchar != char)
+
+    def flush(self):
+        """
+        Write all changed data to the database, one batch per character.
+
+        """
+        self.flush_pending = False
+        dirty, self.dirty = self.dirty, set()
+        if not (dirty and self.room.pk):
+            # nothing to do or room was deleted
+            return
+
+        to_add = {}
+        for char, key in dirty:
+            if not char.pk:
+                continue
+            data = self.data.get(char, {})
+            if key in data:
+                to_add.setdefault(char, []).append((key, data[key], self.category))
+            else:
+                char.attributes.remove(key, category=self.category)
+        for char, attrs in to_add.items():
+            char.attributes.batch_add(*attrs)
+
+
+def flush_all():
+    """
+    Flush the session states of all rooms. This is called when the server
+    reloads or shuts down.
+
+    """
+    for playerstate in list(_ALL_PLAYERSTATES):
+        try:
+            playerstate.flush()
+        except Exception:
+            logger.log_trace("Error flushing evscaperoom player state")
@@ -20,17 +20,168 @@ state handler will be calling them in sequence):
 
 """
 
+import ast
+import inspect
+import pkgutil
+import time
 from functools import wraps
+from django.db import transaction
 from evennia import utils
 from evennia import logger
-from .objects import EvscaperoomObject
-from .utils import create_evscaperoom_object, msg_cinematic, parse_for_things
+from .utils import create_evscaperoom_object, msg_cinematic, compile_template
+from .utils import complete_typeclass
+from .catalog import CATALOG
 
 
 # we hard-code the first state to load
 _ROOMSTATE_PACKAGE = "evscaperoom.states"
 _FIRST_STATE = "state_001_start"
-_GA = object.__getattribute__
+
+
+# registry of all available states
+
+class StateRegistry(object):
+    """
+    Finds and imports all state modules up front (at server start) so that
+    switching states never pays for an import, and validates the graph of
+    state transitions so broken chains are found before players do.
+
+    The transitions of a state are its `next_state` class property plus any
+    branching overrides, found as calls like `self.next_state("state_name")`
+    in the state module's source.
+
+    """
+    def __init__(self, package=_ROOMSTATE_PACKAGE, first_state=_FIRST_STATE):
+        self.package = package
+        self.first_state = first_state
+        # statename: State class
+        self.states = {}
+        # statename: set of statenames it can transition to
+        self.graph = {}
+        # statename: error message
+        self.load_errors = {}
+        # list of problems found when validating the graph
+        self.graph_errors = []
+        self.load_time = 0
+        self.loaded = False
+
+    def _find_branches(self, mod):
+        """
+        Find state names given as literal arguments to `next_state(...)`
+        calls in a state module.
+
+        """
+        try:
+            tree = ast.parse(inspect.getsource(mod))
+        except (OSError, TypeError, SyntaxError):
+            return set()
+        branches = set()
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and
+                    getattr(node.func, "attr", getattr(node.func, "id", None)) == "next_state"):
+                for arg in list(node.args) + [kwarg.value for kwarg in node.keywords]:
+                    # string literals are ast.Constant, or ast.Str (with .s)
+                    # before Python 3.8
+                    value = getattr(arg, "value", getattr(arg, "s", None))
+                    if isinstance(value, str):
+                        branches.add(value)
+        return branches
+
+    def _load_state(self, statename):
+        """
+        Import a state module and register its State class.
+
+        """
+        try:
+            mod = utils.mod_import(f"{self.package}.{statename}")
+            state_class = mod.State
+        except Exception as err:
+            logger.log_trace(f"Could not load state {statename}")
+            self.load_errors[statename] = f"{err.__class__.__name__}: {err}"
+            return None
+        self.states[statename] = state_class
+        nextstates = self._find_branches(mod)
+        if state_class.next_state and state_class.next_state != BaseState.next_state:
+            nextstates.add(state_class.next_state)
+        self.graph[statename] = nextstates
+        return state_class
+
+    def load(self):
+        """
+        Find, import and validate all state modules in the package.
+
+        """
+        t0 = time.time()
+        self.states, self.graph, self.load_errors = {}, {}, {}
+        package = utils.mod_import(self.package)
+        for _, statename, ispkg in pkgutil.iter_modules(package.__path__):
+            if not ispkg:
+                self._load_state(statename)
+        self.validate()
+        self.load_time = time.time() - t0
+        self.loaded = True
+
+    def validate(self):
+        """
+        Check the state graph, storing any problems in `self.graph_errors`.
+
+        Returns:
+            valid (bool): If there were no problems.
+
+        """
+        errors = []
+        if self.first_state not in self.states:
+            errors.append(f"First state {self.first_state} is missing.")
+        for statename, nextstates in sorted(self.graph.items()):
+            for nextstate in sorted(nextstates):
+                if nextstate not in self.states:
+                    errors.append(f"{statename} leads to unknown state {nextstate}.")
+        # walk the graph from the start
+        reached = set()
+        tovisit = [self.first_state]
+        while tovisit:
+            statename = tovisit.pop()
+            if statename in reached or statename not in self.graph:
+                continue
+            reached.add(statename)
+            tovisit.extend(self.graph[statename])
+        for statename in sorted(set(self.states) - reached):
+            errors.append(f"{statename} can never be reached from {self.first_state}.")
+        self.graph_errors = errors
+        return not errors
+
+    def get(self, statename):
+        """
+        Get a State class by name. States not preloaded (such as when
+        the registry was never loaded) are imported on first use.
+
+        Args:
+            statename (str): Name of state module, like `state_001_start`.
+        Returns:
+            state_class (BaseState or None): The state class, or None if it
+                could not be loaded.
+
+        """
+        state_class = self.states.get(statename)
+        if state_class is None:
+            state_class = self._load_state(statename)
+        return state_class
+
+    def report(self):
+        """
+        Get a summary of the loaded states and any problems found.
+
+        Returns:
+            report (str): The report.
+
+        """
+        lines = [f"Evscaperoom: Loaded {len(self.states)} state(s) in "
+                 f"{self.load_time * 1000:.1f}ms."]
+        for statename, err in sorted(self.load_errors.items()):
+            lines.append(f" Could not load {statename}: {err}")
+        for err in self.graph_errors:
+            lines.append(f" {err}")
+        return "\n".join(lines)
 
 
 # handler for managing states on room
@@ -46,28 +197,146 @@ class StateHandler(object):
         self.prev_state_name = room.db.prev_state
         self.current_state = None
         self.current_state = self.load_state(self.current_state_name)
+        # object changes done by the last transition
+        self.last_transition = {}
 
     def load_state(self, statename):
         """
         Load state without initializing it
         """
-        try:
-            mod = utils.mod_import(f"{_ROOMSTATE_PACKAGE}.{statename}")
-        except Exception as err:
-            logger.log_trace()
+        state_class = STATE_REGISTRY.get(statename)
+        if not state_class:
+            err = STATE_REGISTRY.load_errors.get(statename, "")
             self.room.msg_room(None, f"|rBUG: Could not load state {statename}: {err}!")
             self.room.msg_room(None, f"|rBUG: Falling back to {self.current_state_name}")
             return
 
-        state = mod.State(self, self.room)
+        state = state_class(self, self.room)
         return state
 
-    def init_state(self):
+    def _patch_object(self, obj, spec):
+        """
+        Make an existing object match a manifest spec.
+
+        Returns:
+            patched (bool): If anything had to be changed.
+
+        """
+        patched = False
+        desc = spec.get("desc")
+        if desc is not None and obj.get_desc() != desc:
+            obj.set_desc(desc)
+            patched = True
+        aliases = spec.get("aliases")
+        if aliases is not None:
+            aliases = [aliases] if isinstance(aliases, str) else list(aliases)
+            if sorted(obj.aliases.all()) != sorted(aliases):
+                obj.aliases.clear()
+                obj.aliases.batch_add(*aliases)
+                self.room.content_index.add(obj)
+                patched = True
+        for flag in spec.get("flags", ()):
+            if not obj.check_flag(flag):
+                obj.set_flag(flag)
+                patched = True
+        return patched
+
+    def apply_manifest(self, state, prev_state=None):
+        """
+        Make the room contain the objects declared in a state's manifest,
+        changing only what differs from what's already there: Missing
+        objects are created, objects of the wrong typeclass get their
+        typeclass swapped (and are reset as if newly created) and existing
+        objects get their desc, aliases and flags patched.
+
+        Objects in the previous state's `manifest_cleanup` are deleted
+        unless the new state's manifest declares them too.
+
+        Args:
+            state (BaseState): The state to set up the room for.
+            prev_state (BaseState, optional): The state we are leaving.
+
+        Returns:
+            counts (dict): Number of objects "swapped" and "patched".
+
+        """
+        index = self.room.content_index
+        counts = {"swapped": 0, "patched": 0}
+        wanted = set(spec["key"].lower() for spec in state.manifest)
+
+        for key in (prev_state.manifest_cleanup if prev_state else ()):
+            obj = index.get(key)
+            if obj and key.lower() not in wanted:
+                obj.delete()
+
+        to_create = []
+        for spec in state.manifest:
+            obj = index.get(spec["key"])
+            typeclass = spec.get("typeclass")
+            if not obj:
+                if typeclass:
+                    to_create.append(spec)
+                else:
+                    logger.log_err(f"{state}: manifest object '{spec['key']}' does not exist.")
+                continue
+            if typeclass:
+                typeclass = complete_typeclass(typeclass)
+                typeclass_path = typeclass.path if callable(typeclass) else typeclass
+                if obj.typeclass_path != typeclass_path:
+                    obj.swap_typeclass(typeclass, clean_attributes=True,
+                                       run_start_hooks="at_object_creation")
+                    obj.clear_flags()
+                    counts["swapped"] += 1
+            if self._patch_object(obj, spec):
+                counts["patched"] += 1
+
+        if to_create:
+            state.create_objects(to_create)
+        return counts
+
+    def init_state(self, prev_state=None):
         """
         Initialize a new state
 
+        Args:
+            prev_state (BaseState, optional): The state we are coming from.
+
         """
+        if not prev_state:
+            # the first state; next_state starts the count for the others
+            self.end_transition()
+
+        counts = self.apply_manifest(self.current_state, prev_state=prev_state)
         self.current_state.init()
+        # objects may have been renamed or given new aliases
+        self.room.name_resolver.invalidate()
+
+        self.last_transition = counts
+        self.room.log(
+            f"STATE: {prev_state or '-'} -> {self.current_state} (objects swapped: "
+            f"{counts['swapped']}, patched: {counts['patched']})",
+            event="state", state=self.current_state_name,
+            prev_state=prev_state.name.split('.')[-1] if prev_state else None, **counts)
+
+    def end_transition(self):
+        """
+        Log the number of objects created and deleted by the last state
+        transition, and start counting them for the next one. A transition
+        is counted from just before the old state's `clean` until the next
+        transition (or the room is deleted), since an @interactive `init`
+        can go on creating and deleting objects long after it returned.
+
+        """
+        index = self.room.content_index
+        counts = self.last_transition
+        if counts and "created" not in counts:
+            counts["created"] = index.added
+            counts["deleted"] = index.removed
+            self.room.log(
+                f"TRANSITION: {self.current_state} (objects created: {counts['created']}, "
+                f"deleted: {counts['deleted']})",
+                event="transition", state=self.current_state_name, **counts)
+        index.added = index.removed = 0
 
     def next_state(self, next_state=None):
         """
@@ -93,13 +362,14 @@ class StateHandler(object):
             if not next_state:
                 raise RuntimeError(f"Could not load new state {next_state_name}!")
 
+            self.end_transition()
             self.prev_state_name = self.current_state_name
             self.current_state_name = next_state_name
             self.current_state.clean()
             self.prev_state = self.current_state
             self.current_state = next_state
 
-            self.init_state()
+            self.init_state(prev_state=self.prev_state)
 
             self.room.db.prev_state = self.prev_state_name
             self.room.db.state = self.current_state_name
@@ -109,15 +379,74 @@ class StateHandler(object):
 
 # base state class
 
+def _catch_errors(method, msg_room=True):
+    """
+    Wrapper handling state method errors.
+
+    Args:
+        method (callable): The method to wrap.
+        msg_room (bool, optional): Also tell the room about the error. This
+            needs the state instance, so is not possible for static- and
+            classmethods.
+
+    """
+    @wraps(method)
+    def decorator(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except Exception as err:
+            # a wrapped method further down (like a super() call) may
+            # already have reported this error
+            if not getattr(err, "_evscaperoom_reported", False):
+                err._evscaperoom_reported = True
+                logger.log_trace(f"Error in State {__name__}")
+                if msg_room:
+                    args[0].room.msg_room(
+                        None, f"|rThere was an unexpected error in State {__name__}. "
+                        "Please |wreport|r this as an issue.|n")
+            raise  # TODO
+    return decorator
+
+
+def _wrap_methods(cls):
+    """
+    Wrap all methods and other callables defined on a state class in the
+    error-handler. This is done once, when the class is created.
+
+    """
+    for name, val in list(vars(cls).items()):
+        if name.startswith("__") or inspect.isclass(val):
+            continue
+        if isinstance(val, (staticmethod, classmethod)):
+            setattr(cls, name, type(val)(_catch_errors(val.__func__, msg_room=False)))
+        elif inspect.isfunction(val):
+            setattr(cls, name, _catch_errors(val))
+        elif callable(val):
+            # called as-is, without the state instance
+            setattr(cls, name, staticmethod(_catch_errors(val, msg_room=False)))
+
+
 class BaseState(object):
     """
     Base object holding all callables for a state. This is here to
     allow easy overriding for child states.
 
+    All methods of the state (and its child classes) are wrapped in an
+    error-handler when the class is created, so errors are reported
+    to the room.
+
     """
     next_state = "unset"
     # a sequence of hints to describe this state.
     hints = []
+    # objects this state needs in the room, as specs like those given to
+    # `create_objects`. If typeclass is not given, the object must already
+    # exist and is only patched. The StateHandler makes the room match this
+    # before `init` is called, only changing what actually differs.
+    manifest = []
+    # keys of objects belonging only to this state. These are deleted when
+    # the state ends, unless the next state has them in its manifest.
+    manifest_cleanup = []
 
     def __init__(self, handler, room):
         """
@@ -139,31 +468,13 @@ class BaseState(object):
     def __repr__(self):
         return str(self)
 
-    def _catch_errors(self, method):
-        """
-        Wrapper handling state method errors.
-
-        """
-        @wraps(method)
-        def decorator(*args, **kwargs):
-            try:
-                return method(*args, **kwargs)
-            except Exception:
-                logger.log_trace(f"Error in State {__name__}")
-                self.room.msg_room(None, f"|rThere was an unexpected error in State {__name__}. "
-                                   "Please |wreport|r this as an issue.|n")
-                raise  # TODO
-        return decorator
-
-    def __getattribute__(self, key):
+    def __init_subclass__(cls, **kwargs):
         """
-        Always wrap all callables in the error-handler
+        Always wrap all methods in the error-handler
 
         """
-        val = _GA(self, key)
-        if callable(val):
-            return _GA(self, "_catch_errors")(val)
-        return val
+        super().__init_subclass__(**kwargs)
+        _wrap_methods(cls)
 
     def get_hint(self):
         """
@@ -177,7 +488,8 @@ class BaseState(object):
             self.room.db.state_hint_level = next_level
             self.room.db.stats["hints_used"] += 1
             self.room.log(f"HINT: {self.name.split('.')[-1]}, level {next_level + 1} "
-                          f"(total used: {self.room.db.stats['hints_used']})")
+                          f"(total used: {self.room.db.stats['hints_used']})",
+                          event="hint", state=self.name.split('.')[-1], level=next_level + 1)
             return self.hints[next_level]
         else:
             # no more hints for this state
@@ -191,11 +503,10 @@ class BaseState(object):
         if cinematic:
             message = msg_cinematic(message, borders=borders)
         if target:
-            options = target.attributes.get(
-                "options", category=self.room.tagcategory, default={})
+            options = self.room.playerstate.get(target, "options", default={})
             style = options.get("things_style", 2)
             # we assume this is a char
-            target.msg(parse_for_things(message, things_style=style))
+            target.msg(compile_template(message).render(None, things_style=style))
         else:
             self.room.msg_room(None, message)
 
@@ -226,6 +537,59 @@ class BaseState(object):
             typeclass=typeclass, key=key, location=location,
             tags=[("room", self.room.tagcategory.lower())], **kwargs)
 
+    def create_objects(self, specs):
+        """
+        Create many EvscapeRoom objects in one go, inside a single database
+        transaction. Each object's desc (or its
+        reference in the shared catalog) is written together with its other
+        Attributes and its tags in one batch, instead of one at a time after
+        creation.
+
+        Args:
+            specs (list): List of dicts, one per object to create. Each dict
+                holds the kwargs to `create_object` (typeclass, key, aliases,
+                tags etc). The following keys are also understood:
+                    desc (str): The description of the object.
+                    flags (list): Flags to set on the object.
+        Returns:
+            new_objs (list): The newly created objects, in the same order
+                as `specs`.
+
+        Example:
+            self.create_objects([
+                {"typeclass": Rug, "key": "rug", "aliases": ["carpet"],
+                 "desc": RUG_DESC.strip()},
+                {"typeclass": Table, "key": "table", "desc": TABLE_DESC.strip(),
+                 "flags": ["climbable"]}])
+
+        """
+        roomtag = ("room", self.room.tagcategory.lower())
+        new_objs = []
+        try:
+            with transaction.atomic():
+                for spec in specs:
+                    kwargs = dict(spec)
+                    desc = kwargs.pop("desc", None)
+                    flags = kwargs.pop("flags", None)
+                    kwargs["location"] = kwargs.get("location") or self.room
+                    kwargs["tags"] = [roomtag] + list(kwargs.get("tags") or [])
+                    if desc is not None:
+                        kwargs["attributes"] = ([CATALOG.desc_attribute(desc)] +
+                                                list(kwargs.get("attributes") or []))
+                    obj = create_evscaperoom_object(**kwargs)
+                    new_objs.append(obj)
+                    for flag in flags or ():
+                        obj.set_flag(flag)
+        except Exception:
+            # the transaction was rolled back, so these objects were never
+            # saved - don't leave them in the room's in-memory indexes
+            for obj in new_objs:
+                self.room.content_index.remove(obj)
+                obj.clear_flags()
+            self.room.name_resolver.invalidate()
+            raise
+        return new_objs
+
     def get_object(self, key):
         """
         Find a named *non-character* object for this state in this room.
@@ -236,12 +600,11 @@ class BaseState(object):
             obj (Object): Object in the room.
 
         """
-        match = EvscaperoomObject.objects.filter_family(
-            db_key__iexact=key, db_tags__db_category=self.room.tagcategory.lower())
+        match = self.room.content_index.get(key)
         if not match:
             logger.log_err(f"get_object: No match for '{key}' in state ")
             return None
-        return match[0]
+        return match
 
     # state methods
 
@@ -291,3 +654,10 @@ class BaseState(object):
 
         """
         pass
+
+
+# wrap the base class too (__init_subclass__ only covers children)
+_wrap_methods(BaseState)
+
+# the registry is loaded at server start
+STATE_REGISTRY = StateRegistry()
@@ -26,6 +26,7 @@ from evennia.utils import interactive, justify, wrap
 from .. import objects
 from ..state import BaseState
 from ..utils import add_msg_borders
+from ..catalog import CATALOG
 
 # ------------------------------------------------------------
 # initial greeting (called from menu)
@@ -944,7 +945,7 @@ class Damper(objects.Openable):
 
     def at_object_creation(self):
         super().at_object_creation()
-        self.db.desc = DAMPER_DESC.strip()
+        self.set_desc(DAMPER_DESC.strip())
 
     def at_open(self, caller):
         if not self.check_flag("opened_once"):
@@ -953,7 +954,7 @@ class Damper(objects.Openable):
             self.set_flag("opened_once")
             locket = self.room.state.create_object(
                 Locket, key="locket")
-            locket.db.desc = LOCKET_DESC_CLOSED.strip()
+            locket.set_desc(LOCKET_DESC_CLOSED.strip())
             self.room.set_flag("opened_damper_once")
         else:
             self.msg_room(caller, DAMPER_OPEN.strip())
@@ -1094,7 +1095,8 @@ class Locket(objects.Openable, objects.CodeInput):
         self.msg_char(caller, "It looks like it wants you to say a name.")
 
     def at_code_incorrect(self, caller, code_tried):
-        self.room.log(f"{caller.key} tried the name '{code_tried}' to open locket")
+        self.room.log(f"{caller.key} tried the name '{code_tried}' to open locket",
+                      caller=caller, event="code_tried", code=code_tried)
         if code_tried.lower() in ("vale", "angus"):
             self.room.achievement(caller, "Awkward", "Named the wrong 'beloved' to the locket")
         self.msg_room(caller, LOCKET_CODE_INCORRECT.format(code=code_tried).strip())
@@ -1192,7 +1194,7 @@ class Kitchen(objects.EvscaperoomObject):
         bottle1 = self.room.state.create_object(
             Bottle, key="bottle one", aliases=["bottle1", "bottle 1"],
             attributes=[
-                ("desc", BOTTLE_DESC1.strip()),
+                CATALOG.desc_attribute(BOTTLE_DESC1.strip()),
                 ("txt_smell", "roses"),
                 ("txt_ingredient", "a few drops from the first bottle"),
                 ("txt_color", "pink")])
@@ -1200,7 +1202,7 @@ class Kitchen(objects.EvscaperoomObject):
         bottle2 = self.room.state.create_object(
             Bottle, key="bottle two", aliases=["bottle2", "bottle 2"],
             attributes=[
-                ("desc", BOTTLE_DESC2.strip()),
+                CATALOG.desc_attribute(BOTTLE_DESC2.strip()),
                 ("txt_smell", "earthy delight"),
                 ("txt_ingredient", "a few drops from the second bottle"),
                 ("txt_color", "purple")])
@@ -1208,7 +1210,7 @@ class Kitchen(objects.EvscaperoomObject):
         bottle3 = self.room.state.create_object(
             Bottle, key="bottle three", aliases=["bottle3", "bottle 3"],
             attributes=[
-                ("desc", BOTTLE_DESC3.strip()),
+                CATALOG.desc_attribute(BOTTLE_DESC3.strip()),
                 ("txt_smell", "Father Death having gasses"),
                 ("txt_ingredient", "a very small drop from the third bottle"),
                 ("txt_color", "brown-red")])
@@ -1216,7 +1218,7 @@ class Kitchen(objects.EvscaperoomObject):
         bottle4 = self.room.state.create_object(
             Bottle, key="bottle four", aliases=["bottle4", "bottle 4"],
             attributes=[
-                ("desc", BOTTLE_DESC4.strip()),
+                CATALOG.desc_attribute(BOTTLE_DESC4.strip()),
                 ("txt_smell", "clean air"),
                 ("txt_ingredient", "a few drops from the fourth bottle"),
                 ("txt_color", "transparent")])
@@ -1224,7 +1226,7 @@ class Kitchen(objects.EvscaperoomObject):
         bottle5 = self.room.state.create_object(
             Bottle, key="bottle five", aliases=["bottle5", "bottle 5"],
             attributes=[
-                ("desc", BOTTLE_DESC5.strip()),
+                CATALOG.desc_attribute(BOTTLE_DESC5.strip()),
                 ("txt_smell", "loo"),
                 ("txt_ingredient", "a drop from the fifth bottle"),
                 ("txt_color", "yellow")])
@@ -1655,7 +1657,7 @@ class Hairs(objects.Edible, objects.Usable):
 
     def at_object_creation(self):
         super().at_object_creation()
-        self.db.desc = HAIR_DESC.strip()
+        self.set_desc(HAIR_DESC.strip())
         self.set_flag("childmaker_ingredient_childlike")
 
     @interactive
@@ -1993,6 +1995,9 @@ class State(BaseState):
              STATE_HINT_LVL2,
              STATE_HINT_LVL3]
 
+    # the coin gets inserted into the statue at the end of this state
+    manifest_cleanup = ["coin"]
+
     def character_enters(self, character):
         self.cinematic(GREETING.format(name=character.key),
                        target=character)
@@ -2003,85 +2008,48 @@ class State(BaseState):
         """
         self.room.db.desc = ROOM_DESC
 
-        cabindoor = self.create_object(
-            CabinDoor, key="door to the cabin", aliases=["door"])
-        cabindoor.db.desc = CABINDOOR_DESC.strip()
-        hintberry_plate = self.create_object(
-            HintberryPlate, key="pie on a plate",
-            aliases=["stool", "hintberry", "hintberry pie"])
-        hintberry_plate.db.desc = HINTBERRY_PLATE_DESC.strip()
-        windows = self.create_object(
-            Windows, key="windows", aliases=['window'])
-        windows.db.desc = WINDOWS_DESC.strip()
-        metalworks = self.create_object(
-            Metalworks, key="metalworks (outside)", aliases='metalworks')
-        metalworks.db.desc = METALWORKS_DESC
-        scarecrow = self.create_object(
-            Scarecrow, key="scarecrow (outside)", aliases=['scarecrow'])
-        scarecrow.db.desc = SCARECROW_DESC.strip()
-        rafters = self.create_object(
-            Rafters, key='rafters')
-        rafters.db.desc = RAFTERS_DESC.strip()
-        chimes = self.create_object(
-            Chimes, key='chimes with red herrings', aliases="chimes")
-        chimes.db.desc = CHIMES_DESC.strip()
-        laundry = self.create_object(
-            Laundry, key="laundry")
-        laundry.db.desc = LAUNDRY_DESC.strip()
-        saddle = self.create_object(
-            Saddle, key="saddle")
-        saddle.db.desc = SADDLE_DESC.strip()
-        socks = self.create_object(
-            Socks, key="socks")
-        socks.db.desc = SOCKS_DESC.strip()
-        bathtowel = self.create_object(
-            Bathtowel, key="bathtowel", aliases=["towel"])
-        bathtowel.db.desc = BATHTOWEL_DESC.strip()
-        fireplace = self.create_object(
-            Fireplace, key="fireplace", aliases=["chimney"])
-        fireplace.db.desc = FIREPLACE_DESC.strip()
-        cauldron = self.create_object(
-            Cauldron, key="cauldron")
-        cauldron.db.desc = CAULDRON_DESC.strip()
-        painting = self.create_object(
-            Painting, key="painting over the fireplace", aliases=["painting"])
-        painting.db.desc = PAINTING_DESC.strip()
-        ashes = self.create_object(
-            Ashes, key="ashes in the fireplace", aliases=["ashes"])
-        ashes.db.desc = ASHES_DESC.strip()
-        closet = self.create_object(
-            Closet, key="closet")
-        closet.db.desc = CLOSET_DESC.strip()
-        kitchen = self.create_object(
-            Kitchen, key="kitchen")
-        kitchen.db.desc = KITCHEN_DESC.strip()
-        chair = self.create_object(
-            Chair, key="chair")
-        chair.db.desc = CHAIR_DESC.strip()
-        statue = self.create_object(
-            Statue, key='statue', aliases=["monkey"])
-        statue.db.desc = STATUE_DESC.strip()
-        hair = self.create_object(
-            Hairs, key="hair", aliases=['hairs', 'strands of hair'])
-        hair.db.desc = HAIR_DESC.strip()
-        bed = self.create_object(
-            Bed, key="bed")
-        bed.db.desc = BED_DESC.strip()
-        floor = self.create_object(
-            Floor, key="floor", aliases=["floor boards"])
-        floor.db.desc = FLOOR_DESC.strip()
-        rug = self.create_object(
-            Rug, key="rug", aliases=['carpet'])
-        rug.db.desc = RUG_DESC.strip()
-        table = self.create_object(
-            Table, key="table")
-        table.db.desc = TABLE_DESC.strip()
-        mirror = self.create_object(
-            Mirror, key="mirror")
-        mirror.db.desc = MIRROR_DESC.strip()
-        plant = self.create_object(
-            Plant, key="plant")
-        plant.db.desc = PLANT_DESC.strip()
+        self.create_objects([
+            {"typeclass": CabinDoor, "key": "door to the cabin", "aliases": ["door"],
+             "desc": CABINDOOR_DESC.strip()},
+            {"typeclass": HintberryPlate, "key": "pie on a plate",
+             "aliases": ["stool", "hintberry", "hintberry pie"],
+             "desc": HINTBERRY_PLATE_DESC.strip()},
+            {"typeclass": Windows, "key": "windows", "aliases": ['window'],
+             "desc": WINDOWS_DESC.strip()},
+            {"typeclass": Metalworks, "key": "metalworks (outside)", "aliases": 'metalworks',
+             "desc": METALWORKS_DESC},
+            {"typeclass": Scarecrow, "key": "scarecrow (outside)", "aliases": ['scarecrow'],
+             "desc": SCARECROW_DESC.strip()},
+            {"typeclass": Rafters, "key": 'rafters', "desc": RAFTERS_DESC.strip()},
+            {"typeclass": Chimes, "key": 'chimes with red herrings', "aliases": "chimes",
+             "desc": CHIMES_DESC.strip()},
+            {"typeclass": Laundry, "key": "laundry", "desc": LAUNDRY_DESC.strip()},
+            {"typeclass": Saddle, "key": "saddle", "desc": SADDLE_DESC.strip()},
+            {"typeclass": Socks, "key": "socks", "desc": SOCKS_DESC.strip()},
+            {"typeclass": Bathtowel, "key": "bathtowel", "aliases": ["towel"],
+             "desc": BATHTOWEL_DESC.strip()},
+            {"typeclass": Fireplace, "key": "fireplace", "aliases": ["chimney"],
+             "desc": FIREPLACE_DESC.strip()},
+            {"typeclass": Cauldron, "key": "cauldron", "desc": CAULDRON_DESC.strip()},
+            {"typeclass": Painting, "key": "painting over the fireplace", "aliases": ["painting"],
+             "desc": PAINTING_DESC.strip()},
+            {"typeclass": Ashes, "key": "ashes in the fireplace", "aliases": ["ashes"],
+             "desc": ASHES_DESC.strip()},
+            {"typeclass": Closet, "key": "closet", "desc": CLOSET_DESC.strip()},
+            {"typeclass": Kitchen, "key": "kitchen", "desc": KITCHEN_DESC.strip()},
+            {"typeclass": Chair, "key": "chair", "desc": CHAIR_DESC.strip()},
+            {"typeclass": Statue, "key": 'statue', "aliases": ["monkey"],
+             "desc": STATUE_DESC.strip()},
+            {"typeclass": Hairs, "key": "hair", "aliases": ['hairs', 'strands of hair'],
+             "desc": HAIR_DESC.strip()},
+            {"typeclass": Bed, "key": "bed", "desc": BED_DESC.strip()},
+            {"typeclass": Floor, "key": "floor", "aliases": ["floor boards"],
+             "desc": FLOOR_DESC.strip()},
+            {"typeclass": Rug, "key": "rug", "aliases": ['carpet'], "desc": RUG_DESC.strip()},
+            {"typeclass": Table, "key": "table", "desc": TABLE_DESC.strip()},
+            {"typeclass": Mirror, "key": "mirror", "desc": MIRROR_DESC.strip()},
+            {"typeclass": Plant, "key": "plant", "desc": PLANT_DESC.strip()},
+        ])
 
     def clean(self):
         # reset all positions (get off chair/table etc)
@@ -195,23 +195,20 @@ class State(BaseState):
              STATE_HINT_LVL3,
              STATE_HINT_LVL4]
 
+    # the coin is gone now, inserted into the statue (it's cleaned up by
+    # the previous state). The rafters and statue get new typeclasses.
+    manifest = [
+        {"typeclass": RaftersNoCoin, "key": "rafters"},
+        {"typeclass": StatueActive, "key": "statue", "aliases": ["monkey"],
+         "desc": STATUE_DESC.strip()},
+    ]
+
     def character_enters(self, character):
         self.cinematic(GREETING.format(name=character.key),
                        target=character)
 
     @interactive
     def init(self):
-        # the coin is gone now, inserted into the statue
-        coin = self.get_object("coin")
-        if coin:
-            coin.delete()
-        # delete objects that we'll replace with new versions
-        self.create_object(RaftersNoCoin, key="rafters")
-
-        statue = self.create_object(
-            StatueActive, key='statue', aliases=['monkey'])
-        statue.db.desc = STATUE_DESC.strip()
-
         # introduce the statue talking
         yield(2)
         self.msg(STATUE_AWAKENING_1.rstrip())
@@ -3,7 +3,6 @@ Listening to the monkey automaton to open the closet
 
 """
 
-import random
 from evennia import DefaultScript
 from evennia.utils import interactive
 from ..state import BaseState
@@ -237,12 +236,15 @@ class StatueValeChatter(DefaultScript):
             # remind the player about the hintberry pie
             self.obj.room.msg_room(None, STATUE_HINTBERRY_PIE.strip())
 
-        elif random.random() < 0.3:
-            # most of the time Vale says nothing on repeat
+        elif self.obj.room.get_rng("chatter").random() < 0.3:
+            # most of the time Vale says nothing on repeat. This runs on a
+            # timer, so it uses its own random sequence so as to not change
+            # the one used for the players' actions
             ind = self.db.chatter_index
             if ind > 9:
                 # start randomize after all have been heard once
-                chatter = random.choice(STATUE_RANDOM_CHATTERS).strip()
+                chatter = self.obj.room.get_rng("chatter").choice(
+                    STATUE_RANDOM_CHATTERS).strip()
             else:
                 # step through each statement in turn
                 chatter = STATUE_RANDOM_CHATTERS[ind].strip()
@@ -379,10 +381,10 @@ class State(BaseState):
             statue.delete()
         statue = self.create_object(
             StatueVale, key="Vale", aliases=['statue', 'monkey'])
-        statue.db.desc = STATUE_DESC.strip()
+        statue.set_desc(STATUE_DESC.strip())
         closet = self.create_object(
             ClosetClosed, key="closet")
-        closet.db.desc = CLOSET_DESC.strip()
+        closet.set_desc(CLOSET_DESC.strip())
 
         self.room.msg_room(None, STATUE_RHYME.strip())
 
@@ -76,7 +76,7 @@ class ClosetOpen(objects.Openable):
         if not self.room.state.get_object("blanket"):
             blanket = self.room.state.create_object(
                 Blanket, key="blanket")
-            blanket.db.desc = BLANKET_DESC.strip()
+            blanket.set_desc(BLANKET_DESC.strip())
             self.msg_room(caller, "~You found a *blanket in a *closet drawer.", True)
 
         self.msg_char(caller, CLOSET_DRAWERS.strip())
@@ -209,7 +209,7 @@ class Bowl(objects.Rotatable, objects.Readable, objects.Mixable):
         childmaker = self.room.state.create_object(
             Childmaker, key="childmaker potion",
             aliases=["childmaker", "bowl"])
-        childmaker.db.desc = CHILDMAKER_DESC
+        childmaker.set_desc(CHILDMAKER_DESC)
         # moving on!
         self.next_state()
         # delete ourselves, the childmaker replaces us
@@ -893,7 +893,7 @@ class State(BaseState):
     def init(self):
         closet = self.create_object(
             ClosetOpen, key="closet")
-        closet.db.desc = CLOSET_DESC.strip()
+        closet.set_desc(CLOSET_DESC.strip())
 
         vale = self.get_object("vale")
         if vale:
@@ -901,17 +901,17 @@ class State(BaseState):
 
         bowl = self.create_object(
             Bowl, key="alchemy bowl", aliases=["bowl"])
-        bowl.db.desc = BOWL_DESC.strip()
+        bowl.set_desc(BOWL_DESC.strip())
 
         slate = self.create_object(
             Slate, key="slate")
-        slate.db.desc = SLATE_DESC.strip()
+        slate.set_desc(SLATE_DESC.strip())
         poster = self.create_object(
             Poster, key="poster", aliases=["wanted poster"])
-        poster.db.desc = POSTER_DESC.strip()
+        poster.set_desc(POSTER_DESC.strip())
         book = self.create_object(
             Book, key="book", aliases='lexicon')
-        book.db.desc = BOOK_DESC.strip()
+        book.set_desc(BOOK_DESC.strip())
 
     def clear(self):
         super().clear()
@@ -119,7 +119,7 @@ class State(BaseState):
         # replace windows with version that can be covered
         windows = self.create_object(
             WindowsCoverable, key='windows', aliases=["window"])
-        windows.db.desc = WINDOWS_DESC.strip()
+        windows.set_desc(WINDOWS_DESC.strip())
         yield(10)
         self.msg(INTRO1)
 
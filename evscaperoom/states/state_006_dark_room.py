@@ -164,22 +164,20 @@ class State(BaseState):
 
     next_state = "state_007_chest_lever"
 
+    manifest = [
+        {"key": "fireplace", "desc": FIREPLACE_DESC.strip()},
+        {"key": "windows", "desc": WINDOWS_DESC.strip()},
+        {"typeclass": Stone, "key": "stone", "desc": STONE_DESC.strip()},
+    ]
+    # the stone is only around while the room is dark
+    manifest_cleanup = ["stone"]
+
     def character_enters(self, character):
         self.cinematic(GREETING.format(name=character.key),
                        target=character)
 
     @interactive
     def init(self):
-
-        fireplace = self.get_object("fireplace")
-        if fireplace:
-            fireplace.db.desc = FIREPLACE_DESC.strip()
-        windows = self.get_object("windows")
-        if windows:
-            windows.db.desc = WINDOWS_DESC.strip()
-        stone = self.create_object(
-            Stone, key="stone")
-        stone.db.desc = STONE_DESC.strip()
         self.room.db.desc = ROOM_DESC.strip()
         yield(4)
         self.msg(INTRO1.strip())
@@ -188,10 +186,6 @@ class State(BaseState):
         super().clean()
         self.room.progress(52)
 
-        # clean up
-        stone = self.get_object("stone")
-        if stone:
-            stone.delete()
         # reset all positions (get off chair/table etc)
         for char in self.room.get_all_characters():
             self.room.set_position(char, None)
@@ -2,7 +2,6 @@
 Use the lever with the chest (this is a short state)
 
 """
-from random import choice
 from evennia.utils import interactive
 from ..state import BaseState
 from .. import objects
@@ -117,9 +116,10 @@ class StatueValeQuiet(objects.EvscaperoomObject):
 
     def at_focus_speak(self, caller, **kwargs):
         args = kwargs['args'].strip().capitalize()
-        self.room.log(f"speak to Vale: '{args}'")
+        self.room.log(f"speak to Vale: '{args}'", caller=caller, event="say")
         self.msg_room(caller, f"~You says to *Vale: |c'{args}'|n.")
-        self.msg_room(caller, VALE_SPEAK.format(reply=choice(VALE_RESPONSES)).strip())
+        reply = self.room.get_rng().choice(VALE_RESPONSES)
+        self.msg_room(caller, VALE_SPEAK.format(reply=reply).strip())
 
     def get_cmd_signatures(self):
         txt = "You could look at Vale's *face and also *speak <topic> to it."
@@ -317,7 +317,7 @@ class SocksCleanable(Socks):
     def at_apply(self, caller, action, target):
         self.room.score(2, "clean lever with sock")
         target.at_clean(caller, self, txt=SOCKS_APPLY.strip())
-        self.db.desc = SOCKS_DESC_SOOTY.strip()
+        self.set_desc(SOCKS_DESC_SOOTY.strip())
 
 
 # ------------------------------------------------------------
@@ -381,21 +381,25 @@ class State(BaseState):
 
         lever = self.create_object(
             Lever, key="lever", aliases=["shaft"])
-        lever.db.desc = LEVER_DESC.strip()
+        lever.set_desc(LEVER_DESC.strip())
         socks = self.create_object(
             SocksCleanable, key="socks")
-        socks.db.desc = SOCKS_DESC.strip()
+        socks.set_desc(SOCKS_DESC.strip())
+
+        # these are not in a manifest, since a manifest would have them
+        # changed before the intro has told the players it happens. They
+        # are replaced here, at the right point of the intro.
 
         # replace fireplace since it looks different now
         fireplace = self.create_object(
             FireplaceEmpty, key="fireplace")
-        fireplace.db.desc = FIREPLACE_DESC.strip()
+        fireplace.set_desc(FIREPLACE_DESC.strip())
         ashes = self.get_object("ashes")
         if ashes:
             ashes.delete()
         ashes = self.create_object(
             AshesUsable, key="ashes")
-        ashes.db.desc = ASHES_DESC.strip()
+        ashes.set_desc(ASHES_DESC.strip())
 
         yield(3)
 
@@ -407,11 +411,11 @@ class State(BaseState):
             vale.delete()
         vale = self.create_object(
             StatueValeQuiet, key="Vale", aliases=["statue", "monkey"])
-        vale.db.desc = VALE_DESC.strip()
+        vale.set_desc(VALE_DESC.strip())
 
         windows = self.get_object("windows")
         if windows:
-            windows.db.desc = WINDOWS_DESC.strip()
+            windows.set_desc(WINDOWS_DESC.strip())
 
         self.room.msg_room(None, STONE_PUSH_INTRO4.rstrip())
 
@@ -135,7 +135,8 @@ class LeverMovable(Lever):
                 self.msg_room(caller, LEVER_SUCCEED.format(direction=args).strip())
             else:
                 self.room.log(f"chest open failed: "
-                              f"Tried {' + '.join([dr for dr in self.db.sequence])}")
+                              f"Tried {' + '.join([dr for dr in self.db.sequence])}",
+                              caller=caller, event="lever_failure")
                 self.db.sequence = []
                 self.msg_room(caller, LEVER_RESET.strip())
 
@@ -281,17 +282,17 @@ class State(BaseState):
         # ashes changed look now that lever is gone
         ashes = self.get_object("ashes")
         if ashes:
-            ashes.db.desc = ASHES_DESC.strip()
+            ashes.set_desc(ASHES_DESC.strip())
 
         # replace lever with movable version
         lever = self.create_object(
             LeverMovable, key="lever", aliases=['shaft'])
-        lever.db.desc = LEVER_DESC.strip()
+        lever.set_desc(LEVER_DESC.strip())
 
         # replace chest with openable version
         chest = self.create_object(
             ChestOpenable, key="chest")
-        chest.db.desc = CHEST_DESC.strip()
+        chest.set_desc(CHEST_DESC.strip())
 
     def clean(self):
         super().clean()
@@ -3,7 +3,6 @@ Time to make the super-fertilizer from our ingredients.
 
 """
 
-from random import random
 from evennia.utils import interactive
 from ..state import BaseState
 from .. import objects
@@ -130,7 +129,7 @@ class LookingGlass(objects.Usable):
 
     def at_cannot_apply(self, caller, action, obj):
         self.msg_room(caller, LOOKINGGLASS_APPLY_TO_ROOM.format(target=obj.key))
-        if random() < 0.5:
+        if self.room.get_rng().random() < 0.5:
             self.msg_char(caller, LOOKINGGLASS_APPLY)
         else:
             self.room.score(1, "Getting random insight from monocular")
@@ -192,7 +191,7 @@ class Letter(objects.Readable):
             # we can create the fertilizer
             plant = self.room.state.create_object(
                 PlantMixable, key="plant")
-            plant.db.desc = PLANT_DESC.strip()
+            plant.set_desc(PLANT_DESC.strip())
 
 
 # ------------------------------------------------------------
@@ -339,13 +338,13 @@ class State(BaseState):
         # chest needs no further interaction
         chest = self.create_object(
             ChestOpen, key="chest")
-        chest.db.desc = CHEST_DESC.strip()
+        chest.set_desc(CHEST_DESC.strip())
         lookingglass = self.create_object(
             LookingGlass, key="looking glass", aliases=["monocular", "lookingglass", "glass"])
-        lookingglass.db.desc = LOOKINGGLASS_DESC.strip()
+        lookingglass.set_desc(LOOKINGGLASS_DESC.strip())
         letter = self.create_object(
             Letter, key="letter")
-        letter.db.desc = LETTER_DESC.strip()
+        letter.set_desc(LETTER_DESC.strip())
 
         yield(3)
 
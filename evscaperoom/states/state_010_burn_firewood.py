@@ -157,7 +157,7 @@ class State(BaseState):
             plant.delete()
         rosebush = self.create_object(
             Rosebush, key="rosebush", aliases="rose bush")
-        rosebush.db.desc = ROSEBUSH_DESC.strip()
+        rosebush.set_desc(ROSEBUSH_DESC.strip())
 
         self.msg(INTRO_TEXT1.rstrip())
         yield(4)
@@ -113,7 +113,7 @@ class CauldronMelted(objects.EvscaperoomObject):
         if not self.check_flag("found_key"):
             doorkey = self.room.state.create_object(
                 DoorKey, "key", aliases=["door key"])
-            doorkey.db.desc = DOORKEY_DESC.strip()
+            doorkey.set_desc(DOORKEY_DESC.strip())
             self.msg_room(caller, CAULDRON_DIG.strip())
             self.set_flag("found_key")
         else:
@@ -167,11 +167,11 @@ class CabinDoorOpenable(objects.Openable):
     def at_open(self, caller):
         # this will be the end of the game!
         self.msg_room(caller, CABINDOOR_OPEN.strip())
-        self.db.desc = CABINDOOR_DESC_OPEN.strip()
+        self.set_desc(CABINDOOR_DESC_OPEN.strip())
 
     def at_close(self, caller):
         self.msg_char(caller, "The door is closed.")
-        self.db.desc = CABINDOOR_DESC.strip()
+        self.set_desc(CABINDOOR_DESC.strip())
 
     @interactive
     def at_focus_leave(self, caller, **kwargs):
@@ -301,7 +301,7 @@ class State(BaseState):
             door.delete()
         door = self.create_object(
             CabinDoorOpenable, key="door to the cabin", aliases=["door"])
-        door.db.desc = CABINDOOR_DESC.strip()
+        door.set_desc(CABINDOOR_DESC.strip())
 
         yield(3)
         self.msg(INTRO_TEXT1.rstrip())
@@ -312,7 +312,7 @@ class State(BaseState):
 
         cauldron = self.create_object(
             CauldronMelted, key="cauldron")
-        cauldron.db.desc = CAULDRON_DESC.strip()
+        cauldron.set_desc(CAULDRON_DESC.strip())
 
     def clean(self):
         super().clean()
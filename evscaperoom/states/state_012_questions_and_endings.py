@@ -133,15 +133,15 @@ def collect_stats(caller, room):
     question3 = room.check_character_flag(caller, "question3")
 
     # eventual extra room flags
-    roomflags = room.db.flags
+    roomflags = room.get_flags()
 
     # total time played in this room
-    roomtime = time_format((timezone.now() -
-                            room.db_date_created).seconds, style=3)
+    # (rooms from the room pool count from when they were checked out)
+    started = room.db.started or room.db_date_created
+    roomtime = time_format((timezone.now() - started).seconds, style=3)
 
     # individual achievements
-    achievements = caller.attributes.get(
-        "achievements", category=room.tagcategory, default={})
+    achievements = room.playerstate.get(caller, "achievements", default={})
     if not achievements:
         achievements = ["(None, zilch, de nada)"]
     else:
@@ -797,6 +797,11 @@ class CmdHandleEnding(CmdEvscapeRoom):
     """
     key = "_startending"
 
+    def at_pre_cmd(self):
+        # this is started by the state, not entered by the player, so
+        # it should not be recorded
+        pass
+
     def func(self):
 
         caller = self.caller
@@ -820,7 +825,9 @@ class CmdHandleEnding(CmdEvscapeRoom):
             if not confirm or confirm.upper() in ('Y', 'YES'):
                 break
         answer = ANSWER_MAP_QUESTION_1.get(reply1.strip().lower(), "OTHER")
-        room.log(f"Question 1: {caller} answered '{reply1.strip()}' ({answer})")
+        room.log(f"Question 1: {caller} answered '{reply1.strip()}' ({answer})",
+                 caller=caller, event="question", question=1, reply=reply1.strip(),
+                 answer=answer)
         room.set_character_flag(caller, "question1", value=answer)
 
         # question two
@@ -837,7 +844,9 @@ class CmdHandleEnding(CmdEvscapeRoom):
             if not confirm or confirm.upper() in ('Y', 'YES'):
                 break
         answer = ANSWER_MAP_QUESTION_2.get(reply2.strip().lower(), "OTHER")
-        room.log(f"Question 2: {caller} answered '{reply2.strip()}' ({answer})")
+        room.log(f"Question 2: {caller} answered '{reply2.strip()}' ({answer})",
+                 caller=caller, event="question", question=2, reply=reply2.strip(),
+                 answer=answer)
         room.set_character_flag(caller, "question2", value=answer)
 
         # question three
@@ -854,7 +863,9 @@ class CmdHandleEnding(CmdEvscapeRoom):
             if not confirm or confirm.upper() in ('Y', 'YES'):
                 break
         answer = ANSWER_MAP_QUESTION_3.get(reply3.strip().lower(), "OTHER")
-        room.log(f"Question 3: {caller} answered '{reply3.strip()}' ({answer})")
+        room.log(f"Question 3: {caller} answered '{reply3.strip()}' ({answer})",
+                 caller=caller, event="question", question=3, reply=reply3.strip(),
+                 answer=answer)
         room.set_character_flag(caller, "question3", value=answer)
 
         # get individualized stats
@@ -862,7 +873,8 @@ class CmdHandleEnding(CmdEvscapeRoom):
 
         scoreboard = SCOREBOARD.format(**stats)
 
-        room.log(scoreboard)
+        room.log(scoreboard, caller=caller, event="scoreboard", score=stats["score"],
+                 hints_used=stats["hints_used"], progress=stats["progress"])
 
         # figure out endings and run them
         endings = get_endings(stats)
@@ -872,7 +884,7 @@ class CmdHandleEnding(CmdEvscapeRoom):
 
         # show scoreboard
         caller.msg(display_score(scoreboard))
-        room.log(f"{caller} watched cinematic and scoreboard")
+        room.log(f"{caller} watched cinematic and scoreboard", caller=caller, event="finish")
 
         yield(" (press return to exit the game and go back to Evscaperoom menu)")
 
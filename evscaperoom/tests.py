@@ -3,8 +3,15 @@ Unit tests for the Evscaperoom
 
 """
 import inspect
+import json
 import pkgutil
+import random
+import shutil
+import tempfile
+import time
 from os import path
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
 from evennia.commands.default.tests import CommandTest
 from evennia import InterruptCommand
 from evennia.utils.test_resources import EvenniaTest
@@ -13,6 +20,16 @@ from . import commands
 from . import state as basestate
 from . import objects
 from . import utils
+from . import roompool
+from . import reaper
+from . import lobby
+from . import flags
+from . import roomlog
+from . import analytics
+from . import output
+from . import replay
+from . import playthrough
+from . import loadgen
 
 
 class TestEvscaperoomCommands(CommandTest):
@@ -35,6 +52,30 @@ class TestEvscaperoomCommands(CommandTest):
         self.assertEqual((None, "Foo"), cmd._search("Foo", None))
         self.assertRaises(InterruptCommand, cmd._search, "Foo", True)
 
+    def test_name_resolver(self):
+        room = self.room1
+        for key, aliases in (("chest under the bed", ["chest"]), ("chest", []),
+                             ("red button", ["button", "rb"]), ("blue button", ["bb"]),
+                             ("old Obj", [])):
+            utils.create_evscaperoom_object(
+                objects.EvscaperoomObject, key=key, aliases=aliases, location=room)
+        resolver = room.name_resolver
+        for query in ("chest", "CHEST", "ch", "c u b", "the bed", "button", "butt", "r", "rb",
+                      "b", "2-button", "3-button", "2-chest", "obj", "Char", "here", "me",
+                      "Testroom", "nothing", ""):
+            self.assertEqual(resolver.search(self.char1, query),
+                             list(self.char1.search(query, quiet=True)), query)
+        self.assertEqual(resolver.search(self.char1, "3-button"), [])
+        # dbrefs are searched for globally
+        self.assertEqual(resolver.search(self.char1, f"#{self.obj1.id}"), None)
+
+        # new objects are found, deleted ones not
+        lamp = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="lamp", location=room)
+        self.assertEqual(resolver.search(self.char1, "la"), [lamp])
+        lamp.delete()
+        self.assertEqual(resolver.search(self.char1, "la"), [])
+
     def test_base_parse(self):
 
         cmd = commands.CmdEvscapeRoom()
@@ -152,6 +193,9 @@ class TestEvscaperoomCommands(CommandTest):
         cmd.caller = self.char1
         cmd.room = self.room1
         cmd.focus = self.obj1
+        self.assertEqual(cmd.focus, self.obj1)
+        # written to the database on flush
+        self.room1.playerstate.flush()
         self.assertEqual(self.char1.attributes.get(
             "focus", category=self.room1.tagcategory), self.obj1)
 
@@ -164,6 +208,7 @@ class TestEvscaperoomCommands(CommandTest):
         myobj = utils.create_evscaperoom_object(
             objects.EvscaperoomObject, "mytestobj", location=self.room1)
         self.call(commands.CmdFocus(), "mytestobj")
+        self.room1.playerstate.flush()
         self.assertEqual(self.char1.attributes.get(
             "focus", category=self.room1.tagcategory), myobj)
 
@@ -191,9 +236,34 @@ class TestEvscaperoomCommands(CommandTest):
                   "/me smiles to /obj",
                   f"Char(#{self.char1.id}) smiles to Obj(#{self.obj1.id})")
 
+    def test_emote_references(self):
+        cmd = commands.CmdEmote()
+        cmd.caller = self.char1
+        with patch.object(self.char1, "search", wraps=self.char1.search) as mock_search:
+            parts, self_refer = cmd.parse_emote("/me points at /obj and /obj")
+        # each name is only looked up once
+        mock_search.assert_called_once_with("obj", quiet=True)
+        self.assertTrue(self_refer)
+        self.assertEqual(parts, [("", None), ("/me", self.char1), (" points at ", None),
+                                 ("/obj", self.obj1), (" and ", None), ("/obj", self.obj1),
+                                 ("", None)])
+        me = self.char1.get_display_name(self.char1)
+        obj = self.obj1.get_display_name(self.char1)
+        self.assertEqual(cmd.render_emote(parts, self_refer, self.char1, {self.char1}),
+                         f"|g{me}|n points at |y{obj}|n and |y{obj}|n")
+
     def test_focus_interaction(self):
         self.call(commands.CmdFocusInteraction(), "", "Hm?")
 
+    def test_focus_actions(self):
+        actions = objects.Positionable.get_focus_actions()
+        self.assertEqual(list(actions), ["climb", "kneel", "lie", "sit"])
+        self.assertEqual(actions["sit"], objects.Sittable.at_focus_sit)
+        self.assertEqual(list(objects.Movable.get_focus_actions()), ["move", "push", "shove"])
+        self.assertEqual(objects.EvscaperoomObject.get_focus_actions(), {})
+        # cached per class
+        self.assertIs(objects.Movable.get_focus_actions(), objects.Movable.get_focus_actions())
+
 
 class TestUtils(EvenniaTest):
 
@@ -230,6 +300,42 @@ class TestUtils(EvenniaTest):
         self.assertEqual(utils.parse_for_things(string, 1), "Looking at |ybook|n and |ykey|n.")
         self.assertEqual(utils.parse_for_things(string, 2), "Looking at |y[book]|n and |y[key]|n.")
 
+    def test_compile_template(self):
+
+        string = "~You ~push *book and ~were gone."
+        template = utils.compile_template(string)
+        self.assertIs(template, utils.compile_template(string))
+        self.assertEqual(template.render("first", things_style=0),
+                         "You push book and were gone.")
+        self.assertEqual(template.render("third", you="TestGuy", things_style=2),
+                         "|cTestGuy|n pushes |y[book]|n and was gone.")
+        # leaving markers in place, like parse_for_perspectives/things
+        self.assertEqual(template.render(None, things_style=1),
+                         "~You ~push |ybook|n and ~were gone.")
+        self.assertEqual(template.render("third", you="TestGuy", things_style=None),
+                         utils.parse_for_perspectives(string, you="TestGuy")[1])
+
+    def test_catalog_desc(self):
+        from .states.state_001_start import RUG_DESC
+        room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key='Testroom')
+        obj = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="rug", location=room)
+        self.assertEqual(obj.get_desc(), "Nothing of interest.")
+
+        # a shared desc is stored as a reference
+        obj.set_desc(RUG_DESC.strip())
+        ref = obj.attributes.get("desc_ref")
+        self.assertTrue(ref.startswith("state_001_start.RUG_DESC:strip@"))
+        self.assertEqual(obj.attributes.get("desc"), None)
+        self.assertEqual(obj.get_desc(), RUG_DESC.strip())
+        # the text is still found if its constant is renamed
+        obj.attributes.add("desc_ref", "state_001_start.OLD_RUG_DESC:strip@" + ref.split("@")[1])
+        self.assertEqual(obj.get_desc(), RUG_DESC.strip())
+        # copy-on-write: a custom desc is stored on the object
+        obj.set_desc("A worn rug.")
+        self.assertEqual(obj.attributes.get("desc_ref"), None)
+        self.assertEqual(obj.get_desc(), "A worn rug.")
 
 
 class TestEvScapeRoom(EvenniaTest):
@@ -248,9 +354,10 @@ class TestEvScapeRoom(EvenniaTest):
 
         room = self.room
         self.char1.location = room
+        room.at_object_receive(self.char1, self.room1)
 
         self.assertEqual(room.tagcategory, self.roomtag)
-        self.assertEqual(list(room.get_all_characters()), [self.char1])
+        self.assertEqual(room.get_all_characters(), [self.char1])
 
         room.tag_character(self.char1, "opened_door")
         self.assertEqual(self.char1.tags.get(
@@ -263,6 +370,153 @@ class TestEvScapeRoom(EvenniaTest):
         room.character_cleanup(self.char1)
         self.assertEqual(self.char1.tags.get(category=self.roomtag), None)
 
+    def test_content_index(self):
+        room = self.room
+        self.char1.location = room
+        obj = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="Testobj", location=room)
+        self.assertEqual(room.content_index.get("testobj"), obj)
+        self.assertEqual(room.state.get_object("TESTOBJ"), obj)
+        # characters are not indexed
+        self.assertEqual(room.content_index.get(self.char1.key), None)
+        obj.delete()
+        self.assertEqual(room.content_index.get("testobj"), None)
+
+        # a new object replaces one with its name as alias
+        chest = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="chest under the bed", aliases=["chest"],
+            location=room)
+        self.assertEqual(room.content_index.find("Chest"), [chest])
+        chest2 = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="chest", location=room)
+        self.assertFalse(chest.pk)
+        self.assertEqual(room.content_index.find("chest"), [chest2])
+        chest2.delete()
+
+    def test_occupants(self):
+        room = self.room
+        self.char1.location = room
+        room.at_object_receive(self.char1, self.room1)
+        self.char2.location = room
+        room.at_object_receive(self.char2, self.room1)
+        self.assertEqual(room.get_all_characters(), [self.char1, self.char2])
+
+        # moved away without the room being told
+        self.char2.location = self.room1
+        self.assertEqual(room.get_all_characters(), [self.char1])
+        self.assertEqual(room.occupants, {self.char1})
+
+        # moved in without the room being told, found when reconciling
+        self.char2.location = room
+        self.assertEqual(room.get_all_characters(), [self.char1])
+        self.assertTrue(room.reconcile_occupants())
+        self.assertEqual(room.get_all_characters(), [self.char1, self.char2])
+        self.assertFalse(room.reconcile_occupants())
+        self.char2.location = self.room1
+
+    def test_check_perm(self):
+        room = self.room
+        self.char2.permissions.clear()
+        self.char2.account.permissions.clear()
+        self.assertFalse(room.check_perm(self.char2, "Admin"))
+        with patch("evscaperoom.room.check_lockstring") as mock_check:
+            self.assertFalse(room.check_perm(self.char2, "Admin"))
+            mock_check.assert_not_called()
+        # a change of permissions is seen at once
+        self.char2.account.permissions.add("Admin")
+        self.assertTrue(room.check_perm(self.char2, "Admin"))
+        self.char2.account.permissions.remove("Admin")
+        self.assertFalse(room.check_perm(self.char2, "Admin"))
+
+    def test_appearance_cache(self):
+        obj = utils.create_evscaperoom_object(
+            objects.Feelable, key="rock", location=self.room)
+        obj.set_desc("A rock. It is grey.")
+        with patch("evscaperoom.objects.parse_for_things",
+                   wraps=objects.parse_for_things) as mock_parse:
+            txt = obj.return_appearance(self.char1)
+            self.assertEqual(obj.return_appearance(self.char1), txt)
+            self.assertEqual(mock_parse.call_count, 1)
+            self.assertIn("A rock. It is grey.", txt)
+            self.assertTrue(obj.return_appearance(self.char1, unfocused=True).endswith("A rock."))
+            # changes are seen
+            obj.set_desc("A wet rock.")
+            self.assertIn("A wet rock.", obj.return_appearance(self.char1))
+            # also changes to the help, which can depend on the object's state
+            with patch.object(obj, "get_cmd_signatures",
+                              return_value=([], "It was moved to the door.")):
+                self.assertIn("moved to the door", obj.return_appearance(self.char1))
+            self.assertEqual(mock_parse.call_count, 2)
+        obj.delete()
+
+    def test_playerstate(self):
+        room = self.room
+        self.char1.location = room
+        playerstate = room.playerstate
+
+        playerstate.set(self.char1, "options", {"things_style": 1})
+        self.assertEqual(playerstate.get(self.char1, "options"), {"things_style": 1})
+        self.assertEqual(self.char1.attributes.get("options", category=self.roomtag), None)
+        playerstate.flush()
+        self.assertEqual(self.char1.attributes.get("options", category=self.roomtag),
+                         {"things_style": 1})
+
+        # rebuild from Attributes, like after a crash
+        self.char1.attributes.add("focus", self.obj1, category=self.roomtag)
+        playerstate.data.clear()
+        self.assertEqual(playerstate.get(self.char1, "focus"), self.obj1)
+
+        playerstate.remove(self.char1, "focus")
+        playerstate.flush()
+        self.assertEqual(self.char1.attributes.get("focus", category=self.roomtag), None)
+
+    def test_flags(self):
+        room = self.room
+        obj = utils.create_evscaperoom_object(
+            objects.EvscaperoomObject, key="Testobj", location=room)
+
+        obj.set_flag("open")
+        room.set_flag("dark")
+        self.assertTrue(obj.check_flag("open"))
+        self.assertFalse(obj.check_flag("dark"))
+        self.assertFalse(obj.check_flag("unknown"))
+        self.assertEqual(room.get_flags(), {"dark": True})
+        obj.unset_flag("open")
+        self.assertFalse(obj.check_flag("open"))
+        obj.set_flag("locked")
+
+        # written to the room on flush and read back by a new store
+        room.flagstore.flush()
+        flagstore = flags.FlagStore(room)
+        self.assertTrue(flagstore.check(obj, "locked"))
+        self.assertTrue(flagstore.check(room, "dark"))
+        self.assertFalse(flagstore.check(obj, "open"))
+
+        # old-style flags Attributes are converted
+        room.attributes.remove("flagstate")
+        obj.attributes.add("flags", {"burning": True})
+        flagstore = flags.FlagStore(room)
+        self.assertTrue(flagstore.check(obj, "burning"))
+        self.assertEqual(obj.attributes.get("flags"), None)
+
+    def test_msg_room(self):
+        room = self.room
+        self.char1.location = room
+        self.char2.location = room
+        self.char2.attributes.add("options", {"things_style": 0}, category=self.roomtag)
+        self.char1.msg = Mock()
+        self.char2.msg = Mock()
+
+        room.msg_room(self.char1, "~You ~open the *door.")
+        self.char1.msg.assert_called_with(
+            ("You open the |y[door]|n.", {"type": "your_action"}))
+        self.char2.msg.assert_called_with(
+            (f"|c{self.char1.key}|n opens the door.", {"type": "others_action"}))
+
+        self.char1.msg.reset_mock()
+        room.msg_room(self.char1, "~You ~open the *door.", skip_caller=True)
+        self.char1.msg.assert_not_called()
+
 
 class TestStates(EvenniaTest):
 
@@ -294,6 +548,108 @@ class TestStates(EvenniaTest):
         self.assertEqual(obj.__class__, objects.Edible)
         obj.delete()
 
+        apple, door = st.create_objects([
+            {"typeclass": objects.Edible, "key": "apple", "desc": "A red apple."},
+            {"typeclass": objects.Openable, "key": "door", "aliases": ["gate"],
+             "flags": ["unlocked"]}])
+        self.assertEqual(apple.get_desc(), "A red apple.")
+        self.assertTrue(door.check_flag("unlocked"))
+        self.assertEqual(door.aliases.all(), ["gate"])
+        self.assertEqual(apple.tags.get("room", category=self.room.tagcategory.lower()), "room")
+        apple.delete()
+        door.delete()
+
+        # nothing is left behind if the creation fails
+        masks = dict(self.room.flagstore.masks or {})
+        with patch.object(basestate.CATALOG, "desc_attribute", side_effect=[
+                ("desc", "A red apple."), RuntimeError("fail")]):
+            with self.assertRaises(RuntimeError):
+                st.create_objects([
+                    {"typeclass": objects.Edible, "key": "apple", "desc": "A red apple.",
+                     "flags": ["ripe"]},
+                    {"typeclass": objects.Openable, "key": "door", "desc": "A door."}])
+        self.assertEqual(self.room.content_index.get("apple"), None)
+        self.assertEqual(self.room.flagstore.masks, masks)
+
+    @patch("evscaperoom.state.logger")
+    def test_state_errors(self, mock_logger):
+
+        class ParentState(basestate.BaseState):
+            def init(self):
+                raise RuntimeError("fail")
+
+            @staticmethod
+            def helper():
+                raise RuntimeError("fail")
+
+        class ChildState(ParentState):
+            def init(self):
+                super().init()
+
+        st = ChildState(self.room.statehandler, self.room)
+        with patch.object(self.room, "msg_room") as mock_msg_room:
+            # a super() call is reported only once
+            with self.assertRaises(RuntimeError):
+                st.init()
+            mock_logger.log_trace.assert_called_once()
+            mock_msg_room.assert_called_once()
+            # staticmethods are wrapped too
+            with self.assertRaises(RuntimeError):
+                st.helper()
+            self.assertEqual(mock_logger.log_trace.call_count, 2)
+            mock_msg_room.assert_called_once()
+
+    def test_apply_manifest(self):
+
+        class _State1(basestate.BaseState):
+            manifest = [
+                {"typeclass": objects.Edible, "key": "apple", "desc": "A red apple."},
+                {"typeclass": objects.Openable, "key": "door"}]
+            manifest_cleanup = ["door"]
+
+        class _State2(basestate.BaseState):
+            manifest = [
+                {"typeclass": objects.Openable, "key": "apple", "desc": "A red apple."},
+                {"key": "apple", "aliases": ["fruit"]}]
+
+        handler = self.room.statehandler
+        state1 = _State1(handler, self.room)
+        state2 = _State2(handler, self.room)
+
+        self.assertEqual(handler.apply_manifest(state1), {"swapped": 0, "patched": 0})
+        apple = state1.get_object("apple")
+        self.assertEqual(apple.get_desc(), "A red apple.")
+        self.assertTrue(state1.get_object("door"))
+
+        # nothing differs, so nothing changes
+        self.assertEqual(handler.apply_manifest(state1), {"swapped": 0, "patched": 0})
+
+        self.assertEqual(handler.apply_manifest(state2, prev_state=state1),
+                         {"swapped": 1, "patched": 2})
+        self.assertFalse(state2.get_object("door"))
+        apple2 = state2.get_object("apple")
+        self.assertEqual(apple2.id, apple.id)
+        self.assertTrue(apple2.is_typeclass(objects.Openable))
+        self.assertEqual(apple2.get_desc(), "A red apple.")
+        self.assertEqual(apple2.aliases.all(), ["fruit"])
+
+    def test_transition_counts(self):
+        handler = self.room.statehandler
+        handler.end_transition()
+        handler.last_transition = {"swapped": 0, "patched": 0}
+        state = basestate.BaseState(handler, self.room)
+        apple = state.create_object(objects.Edible, key="apple")
+        # changes after init returned (like in an @interactive init) count too
+        pear = state.create_object(objects.Edible, key="pear")
+        apple.delete()
+        with patch.object(self.room, "log") as mock_log:
+            handler.end_transition()
+            handler.end_transition()
+        mock_log.assert_called_once()
+        self.assertEqual(handler.last_transition,
+                         {"swapped": 0, "patched": 0, "created": 2, "deleted": 1})
+        pear.delete()
+
     def test_all_states(self):
         "Tick through all defined states"
 
@@ -311,3 +667,335 @@ class TestStates(EvenniaTest):
 
             next_state = state.next()
             self.assertEqual(next_state, mod.State.next_state)
+
+    def test_state_registry(self):
+        registry = basestate.StateRegistry()
+        registry.load()
+        self.assertEqual(len(registry.states), len(self._get_all_state_modules()))
+        self.assertEqual(registry.load_errors, {})
+        self.assertEqual(registry.graph_errors, [])
+        self.assertEqual(registry.graph["state_011_exit_room"],
+                         {"state_012_questions_and_endings"})
+        self.assertEqual(registry.graph["state_012_questions_and_endings"], set())
+        self.assertTrue(registry.report().startswith("Evscaperoom: Loaded"))
+
+        # a broken chain
+        registry.graph["state_012_questions_and_endings"].add("state_999_missing")
+        self.assertFalse(registry.validate())
+
+
+class TestReaper(EvenniaTest):
+
+    def test_timer_wheel(self):
+        wheel = reaper.TimerWheel(4, 5)
+        wheel.schedule("a", 10)
+        wheel.schedule("b", 5)
+        wheel.schedule("c", 5)
+        wheel.cancel("c")
+        self.assertEqual(len(wheel), 2)
+        self.assertEqual(wheel.advance(), {"b"})
+        self.assertEqual(wheel.advance(), {"a"})
+        self.assertEqual(wheel.advance(), set())
+        self.assertFalse("a" in wheel)
+
+    @patch("evscaperoom.reaper.task.LoopingCall")
+    def test_reap_empty_room(self, mock_looper):
+        room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key='Testroom', home=self.room1)
+        self.char1.location = room
+        room.at_object_receive(self.char1, self.room1)
+        self.char1.location = None
+        room.at_character_disconnect(self.char1)
+        self.assertTrue(reaper.REAPER.is_scheduled(room))
+        for _ in range(len(reaper.REAPER.wheel.slots)):
+            reaper.REAPER._tick()
+        self.assertFalse(reaper.REAPER.is_scheduled(room))
+        self.assertFalse(room.pk)
+
+
+class TestLobby(EvenniaTest):
+
+    def test_lobby_cache(self):
+        cache = lobby.LobbyCache()
+        room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key='Testroom', home=self.room1)
+        self.assertEqual(cache.get_rooms(), [
+            (room, {"name": "Testroom", "progress": 0, "nplayers": 0})])
+        cache.update(room, progress=20, nplayers=2)
+        self.assertEqual(cache.get_rooms()[0][1]["progress"], 20)
+        self.assertEqual(cache.get_rooms()[0][1]["nplayers"], 2)
+        cache.remove(room)
+        self.assertEqual(cache.get_rooms(), [])
+        # rooms not in the listing are not added by updates
+        cache.update(room, progress=30)
+        self.assertEqual(cache.get_rooms(), [])
+        room.delete()
+
+
+class TestRoomPool(EvenniaTest):
+
+    @patch("evscaperoom.room.ROOMLOG")
+    @patch("evscaperoom.roompool.refill")
+    def test_checkout_room(self, mock_refill, mock_roomlog):
+        room = roompool.create_room(pooled=True)
+        self.assertTrue(roompool.is_pooled(room))
+        self.assertEqual(room.db.state, None)
+        self.assertTrue(room.content_index.get("door to the cabin"))
+        # the log and clock only start on checkout
+        self.assertEqual(room.db.started, None)
+        mock_roomlog.log.assert_not_called()
+
+        self.assertEqual(roompool.checkout_room(), room)
+        self.assertFalse(roompool.is_pooled(room))
+        self.assertTrue(room.db.started)
+        events = [call[1]["event"] for call in mock_roomlog.log.call_args_list]
+        self.assertEqual(events, ["create", "reseed", "state"])
+        mock_refill.assert_called_once()
+
+        # empty pool - create a new room
+        room2 = roompool.checkout_room()
+        self.assertNotEqual(room2, room)
+        self.assertFalse(roompool.is_pooled(room2))
+        # rooms not made for the pool start at once
+        self.assertTrue(room2.db.started)
+        room.delete()
+        room2.delete()
+
+    @patch("evscaperoom.roompool.random.getrandbits", return_value=1234)
+    def test_create_room_seed(self, mock_getrandbits):
+        room = roompool.create_room()
+        # the room name comes from the room's seed
+        self.assertEqual(room.db.rng_seed, 1234)
+        self.assertEqual(room.key, utils.create_fantasy_word(
+            length=5, capitalize=True, rng=random.Random("1234-name")))
+        room.delete()
+
+
+class TestRoomLog(TestCase):
+
+    def setUp(self):
+        self.logdir = tempfile.mkdtemp()
+        self.writer = roomlog.RoomLogWriter(logdir=self.logdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.logdir)
+
+    @patch("evscaperoom.roomlog.delay")
+    def test_log_events(self, mock_delay):
+        self.writer.log("evscaperoom_test.log", "JOIN: Bob joined room",
+                        room="Test", event="join", caller="Bob")
+        self.writer.log("evscaperoom_test.log", "HINT: state_001_start, level 1",
+                        room="Test", event="hint", state="state_001_start", level=1)
+        mock_delay.assert_called_once()
+        self.writer.flush(blocking=True)
+        self.assertEqual(self.writer.queue, [])
+
+        with open(path.join(self.logdir, "evscaperoom_test.log")) as fil:
+            lines = fil.readlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith(" [-] JOIN: Bob joined room\n"))
+
+        with open(path.join(self.logdir, "evscaperoom_events.jsonl")) as fil:
+            events = [json.loads(line) for line in fil]
+        self.assertEqual(events[0]["event"], "join")
+        self.assertEqual(events[0]["caller"], "Bob")
+        self.assertEqual(events[1]["payload"],
+                         {"state": "state_001_start", "level": 1,
+                          "message": "HINT: state_001_start, level 1"})
+
+    @patch("evscaperoom.roomlog._ROTATE_SIZE", 100)
+    @patch("evscaperoom.roomlog.delay")
+    def test_rotate(self, mock_delay):
+        for num in range(3):
+            self.writer.log("evscaperoom_test.log", "x" * 60)
+            self.writer.flush(blocking=True)
+        self.assertTrue(path.exists(path.join(self.logdir, "evscaperoom_test.log.1")))
+        self.assertTrue(path.exists(path.join(self.logdir, "evscaperoom_test.log.2")))
+        self.assertFalse(path.exists(path.join(self.logdir, "evscaperoom_test.log.3")))
+
+    @patch("evscaperoom.roomlog.delay")
+    def test_rotate_age(self, mock_delay):
+        logpath = path.join(self.logdir, "evscaperoom_test.log")
+        self.writer.log("evscaperoom_test.log", "first")
+        self.writer.flush(blocking=True)
+        # the start time survives a restart, even though the file is written to
+        with open(logpath + ".started", "w") as fil:
+            fil.write(str(time.time() - 10))
+        writer = roomlog.RoomLogWriter(logdir=self.logdir)
+        with patch("evscaperoom.roomlog._ROTATE_AGE", 5):
+            writer.log("evscaperoom_test.log", "second")
+            writer.flush(blocking=True)
+        self.assertTrue(path.exists(logpath + ".1"))
+
+    @patch("evscaperoom.roomlog.delay")
+    def test_write_order(self, mock_delay):
+        for num in range(20):
+            self.writer.log("evscaperoom_test.log", str(num))
+            self.writer.flush()
+        self.writer.flush(blocking=True)
+        with open(path.join(self.logdir, "evscaperoom_test.log")) as fil:
+            self.assertEqual([line.split(" [-] ")[1].strip() for line in fil],
+                             [str(num) for num in range(20)])
+
+
+class TestOutput(TestCase):
+
+    @patch("evscaperoom.output.delay")
+    def test_coalesce(self, mock_delay):
+        buffer = output.OutputBuffer()
+        char = Mock(pk=1)
+        self.assertTrue(buffer.add(char, ("You sit down.", {"type": "your_action"})))
+        self.assertTrue(buffer.add(char, ("It's comfy.", {"type": "your_action"})))
+        self.assertTrue(buffer.add(char, ("Bob waves.", {"type": "others_action"})))
+        self.assertTrue(buffer.add(char, "Plain text"))
+        mock_delay.assert_called_once()
+        char.msg.assert_not_called()
+
+        buffer.flush()
+        self.assertEqual(char.msg.mock_calls, [
+            call(text=("You sit down.\nIt's comfy.", {"type": "your_action"}), buffered=False),
+            call(text=("Bob waves.", {"type": "others_action"}), buffered=False),
+            call(text="Plain text", buffered=False)])
+
+        # other messages first send what's collected, to keep the order
+        char.msg.reset_mock()
+        buffer.add(char, "Question?")
+        self.assertFalse(buffer.add(char, "Prompt", options={"send_prompt": True}))
+        char.msg.assert_called_once_with(text="Question?", buffered=False)
+        self.assertEqual(buffer.queues, {})
+
+
+class TestAnalytics(TestCase):
+
+    def test_analyze_events(self):
+        analyzer = analytics.LogAnalyzer()
+        events = [
+            (0, "Room1", "create", {}),
+            (0, "Room1", "state", {"state": "state_001_start"}),
+            (10, "Room2", "create", {}),
+            (10, "Room2", "state", {"state": "state_001_start"}),
+            (60, "Room1", "hint", {"state": "state_001_start", "level": 1}),
+            (100, "Room1", "state", {"state": "state_002_automaton"}),
+            (300, "Room1", "question", {"question": 1, "answer": "VALE"}),
+            (400, "Room2", "end", {}),
+            (500, "Room1", "end", {})]
+        lines = [json.dumps({"timestamp": timestamp, "room": room, "event": event,
+                             "caller": None, "payload": payload})
+                 for timestamp, room, event, payload in events]
+        lines.insert(3, '{"timestamp": 5, "room": "Room1", "event": "emote"}')
+        analyzer.read_jsonl(lines)
+
+        results = analyzer.results()
+        self.assertEqual(results["events"], len(events))
+        self.assertEqual(results["funnel"][0], {"state": "state_001_start", "rooms": 2,
+                                                "percent": 100.0, "dropoff": 0})
+        self.assertEqual(results["funnel"][1]["dropoff"], 1)
+        self.assertAlmostEqual(results["median_seconds"]["state_001_start"], 100, delta=1)
+        # the last state is timed until the room ends
+        self.assertAlmostEqual(results["median_seconds"]["state_002_automaton"], 400, delta=4)
+        self.assertEqual(results["hints"], [{"state": "state_001_start", "level": 1,
+                                             "count": 1}])
+        self.assertEqual(results["answers"], {1: {"VALE": 1}})
+        self.assertEqual(analyzer.rooms, {})
+
+    def test_analyze_room_log(self):
+        analyzer = analytics.LogAnalyzer()
+        analyzer.read_log([
+            "2019-05-01 10:00:00 [-] Room created and log started.\n",
+            "2019-05-01 10:01:00 [-] HINT: state_001_start, level 2 (total used: 1)\n",
+            "2019-05-01 10:05:00 [-] Question 3: Bob answered 'Foo' (OTHER)\n"], "Room1")
+        results = analyzer.results()
+        self.assertEqual(results["hints"][0]["level"], 2)
+        self.assertEqual(results["answers"], {3: {"OTHER": 1}})
+
+
+class TestReplay(EvenniaTest):
+
+    def _record(self, timestamp, event, caller=None, **payload):
+        return json.dumps({"timestamp": timestamp, "room": "Room1", "event": event,
+                           "caller": caller, "payload": payload})
+
+    def test_load_sessions(self):
+        lines = [
+            self._record(0, "create", rng_seed=1),
+            self._record(0, "reseed", rng_seed=1234),
+            self._record(1, "join", "Bob"),
+            self._record(2, "input", "Bob", message="look"),
+            self._record(3, "input", "Bob", message="examine door"),
+            self._record(4, "end", "Bob")]
+        sessions = list(replay.load_sessions(lines))
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0].seed, 1234)
+        self.assertEqual(sessions[0].players, ["Bob"])
+        self.assertEqual(len(sessions[0].events), 3)
+
+        replayer = replay.SessionReplayer(sessions[0], home=self.room1)
+        try:
+            report = replayer.run()
+        finally:
+            replayer.cleanup()
+        self.assertEqual(report["commands"], 2)
+        self.assertEqual(report["final_state"], "state_001_start")
+
+    def test_rng_seed(self):
+        room = utils.create_evscaperoom_object(
+            "evscaperoom.room.EvscapeRoom", key="Testroom", home=self.room1)
+        room.reseed(1234)
+        first = [room.get_rng().random() for _ in range(3)]
+        room.reseed(1234)
+        self.assertEqual([room.get_rng().random() for _ in range(3)], first)
+        self.assertNotEqual(room.get_rng("chatter").random(), first[0])
+        # the sequence continues after a reload
+        rng = room.get_rng()
+        rng.random()
+        room.save_rngs()
+        expected = rng.random()
+        room.ndb.rngs = None
+        self.assertEqual(room.get_rng().random(), expected)
+        room.delete()
+
+    def test_replay_clock(self):
+        clock = replay.ReplayClock()
+        calls = []
+        clock.delay(2, calls.append, 2)
+        clock.delay(1, lambda: clock.delay(2, calls.append, 3))
+        clock.delay(0, calls.append, 1)
+        clock.run()
+        self.assertEqual(calls, [1, 2, 3])
+        self.assertEqual(clock.now, 3)
+
+    def test_playthrough_session(self):
+        registry = basestate.StateRegistry()
+        registry.load()
+        # the solution visits each state in the order they follow each other
+        states = [state for state, _ in playthrough.SOLUTION]
+        self.assertEqual(states[0], "state_001_start")
+        for state, next_state in zip(states, states[1:]):
+            self.assertIn(next_state, registry.graph[state])
+        session = playthrough.playthrough_session()
+        self.assertEqual(session.players, ["Bot"])
+        self.assertEqual(len(session.events),
+                         1 + sum(len(commands) for _, commands in playthrough.SOLUTION))
+
+
+class TestLoadGenerator(EvenniaTest):
+
+    def test_scheduler(self):
+        scheduler = loadgen.LoadScheduler()
+        calls = []
+        scheduler.delay(0.02, calls.append, 2)
+        scheduler.delay(0.01, calls.append, 1)
+        scheduler.delay(10, calls.append, 3)
+        scheduler.run_until(time.perf_counter() + 0.05)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(len(scheduler.lags), 2)
+
+    def test_finish(self):
+        scheduler = loadgen.LoadScheduler()
+        calls = []
+        scheduler.delay(10, calls.append, 1)
+        scheduler.delay(10, calls.pop)
+        scheduler.delay(20, calls.append, 2)
+        scheduler.finish(skip=(calls.pop,))
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(scheduler.queue, [])
@@ -4,6 +4,7 @@ Helper functions and classes for the evscaperoom contrib.
 """
 
 import re
+from functools import lru_cache
 from random import choice, random
 from evennia import create_object, search_object
 from evennia.utils import justify, inherits_from
@@ -13,6 +14,25 @@ _RE_PERSPECTIVE = re.compile(r"~(\w+)", re.I+re.U+re.M)
 _RE_THING = re.compile(r"\*(\w+)", re.I+re.U+re.M)
 
 
+def complete_typeclass(typeclass):
+    """
+    Unless given a full typeclass path or the class itself, assume the
+    typeclass is a class-name in the evscaperoom's objects.py module.
+
+    Args:
+        typeclass (str or class): The typeclass or its (partial) path.
+    Returns:
+        typeclass (str or class): The class or its full python-path.
+
+    """
+    if not (callable(typeclass) or
+            typeclass.startswith("evennia") or
+            typeclass.startswith("typeclasses") or
+            typeclass.startswith("evscaperoom")):
+        return _BASE_TYPECLASS_PATH + typeclass
+    return typeclass
+
+
 def create_evscaperoom_object(typeclass=None, key="testobj", location=None,
                               delete_duplicates=True, **kwargs):
     """
@@ -21,7 +41,9 @@ def create_evscaperoom_object(typeclass=None, key="testobj", location=None,
     for the object-create admin command.
 
     Note that for the purpose of the Evscaperoom, we only allow one instance
-    of each *name*, deleting the old version if it already exists.
+    of each *name*, deleting the old version if it already exists. If
+    `location` is an EvscapeRoom, its content index is used to find the
+    old version, otherwise we search globally.
 
     Kwargs:
         typeclass (str): This can take just the class-name in the evscaperoom's
@@ -35,35 +57,41 @@ def create_evscaperoom_object(typeclass=None, key="testobj", location=None,
 
 
     """
-    if not (callable(typeclass) or
-            typeclass.startswith("evennia") or
-            typeclass.startswith("typeclasses") or
-            typeclass.startswith("evscaperoom")):
-        # unless we specify a full typeclass path or the class itself,
-        # auto-complete it
-        typeclass = _BASE_TYPECLASS_PATH + typeclass
+    typeclass = complete_typeclass(typeclass)
+
+    content_index = getattr(location, "content_index", None)
 
     if delete_duplicates:
-        old_objs = [obj for obj in search_object(key)
-                    if not inherits_from(obj, "evennia.objects.objects.DefaultCharacter")]
-        if location:
-            # delete only matching objects in the given location
-            [obj.delete() for obj in old_objs if obj.location == location]
+        if content_index is not None:
+            # no need to search, the room knows its contents
+            for old_obj in content_index.find(key):
+                old_obj.delete()
         else:
-            [obj.delete() for obj in old_objs]
+            old_objs = [obj for obj in search_object(key)
+                        if not inherits_from(obj, "evennia.objects.objects.DefaultCharacter")]
+            if location:
+                # delete only matching objects in the given location
+                [obj.delete() for obj in old_objs if obj.location == location]
+            else:
+                [obj.delete() for obj in old_objs]
 
     new_obj = create_object(typeclass=typeclass, key=key,
                             location=location, **kwargs)
+    if new_obj and content_index is not None:
+        content_index.add(new_obj)
+        location.name_resolver.invalidate()
     return new_obj
 
 
-def create_fantasy_word(length=5, capitalize=True):
+def create_fantasy_word(length=5, capitalize=True, rng=None):
     """
     Create a random semi-pronouncable 'word'.
 
     Kwargs:
         length (int): The desired length of the 'word'.
         capitalize (bool): If the return should be capitalized or not
+        rng (random.Random, optional): Random generator to use, such as
+            a room's `get_rng()`. If not given, use the global one.
     Returns:
         word (str): The fictous word of given length.
 
@@ -74,9 +102,10 @@ def create_fantasy_word(length=5, capitalize=True):
     phonemes = ("ea oh ae aa eh ah ao aw ai er ey ow ia ih iy oy ua "
                 "uh uw a e i u y p b t d f v t dh "
                 "s z sh zh ch jh k ng g m n l r w").split()
-    word = [choice(phonemes)]
+    _choice = rng.choice if rng else choice
+    word = [_choice(phonemes)]
     while len(word) < length:
-        word.append(choice(phonemes))
+        word.append(_choice(phonemes))
     # it's possible to exceed length limit due to double consonants
     word = "".join(word)[:length]
     return word.capitalize() if capitalize else word
@@ -93,6 +122,30 @@ irregulars = {
 }
 
 
+def _third_person(word):
+    """
+    Get the third-person version of a ~marked word.
+
+    Args:
+        word (str): The word following the ~ marker.
+    Returns:
+        third_person (str or None): The third-person form of the word. This is
+            `None` for '~you', which should be replaced by the speaker's name.
+
+    """
+    lword = word.lower()
+    if lword == "you":
+        return None
+    elif lword in irregulars:
+        if word[0].isupper():
+            return irregulars[lword].capitalize()
+        return irregulars[lword]
+    elif lword[-1] == 's':
+        return word + "es"
+    else:
+        return word + "s"  # simple, most normal form
+
+
 def parse_for_perspectives(string, you=None):
     """
     Parse a string with special markers to produce versions both
@@ -111,18 +164,8 @@ def parse_for_perspectives(string, you=None):
         ->  "You open", "Bob opens"
     """
     def _replace_third_person(match):
-        match = match.group(1)
-        lmatch = match.lower()
-        if lmatch == "you":
-            return "|c{}|n".format(you)
-        elif lmatch in irregulars:
-            if match[0].isupper():
-                return irregulars[lmatch].capitalize()
-            return irregulars[lmatch]
-        elif lmatch[-1] == 's':
-            return match + "es"
-        else:
-            return match + "s"  # simple, most normal form
+        third_person = _third_person(match.group(1))
+        return "|c{}|n".format(you) if third_person is None else third_person
 
     you = "They" if you is None else you
 
@@ -157,6 +200,147 @@ def parse_for_things(string, things_style=2, clr="|y"):
         return _RE_THING.sub(r"{}[\1]|n".format(clr), string)
 
 
+# message templates
+
+_RE_MARKUP = re.compile(r"\*~(\w+)|~(\w+)|\*(\w+)", re.I+re.U+re.M)
+
+# template token types
+_LITERAL = 0
+_PERSPECTIVE = 1
+_THING = 2
+_THING_PERSPECTIVE = 3
+
+
+def _mark_thing(word, things_style, clr):
+    "Decorate a *thing the way parse_for_things does"
+    if things_style is None:
+        return "*" + word
+    elif not things_style:
+        return word
+    elif things_style == 1:
+        return f"{clr}{word}|n"
+    return f"{clr}[{word}]|n"
+
+
+class MessageTemplate(object):
+    """
+    A message string with ~perspective and *thing markers, tokenized once
+    so it can be rendered many times without re-parsing it. Each rendered
+    variant is cached as a sequence of plain strings, so rendering for a
+    given speaker and things-style is just a join.
+
+    Don't create these directly, use `compile_template`, which caches the
+    templates by their source string.
+
+    """
+    def __init__(self, string):
+        self.string = string
+        # list of (token_type, first_person/text, third_person)
+        self.tokens = []
+        # (perspective, things_style, clr): segments between speaker names
+        self._variants = {}
+
+        pos = 0
+        for match in _RE_MARKUP.finditer(string):
+            if match.start() > pos:
+                self.tokens.append((_LITERAL, string[pos:match.start()], None))
+            thing_perspective, perspective, thing = match.groups()
+            if thing:
+                self.tokens.append((_THING, thing, None))
+            else:
+                word = thing_perspective or perspective
+                self.tokens.append((_THING_PERSPECTIVE if thing_perspective else _PERSPECTIVE,
+                                    word, _third_person(word)))
+            pos = match.end()
+        if pos < len(string):
+            self.tokens.append((_LITERAL, string[pos:], None))
+
+    def __str__(self):
+        return self.string
+
+    def __repr__(self):
+        return f"<MessageTemplate {self.string!r}>"
+
+    def _build_variant(self, perspective, things_style, clr):
+        """
+        Render all tokens for one variant, splitting the result wherever the
+        speaker's name should go.
+
+        """
+        segments = []
+        parts = []
+        for toktype, word, third_person in self.tokens:
+            if toktype == _LITERAL:
+                parts.append(word)
+            elif toktype == _THING:
+                parts.append(_mark_thing(word, things_style, clr))
+            elif perspective is None:
+                # keep the ~markers
+                parts.append(("*~" if toktype == _THING_PERSPECTIVE else "~") + word)
+            else:
+                if perspective != "first":
+                    if third_person is None:
+                        # the speaker's name goes here (never marked as a thing)
+                        if toktype == _THING_PERSPECTIVE:
+                            parts.append("*")
+                        segments.append("".join(parts))
+                        parts = []
+                        continue
+                    word = third_person
+                if toktype == _THING_PERSPECTIVE:
+                    word = _mark_thing(word, things_style, clr)
+                parts.append(word)
+        segments.append("".join(parts))
+        return tuple(segments)
+
+    def render(self, perspective="first", you=None, things_style=2, clr="|y"):
+        """
+        Render the template.
+
+        Args:
+            perspective (str or None): One of "first" or "third". If `None`,
+                leave the ~markers untouched (like `parse_for_things` does).
+            you (str, optional): What others should see instead of ~you when
+                rendering in third person.
+            things_style (int or None): How to mark *things, as for
+                `parse_for_things`. If `None`, leave the *markers untouched
+                (like `parse_for_perspectives` does).
+            clr (str): Which color to use for *thing markers.
+        Returns:
+            text (str): The rendered text.
+
+        """
+        key = (perspective, things_style, clr)
+        try:
+            segments = self._variants[key]
+        except KeyError:
+            segments = self._variants[key] = self._build_variant(
+                perspective, things_style, clr)
+        if len(segments) == 1:
+            return segments[0]
+        you = "They" if you is None else you
+        return f"|c{you}|n".join(segments)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(string):
+    """
+    Get the compiled template for a message string with ~perspective and
+    *thing markers. Templates are compiled on first use and then cached, so
+    this is cheap to call with the same (e.g. constant) string over and over.
+
+    Args:
+        string (str): String on 2nd person form with ~ and * markers.
+    Returns:
+        template (MessageTemplate): The compiled template.
+    Example:
+        compile_template("~You ~open *door").render("third", you="Bob")
+        -> "|cBob|n opens |y[door]|n"
+
+    """
+    return MessageTemplate(string)
+
+
 def add_msg_borders(text):
     "Add borders above/below text block"
     maxwidth = max(len(line) for line in text.split("\n"))
@@ -24,14 +24,30 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    # preload and validate all evscaperoom states
+    from evennia.utils import logger
+    from evscaperoom.state import STATE_REGISTRY
+    STATE_REGISTRY.load()
+    logger.log_info(STATE_REGISTRY.report())
+
+    # make sure there are pre-initialized evscaperooms ready for players
+    from evscaperoom.roompool import refill
+    refill()
 
 def at_server_stop():
     """
     This is called just before the server is shut down, regardless
     of it is for a reload, reset or shutdown.
     """
-    pass
+    # write any unsaved evscaperoom player state, flags and random generator
+    # states to the database and any queued room log events to file, and
+    # send any collected output
+    from evscaperoom import sessionstate, flags, roomlog, output, room
+    sessionstate.flush_all()
+    room.flush_all()
+    flags.flush_all()
+    roomlog.flush_all()
+    output.flush_all()
 
 
 def at_server_reload_start():
@@ -38,6 +38,10 @@ TYPECLASS_PATHS += ["evscaperoom"]
 
 IDLE_TIMEOUT = 7 * 24 * 3600
 
+# number of fully initialized, empty evscaperooms to keep ready so
+# players don't have to wait for a new room to be built (0 to disable)
+EVSCAPEROOM_ROOM_POOL_SIZE = 2
+
 GUEST_ENABLED = True
 
 GUEST_LIST = ["Avofee", "Bergine", "Caerin", "Duvoe", "Ergaloe", "Farala",
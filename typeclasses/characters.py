@@ -8,6 +8,7 @@ creation commands.
 
 """
 from evennia import DefaultCharacter
+from evscaperoom.output import OUTPUT
 
 
 class Character(DefaultCharacter):
@@ -34,6 +35,19 @@ class Character(DefaultCharacter):
         self.db.desc = "a wide-eyed villager"
         self.db.evscaperoom_standalone = True
 
+    def msg(self, text=None, from_obj=None, session=None, options=None, buffered=True,
+            **kwargs):
+        """
+        Plain text messages are collected and sent together at the end of
+        the reactor tick (see evscaperoom/output.py). Set `buffered` to
+        `False` to send at once.
+
+        """
+        if buffered and OUTPUT.add(self, text, from_obj=from_obj, session=session,
+                                   options=options, **kwargs):
+            return
+        super().msg(text=text, from_obj=from_obj, session=session, options=options, **kwargs)
+
     def at_post_puppet(self, **kwargs):
         from evscaperoom.menu import run_evscaperoom_menu
         run_evscaperoom_menu(self)
@@ -41,3 +55,10 @@ class Character(DefaultCharacter):
         def message(obj, from_obj):
             obj.msg("%s has entered the menu." % self.get_display_name(obj), from_obj=from_obj)
         self.location.for_contents(message, exclude=[self], from_obj=self)
+
+    def at_post_unpuppet(self, account, session=None, **kwargs):
+        location = self.location
+        super().at_post_unpuppet(account, session=session, **kwargs)
+        if location and not self.location and hasattr(location, "at_character_disconnect"):
+            # we were whisked off the grid; let the evscaperoom know
+            location.at_character_disconnect(self)